@@ -4,6 +4,9 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import csv
 import io
+import click
+import threading
+import time
 from flask import make_response
 
 # Extensions & Models
@@ -14,12 +17,44 @@ from crypto_portfolio.utils.api import CoinGeckoAPI
 from crypto_portfolio.utils.security import SecurityManager
 from crypto_portfolio.core.trading_engine import TradingEngine
 from crypto_portfolio.core.ai_predictor import AIPredictor
+from crypto_portfolio.core.rollups import SnapshotRollup
+from crypto_portfolio.core.valuation import PortfolioValuation
+from crypto_portfolio.core.risk import RiskService
+from crypto_portfolio.core.correlation import CorrelationService
+from crypto_portfolio.core.price_history import PriceHistoryStore
+from crypto_portfolio.core.monte_carlo import MonteCarloService
+from crypto_portfolio.core.optimizer import FrontierService
+from crypto_portfolio.core.goals import GoalProjectionService
+from crypto_portfolio.core.backtest import BacktestService
+from crypto_portfolio.core.simulations import SimulationPricing
+from crypto_portfolio.core.lots import LotService, LotBook, METHODS as LOT_METHODS
+from crypto_portfolio.core.performance import PerformanceService
+from crypto_portfolio.core.scenarios import Scenario, ScenarioEngine, HISTORICAL_SCENARIOS
+from crypto_portfolio.core.indicators import Indicators, IndicatorService
+from crypto_portfolio.core.rebalance import RebalanceService
+from crypto_portfolio.core.forecast_eval import ForecastEvaluationService
+from crypto_portfolio.core.forecast_models import ModelSelectionService
+from crypto_portfolio.core.auto_trader import AutoTradeScheduler
+from crypto_portfolio.core.paper_exchange import PaperExchange, TickFeed
+from crypto_portfolio.core.exchange_sync import ExchangeSyncService
 from crypto_portfolio.utils.news import FinancialNewsAPI
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'dev-secret-key-change-me'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///portfolio.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['MONTE_CARLO_WORKERS'] = 0 # >0 runs Monte Carlo chunks in a process pool
+app.config['BACKTEST_WORKERS'] = 0 # >0 spreads backtest grids over a process pool
+app.config['PREDICTOR_PREWARM'] = 10 # most-held coins whose forecast models are fitted when a server process starts
+app.config['FORECAST_SELECTION_WORKERS'] = 0 # >0 cross-validates the model zoo in a process pool
+# In-memory 'paper' venue: state is lost on restart and not shared between processes,
+# so it is only offered for load tests and single-process development runs
+app.config['PAPER_TRADING'] = False
+# Auto-trading and exchange sync only run in the process started with `flask run-scheduler`
+app.config['AUTO_TRADE_INTERVAL'] = 15 # seconds between auto-trading ticks, 0 disables them
+app.config['AUTO_TRADE_WORKERS'] = 16 # threads placing auto-trading orders
+app.config['EXCHANGE_SYNC_INTERVAL'] = 300 # seconds between exchange trade syncs, 0 disables them
+app.config['EXCHANGE_SYNC_WORKERS'] = 8 # threads fetching trades and balances
 
 # Initialize Extensions
 db.init_app(app)
@@ -33,26 +68,53 @@ with app.app_context():
     try:
         from sqlalchemy import text
         with db.engine.connect() as conn:
-            # Check for language column and others added recently
-            res = conn.execute(text("PRAGMA table_info(user)"))
-            columns = [row[1] for row in res.fetchall()]
-            
-            missing_cols = [
-                ('language', "VARCHAR(10) DEFAULT 'fr'"),
-                ('bio', "TEXT"),
-                ('profile_picture_url', "VARCHAR(255)"),
-                ('email', "VARCHAR(120)"),
-                ('email_notifications', "BOOLEAN DEFAULT 1"),
-                ('weekly_reports', "BOOLEAN DEFAULT 1"),
-                ('default_currency', "VARCHAR(10) DEFAULT 'USD'"),
-                ('role', "VARCHAR(20) DEFAULT 'Investisseur'"),
-                ('created_date', "DATETIME")
-            ]
-            
-            for col_name, col_type in missing_cols:
-                if col_name not in columns:
-                    print(f"Migrating: Adding column {col_name}")
-                    conn.execute(text(f"ALTER TABLE user ADD COLUMN {col_name} {col_type}"))
+            # Columns added to existing tables since they were first created
+            missing_cols = {
+                'user': [
+                    ('language', "VARCHAR(10) DEFAULT 'fr'"),
+                    ('bio', "TEXT"),
+                    ('profile_picture_url', "VARCHAR(255)"),
+                    ('email', "VARCHAR(120)"),
+                    ('email_notifications', "BOOLEAN DEFAULT 1"),
+                    ('weekly_reports', "BOOLEAN DEFAULT 1"),
+                    ('default_currency', "VARCHAR(10) DEFAULT 'USD'"),
+                    ('role', "VARCHAR(20) DEFAULT 'Investisseur'"),
+                    ('created_date', "DATETIME")
+                ],
+                'transaction': [
+                    ('exchange_order_id', "VARCHAR(100)"),
+                    ('exchange_trade_id', "VARCHAR(100)")
+                ],
+                'exchange_credential': [
+                    ('trades_since', "BIGINT"),
+                    ('synced_at', "DATETIME"),
+                    ('status', "VARCHAR(20)"),
+                    ('status_message', "VARCHAR(255)"),
+                    ('checked_at', "DATETIME")
+                ]
+            }
+            # Indexes of migrated columns; new databases get them from create_all
+            migrated_indexes = {
+                ('transaction', 'exchange_order_id'):
+                    'CREATE INDEX IF NOT EXISTS ix_transaction_exchange_order_id ON "transaction" (exchange_order_id)',
+                ('transaction', 'exchange_trade_id'):
+                    'CREATE UNIQUE INDEX IF NOT EXISTS uq_transaction_exchange_trade ON "transaction" (user_id, exchange_trade_id)'
+            }
+
+            for table, table_cols in missing_cols.items():
+                res = conn.execute(text(f'PRAGMA table_info("{table}")'))
+                columns = [row[1] for row in res.fetchall()]
+                if not columns:
+                    continue # created below with every column
+                for col_name, col_type in table_cols:
+                    if col_name not in columns:
+                        print(f"Migrating: Adding column {table}.{col_name}")
+                        conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {col_name} {col_type}'))
+                        if (table, col_name) in migrated_indexes:
+                            conn.execute(text(migrated_indexes[(table, col_name)]))
+                if table == 'transaction':
+                    # LotService counts a user's transactions on every write
+                    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_transaction_user_id ON "transaction" (user_id)'))
             
             conn.commit()
     except Exception as e:
@@ -281,38 +343,22 @@ def dashboard():
     assets = portfolio.get_assets()
     
     # Calculate live stats
-    total_val = 0
-    total_cost = 0
+    valuation = PortfolioValuation.value_assets(assets)
     dashboard_data = []
     
-    for a in assets:
-        current_price = a.buy_price
-        if a.coin_id:
-             price = CoinGeckoAPI.get_price(a.coin_id)
-             if price: current_price = price
-        
-        value = a.quantity * current_price
-        cost = a.quantity * a.buy_price
-        pl = value - cost
-        pl_percent = (pl / cost * 100) if cost > 0 else 0
-        
-        total_val += value
-        total_cost += cost
-        
+    for a, metrics in zip(assets, valuation.rows()):
         dashboard_data.append({
             "name": a.name,
             "symbol": a.symbol,
             "asset_type": a.asset_type,
             "quantity": a.quantity,
             "buy_price": a.buy_price,
-            "current_price": current_price,
-            "value": value,
-            "pl": pl,
-            "pl_percent": pl_percent
+            **metrics
         })
         
-    global_pl = total_val - total_cost
-    global_pl_percent = (global_pl / total_cost * 100) if total_cost > 0 else 0
+    total_val = valuation.total_value
+    global_pl = valuation.total_pl
+    global_pl_percent = valuation.total_pl_percent
 
     # --- Portfolio History Logic ---
     today = datetime.now().date()
@@ -331,6 +377,7 @@ def dashboard():
         
         # Start from 30 days ago
         base_value = total_val * 0.8 # Started with 20% less
+        points = []
         for i in range(30):
             day = today - timedelta(days=30-i)
             # Random fluctuation
@@ -346,6 +393,8 @@ def dashboard():
                 total_value=base_value
             )
             db.session.add(snap)
+            points.append((day, base_value))
+        SnapshotRollup.record_many(current_user.id, points)
         db.session.commit()
     elif not existing_snapshot:
         # Normal daily snapshot
@@ -355,17 +404,19 @@ def dashboard():
             total_value=total_val
         )
         db.session.add(new_snapshot)
+        SnapshotRollup.record(current_user.id, today, total_val)
         db.session.commit()
     else:
         # Update current value if it changed during the day
         existing_snapshot.total_value = total_val
+        SnapshotRollup.record(current_user.id, today, total_val)
         db.session.commit()
         
-    # 2. Fetch history
-    snapshots = PortfolioSnapshot.query.filter_by(user_id=current_user.id).order_by(PortfolioSnapshot.date).limit(30).all()
-    
-    chart_dates = [s.date.strftime('%d/%m') for s in snapshots]
-    chart_values = [s.total_value for s in snapshots]
+    # 2. Fetch history from the rollups for the requested range
+    chart_range = request.args.get('range', '1M').upper()
+    if chart_range not in SnapshotRollup.RANGES:
+        chart_range = '1M'
+    chart_dates, chart_values = format_chart_series(SnapshotRollup.series(current_user.id, chart_range), chart_range)
     
     return render_template(
         'dashboard.html', 
@@ -375,34 +426,42 @@ def dashboard():
         total_pl_percent=global_pl_percent,
         active_page='dashboard',
         chart_labels=chart_dates,
-        chart_values=chart_values
+        chart_values=chart_values,
+        chart_range=chart_range
     )
 
+def format_chart_series(buckets, chart_range):
+    label_format = '%m/%Y' if chart_range in ('5Y', 'ALL') else '%d/%m'
+    labels = [b.bucket_start.strftime(label_format) for b in buckets]
+    values = [b.close_value for b in buckets]
+    return labels, values
+
+@app.route('/api/portfolio/history')
+@login_required
+def api_portfolio_history():
+    chart_range = request.args.get('range', '1M').upper()
+    if chart_range not in SnapshotRollup.RANGES:
+        return jsonify({"error": f"Unknown range {chart_range}"}), 400
+    buckets = SnapshotRollup.series(current_user.id, chart_range)
+    labels, values = format_chart_series(buckets, chart_range)
+    return jsonify({
+        "range": chart_range,
+        "labels": labels,
+        "values": values,
+        "buckets": [b.to_dict() for b in buckets]
+    })
+
 @app.route('/assets')
 @login_required
 def assets_list():
     portfolio = get_portfolio()
     raw_assets = portfolio.get_assets()
     
-    enriched_assets = []
-    for a in raw_assets:
-        current_price = a.buy_price
-        if a.coin_id:
-             price = CoinGeckoAPI.get_price(a.coin_id)
-             if price: current_price = price
-        
-        enriched = a.to_dict()
-        enriched['current_price'] = current_price
-        
-        value = a.quantity * current_price
-        cost = a.quantity * a.buy_price
-        pl = value - cost
-        pl_percent = (pl / cost * 100) if cost > 0 else 0
-        
-        enriched['value'] = value
-        enriched['pl_percent'] = pl_percent
-        
-        enriched_assets.append(enriched)
+    valuation = PortfolioValuation.value_assets(raw_assets)
+    enriched_assets = [
+        {**a.to_dict(), **metrics}
+        for a, metrics in zip(raw_assets, valuation.rows())
+    ]
 
     return render_template('assets.html', assets=enriched_assets, active_page='assets')
 
@@ -517,11 +576,33 @@ def transactions():
     tx_data = [t.to_dict() for t in portfolio.get_transactions()]
     return render_template('transactions.html', transactions=tx_data, active_page='transactions')
 
+@app.route('/api/transactions/lots')
+@login_required
+def api_transaction_lots():
+    method = request.args.get('method', LotService.DEFAULT_METHOD)
+    if method not in LOT_METHODS:
+        return jsonify({"error": f"method must be one of {', '.join(LOT_METHODS)}"}), 400
+    assets = get_portfolio().get_assets()
+    live = PortfolioValuation.fetch_prices(assets)
+    prices = {LotBook.key(a.symbol): live[a.coin_id] for a in assets if a.coin_id in live}
+    return jsonify(LotService.book(current_user.id, method).positions(prices))
+
 @app.route('/objectifs')
 @login_required
 def objectifs():
     portfolio = get_portfolio()
-    return render_template('objectifs.html', goals=[g.to_dict() for g in portfolio.get_goals()], active_page='objectifs')
+    projections = GoalProjectionService.for_user(current_user)
+    goals = []
+    for g in portfolio.get_goals():
+        goal = g.to_dict()
+        goal['projection'] = projections.get(g.id)
+        goals.append(goal)
+    return render_template('objectifs.html', goals=goals, active_page='objectifs')
+
+@app.route('/api/goals/projection')
+@login_required
+def api_goals_projection():
+    return jsonify(GoalProjectionService.for_user(current_user))
 
 @app.route('/save_goal', methods=['POST'])
 @login_required
@@ -646,22 +727,48 @@ def update_simulation_price(sim_id):
     sim = Simulation.query.filter_by(id=sim_id, user_id=current_user.id).first()
     
     if sim:
-        new_price = sim.current_price
-        if sim.asset_type == 'crypto':
-             coin_id = CoinGeckoAPI.search_coin(sim.symbol)
-             if coin_id:
-                 live = CoinGeckoAPI.get_price(coin_id)
-                 if live: new_price = live
-        
-        sim.current_price = new_price
-        sim.current_value = sim.quantity * new_price
-        sim.profit_loss = sim.current_value - sim.investment
-        
-        db.session.commit()
+        if not SimulationPricing.reprice([sim]) and sim.current_price is not None:
+            # No live price (e.g. not a crypto): value it at its stored price
+            sim.current_value = (sim.quantity or 0.0) * sim.current_price
+            sim.profit_loss = sim.current_value - (sim.investment or 0.0)
+            db.session.commit()
         return jsonify({"success": True})
         
     return jsonify({"error": "Simulation not found"}), 404
 
+@app.route('/api/simulations/reprice', methods=['POST'])
+@login_required
+def reprice_simulations():
+    rows = SimulationPricing.reprice_all(current_user.id)
+    # Also pushed over Socket.IO; the response lets the page finish without it
+    return jsonify({"success": True, "updated": len(rows),
+                    "simulations": [{k: v for k, v in row.items() if k != "user_id"} for row in rows]})
+
+def monte_carlo_params():
+    target = request.args.get('target', type=float)
+    return {
+        "horizon_days": max(1, min(request.args.get('horizon', 365, type=int), 3650)),
+        "n_paths": max(100, min(request.args.get('paths', 10000, type=int), 100000)),
+        "target": target,
+        "workers": app.config['MONTE_CARLO_WORKERS']
+    }
+
+@app.route('/api/monte-carlo')
+@login_required
+def api_monte_carlo():
+    assets = get_portfolio().get_assets()
+    result = MonteCarloService.for_assets(assets, **monte_carlo_params())
+    return jsonify(result.to_dict())
+
+@app.route('/api/simulations/<sim_id>/monte-carlo')
+@login_required
+def api_simulation_monte_carlo(sim_id):
+    sim = Simulation.query.filter_by(id=sim_id, user_id=current_user.id).first()
+    if not sim:
+        return jsonify({"error": "Simulation not found"}), 404
+    result = MonteCarloService.for_simulation(sim, **monte_carlo_params())
+    return jsonify(result.to_dict())
+
 @app.route('/delete_simulation/<sim_id>')
 @login_required
 def delete_simulation(sim_id):
@@ -676,30 +783,19 @@ def analyse():
     portfolio = get_portfolio()
     assets = portfolio.get_assets()
     
+    valuation = PortfolioValuation.value_assets(assets)
     enriched_assets = []
-    for a in assets:
-        current_price = a.buy_price
-        if a.coin_id:
-             price = CoinGeckoAPI.get_price(a.coin_id)
-             if price: current_price = price
-        
-        enriched_asset = {
+    for a, price in zip(assets, valuation.current_price):
+        enriched_assets.append({
             "symbol": a.symbol,
             "quantity": a.quantity,
             "buy_price": a.buy_price,
-            "current_price": current_price,
+            "current_price": float(price),
             "asset_type": a.asset_type
-        }
-        enriched_assets.append(enriched_asset)
+        })
 
-    # ... logic identical to before ...
-    total_value = sum(a['quantity'] * a['current_price'] for a in enriched_assets)
-    
-    type_distribution = {}
-    for a in enriched_assets:
-        val = a['quantity'] * a['current_price']
-        asset_type = a['asset_type']
-        type_distribution[asset_type] = type_distribution.get(asset_type, 0) + val
+    total_value = valuation.total_value
+    type_distribution = {k: v['value'] for k, v in valuation.by_asset_type().items()}
         
     types_count = len(type_distribution.keys())
     max_concentration = (max(type_distribution.values()) / total_value) if total_value > 0 else 0
@@ -719,11 +815,17 @@ def analyse():
     if types_count < 3: div_recs.append("Diversifiez dans plus de classes d'actifs")
     if max_concentration > 0.5: div_recs.append("Réduisez la concentration de votre actif principal")
     if len(enriched_assets) < 5: div_recs.append("Augmentez le nombre d'actifs dans votre portefeuille")
+
+    risk = RiskService.for_user(current_user)
+    correlation = get_correlation_report(assets)
+    avg_corr = correlation['average_correlation'] if correlation else None
+    if avg_corr is not None and avg_corr > 0.7:
+        div_recs.append(f"Vos actifs sont fortement corrélés (corrélation moyenne {avg_corr:.2f})")
     if not div_recs: div_recs.append("Votre portefeuille est bien diversifié !")
 
-    total_invested = sum(a['quantity'] * a['buy_price'] for a in enriched_assets)
-    profit_loss = total_value - total_invested
-    performance = (profit_loss / total_invested * 100) if total_invested > 0 else 0
+    performance = valuation.total_pl_percent
+    live_prices = {a.coin_id: p for a, p in zip(assets, valuation.current_price.tolist()) if a.coin_id}
+    returns = PerformanceService.for_user(current_user, live_prices)
 
     return render_template('analyse.html', 
                          active_page='analyse',
@@ -733,7 +835,141 @@ def analyse():
                          div_level=div_level,
                          div_recs=div_recs,
                          type_distribution=type_distribution,
-                         performance=performance)
+                         performance=performance,
+                         risk=risk,
+                         returns=returns,
+                         correlation=correlation)
+
+def get_correlation_report(assets, window=CorrelationService.DEFAULT_WINDOW):
+    labels = {a.coin_id: a.symbol for a in assets if a.coin_id}
+    if len(labels) < 2:
+        return None
+    PriceHistoryStore.refresh(list(labels))
+    return CorrelationService.report(list(labels), labels, window)
+
+@app.route('/api/analyse/performance')
+@login_required
+def api_analyse_performance():
+    return jsonify(PerformanceService.for_user(current_user))
+
+@app.route('/api/stress-test', methods=['GET', 'POST'])
+@login_required
+def api_stress_test():
+    data = request.get_json(silent=True) or {}
+    try:
+        scenarios = [Scenario.from_dict(s) for s in data.get('scenarios', [])]
+        if data.get('grid'):
+            scenarios += ScenarioEngine.grid(data['grid'], limit=ScenarioEngine.MAX_SCENARIOS - len(scenarios))
+    except (TypeError, ValueError, AttributeError) as e:
+        return jsonify({"error": f"Invalid scenarios: {e}"}), 400
+    if data.get('historical', not scenarios):
+        scenarios = HISTORICAL_SCENARIOS + scenarios
+    if len(scenarios) > ScenarioEngine.MAX_SCENARIOS:
+        return jsonify({"error": f"Too many scenarios (max {ScenarioEngine.MAX_SCENARIOS})"}), 400
+
+    result = ScenarioEngine.run_assets(scenarios, get_portfolio().get_assets())
+    return jsonify(result.to_dict(include_holdings=bool(data.get('holdings'))))
+
+@app.route('/api/rebalance/targets', methods=['GET', 'POST'])
+@login_required
+def api_rebalance_targets():
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            return jsonify(RebalanceService.set_targets(current_user.id, data.get('targets') or {}))
+        except (TypeError, ValueError, AttributeError) as e:
+            return jsonify({"error": f"Invalid targets: {e}"}), 400
+    return jsonify(RebalanceService.targets(current_user.id))
+
+def _rebalance_plan():
+    """Plan for the posted targets (or the stored ones); returns (plan, error)."""
+    data = request.get_json(silent=True) or {}
+    targets = data.get('targets')
+    options = {}
+    try:
+        if targets is not None:
+            targets = {str(k): float(v) for k, v in targets.items()}
+            if any(v < 0 for v in targets.values()):
+                raise ValueError("Weights cannot be negative")
+        for key in ('fee_rate', 'min_trade', 'tolerance'):
+            if data.get(key) is not None:
+                options[key] = float(data[key])
+    except (TypeError, ValueError, AttributeError) as e:
+        return None, f"Invalid request: {e}"
+    plan = RebalanceService.plan_for_user(current_user, targets, **options)
+    if plan is None:
+        return None, "No target weights"
+    return plan, None
+
+@app.route('/api/rebalance/plan', methods=['GET', 'POST'])
+@login_required
+def api_rebalance_plan():
+    plan, error = _rebalance_plan()
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(plan.to_dict())
+
+@app.route('/api/rebalance/execute', methods=['POST'])
+@login_required
+def api_rebalance_execute():
+    plan, error = _rebalance_plan()
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify({"plan": plan.to_dict(), "results": RebalanceService.execute(current_user, plan)})
+
+@app.route('/api/analyse/risk')
+@login_required
+def api_analyse_risk():
+    return jsonify(RiskService.for_user(current_user))
+
+@app.route('/api/analyse/frontier')
+@login_required
+def api_analyse_frontier():
+    assets = get_portfolio().get_assets()
+    valuation = PortfolioValuation.value_assets(assets)
+    values, quantities, labels = {}, {}, {}
+    for a, value in zip(assets, valuation.value.tolist()):
+        if not a.coin_id:
+            continue
+        values[a.coin_id] = values.get(a.coin_id, 0.0) + value
+        quantities[a.coin_id] = quantities.get(a.coin_id, 0.0) + (a.quantity or 0.0)
+        labels[a.coin_id] = a.symbol
+    if len(values) >= 2:
+        PriceHistoryStore.refresh(list(values))
+    points = max(5, min(request.args.get('points', 40, type=int), 200))
+    report = FrontierService.for_holdings(values, quantities, labels, points)
+    if not report:
+        return jsonify({"error": "At least two priced holdings with history are required"}), 400
+    return jsonify(report)
+
+@app.route('/api/indicators')
+@login_required
+def api_indicators():
+    coins = [c.strip().lower() for c in request.args.get('coins', '').split(',') if c.strip()]
+    if not coins:
+        coins = sorted({a.coin_id for a in get_portfolio().get_assets() if a.coin_id})
+    if not coins or len(coins) > 50:
+        return jsonify({"error": "Between 1 and 50 coins are required"}), 400
+    days = request.args.get('days', IndicatorService.HISTORY_DAYS, type=int)
+    if days < 2 or days > 3650:
+        return jsonify({"error": "days must be between 2 and 3650"}), 400
+    try:
+        specs = [Indicators.parse(s) for s in request.args.get('indicators', 'rsi,macd,bollinger').split(';')]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(IndicatorService.for_coins(coins, specs, days=days))
+
+@app.route('/api/analyse/correlation')
+@login_required
+def api_analyse_correlation():
+    window = request.args.get('window', CorrelationService.DEFAULT_WINDOW, type=int)
+    if window < 2 or window > 365:
+        return jsonify({"error": "window must be between 2 and 365"}), 400
+    assets = get_portfolio().get_assets()
+    report = get_correlation_report(assets, window)
+    if not report:
+        return jsonify({"error": "At least two priced holdings with history are required"}), 400
+    return jsonify(report)
 
 @app.route('/dividends')
 @login_required
@@ -781,41 +1017,20 @@ def import_export():
     portfolio = get_portfolio()
     raw_assets = portfolio.get_assets()
     
-    total_val = 0
-    total_cost = 0
-    enriched_assets = []
-    
-    for a in raw_assets:
-        current_price = a.buy_price
-        if a.coin_id:
-             price = CoinGeckoAPI.get_price(a.coin_id)
-             if price: current_price = price
-        
-        value = a.quantity * current_price
-        cost = a.quantity * a.buy_price
-        pl = value - cost
-        pl_percent = (pl / cost * 100) if cost > 0 else 0
-        
-        total_val += value
-        total_cost += cost
-        
-        enriched = a.to_dict()
-        enriched['current_price'] = current_price
-        enriched['value'] = value
-        enriched['pl_percent'] = pl_percent
-        enriched_assets.append(enriched)
-        
-    global_pl = total_val - total_cost
-    global_pl_percent = (global_pl / total_cost * 100) if total_cost > 0 else 0
+    valuation = PortfolioValuation.value_assets(raw_assets)
+    enriched_assets = [
+        {**a.to_dict(), **metrics}
+        for a, metrics in zip(raw_assets, valuation.rows())
+    ]
 
     return render_template('import_export.html', 
                          title='Import/Export', 
                          active_page='import_export',
                          assets=enriched_assets,
-                         total_val=total_val,
-                         total_invested=total_cost,
-                         total_pl=global_pl,
-                         total_pl_percent=global_pl_percent)
+                         total_val=valuation.total_value,
+                         total_invested=valuation.total_cost,
+                         total_pl=valuation.total_pl,
+                         total_pl_percent=valuation.total_pl_percent)
 
 @app.route('/import_csv', methods=['POST'])
 @login_required
@@ -859,6 +1074,16 @@ def import_csv():
                             buy_price=buy_price,
                             asset_type=asset_type
                         ))
+                    # The asset row keeps a weighted average; the lot stays in the ledger
+                    portfolio.add_transaction(Transaction(
+                        symbol=symbol,
+                        type='buy',
+                        quantity=quantity,
+                        price=buy_price,
+                        asset_name=symbol,
+                        asset_type=asset_type,
+                        strategy='import'
+                    ))
                     count += 1
                 except ValueError:
                     continue
@@ -903,15 +1128,11 @@ def wallet():
     portfolio = get_portfolio()
     raw_assets = portfolio.get_assets()
     
+    valuation = PortfolioValuation.value_assets(raw_assets)
     enriched_assets = []
-    for a in raw_assets:
-        current_price = a.buy_price
-        if a.coin_id:
-             price = CoinGeckoAPI.get_price(a.coin_id)
-             if price: current_price = price
-        
+    for a, price in zip(raw_assets, valuation.current_price):
         a_dict = a.to_dict()
-        a_dict['current_price'] = current_price
+        a_dict['current_price'] = float(price)
         enriched_assets.append(a_dict)
 
     tx_data = [t.to_dict() for t in portfolio.get_transactions()]
@@ -954,6 +1175,90 @@ def news_page():
 def oracle_page():
     return render_template('oracle.html', active_page='oracle')
 
+def prewarm_predictor():
+    """
+    Background task fitting the forecast models of the most-held coins into
+    this process's cache. The evaluation and model selection jobs are left
+    to `flask evaluate-forecasts` and `flask select-forecast-models`.
+    """
+    try:
+        with app.app_context():
+            coins = AIPredictor.most_held_coins(app.config['PREDICTOR_PREWARM'])
+            print(f"Prewarmed {AIPredictor.prewarm(coins)}/{len(coins)} forecast models.")
+    except Exception as e:
+        print(f"Predictor prewarm failed: {e}")
+
+def start_prewarm():
+    """
+    Starts prewarm_predictor in the web server process. Called by the
+    development server below; a WSGI server calls it once per worker
+    (e.g. from gunicorn's post_worker_init hook).
+    """
+    if app.config['PREDICTOR_PREWARM']:
+        # A plain thread: Socket.IO's gevent tasks only run once its server loop does
+        threading.Thread(target=prewarm_predictor, daemon=True).start()
+
+def auto_trade_loop():
+    """Loop of `flask run-scheduler` running the auto-trading scheduler on every price tick."""
+    while True:
+        time.sleep(app.config['AUTO_TRADE_INTERVAL'])
+        try:
+            with app.app_context():
+                # Paper accounts trade against live prices
+                paper = AutoTradeScheduler.symbols('paper')
+                if paper:
+                    PaperExchange.engine.replay(TickFeed.live(paper))
+                report = AutoTradeScheduler.tick(workers=app.config['AUTO_TRADE_WORKERS'])
+                if report.get("orders") or report.get("failed"):
+                    print(f"Auto trade: {report['orders']} orders placed, {report['failed']} failed "
+                          f"for {report['users']} users.")
+        except Exception as e:
+            print(f"Auto trade tick failed: {e}")
+
+def exchange_sync_loop():
+    """Loop of `flask run-scheduler` importing new exchange trades and balances."""
+    while True:
+        time.sleep(app.config['EXCHANGE_SYNC_INTERVAL'])
+        try:
+            with app.app_context():
+                report = ExchangeSyncService.run(workers=app.config['EXCHANGE_SYNC_WORKERS'])
+                if report.get("trades") or report.get("failed"):
+                    print(f"Exchange sync: {report['trades']} trades imported, {report['failed']} accounts failed.")
+        except Exception as e:
+            print(f"Exchange sync failed: {e}")
+
+@app.route('/api/predict/batch')
+@login_required
+def api_predict_batch():
+    # Only held coins, whose history the nightly forecast jobs keep up to date
+    held = sorted({a.coin_id for a in get_portfolio().get_assets() if a.coin_id})
+    wanted = {c.strip().lower() for c in request.args.get('coins', '').split(',') if c.strip()}
+    coins = [c for c in held if c in wanted] if wanted else held
+    if not coins or len(coins) > 100:
+        return jsonify({"error": "Between 1 and 100 held coins are required"}), 400
+    days_future = request.args.get('days', 7, type=int)
+    if days_future < 1 or days_future > 30:
+        return jsonify({"error": "days must be between 1 and 30"}), 400
+    return jsonify(AIPredictor.predict_batch(coins, days_future=days_future, refresh_prices=False))
+
+@app.route('/api/predict/evaluation')
+@login_required
+def api_predict_evaluation():
+    coins = [c.strip().lower() for c in request.args.get('coins', '').split(',') if c.strip()]
+    if not coins:
+        coins = sorted({a.coin_id for a in get_portfolio().get_assets() if a.coin_id})
+    horizon = request.args.get('horizon', 7, type=int)
+    return jsonify({c: ForecastEvaluationService.lookup(c, horizon=horizon) for c in coins})
+
+@app.route('/api/predict/models')
+@login_required
+def api_predict_models():
+    coins = [c.strip().lower() for c in request.args.get('coins', '').split(',') if c.strip()]
+    if not coins:
+        coins = sorted({a.coin_id for a in get_portfolio().get_assets() if a.coin_id})
+    horizon = request.args.get('horizon', 7, type=int)
+    return jsonify({c: ModelSelectionService.best(c, horizon) for c in coins})
+
 @app.route('/api/predict/<coin_id>')
 @login_required
 def api_predict(coin_id):
@@ -978,8 +1283,14 @@ def api_predict(coin_id):
 def auto_trading_page():
     portfolio = get_portfolio()
     settings = portfolio.get_auto_trade_settings()
-    exchanges = current_user.exchanges.filter_by(is_active=True).all()
-    return render_template('auto_trading.html', active_page='auto_trading', settings=settings, exchanges=exchanges)
+    exchanges = current_user.exchanges.filter(db.or_(ExchangeCredential.is_active == True,
+                                                     ExchangeCredential.status == 'pending')).all()
+    failed = None
+    if not exchanges:
+        failed = current_user.exchanges.filter_by(status='failed') \
+            .order_by(ExchangeCredential.checked_at.desc()).first()
+    return render_template('auto_trading.html', active_page='auto_trading', settings=settings, exchanges=exchanges,
+                           failed_exchange=failed, paper_trading=app.config['PAPER_TRADING'])
 
 @app.route('/connect_exchange', methods=['POST'])
 @login_required
@@ -991,6 +1302,9 @@ def connect_exchange():
     if not api_key or not api_secret:
         flash("API Key et Secret requis", "error")
         return redirect(url_for('auto_trading_page'))
+    if exchange_id == 'paper' and not app.config['PAPER_TRADING']:
+        flash("Le Paper Trading est réservé aux tests de charge", "error")
+        return redirect(url_for('auto_trading_page'))
         
     # Encrypt
     key_enc = SecurityManager.encrypt(api_key)
@@ -1004,18 +1318,25 @@ def connect_exchange():
         api_secret_enc=secret_enc
     )
     db.session.add(cred)
-    db.session.commit()
     
-    # Verify connection
-    if TradingEngine.verify_connection(cred):
-        flash(f"Connecté à {exchange_id} avec succès", "success")
-    else:
-        cred.is_active = False # Disable if failed
-        db.session.commit()
-        flash(f"Échec de connexion à {exchange_id}. Vérifiez vos clés.", "error")
+    # Checked on a worker thread; the page is told over Socket.IO
+    TradingEngine.verify_in_background(cred)
+    flash(f"Vérification de la connexion à {exchange_id} en cours...", "info")
         
     return redirect(url_for('auto_trading_page'))
 
+@app.route('/api/exchange/sync', methods=['POST'])
+@login_required
+def api_exchange_sync():
+    # The report arrives on the user's Socket.IO room as 'exchange_sync'
+    ExchangeSyncService.run_in_background(current_user.id)
+    return jsonify({"queued": True}), 202
+
+@app.route('/api/exchange/status')
+@login_required
+def api_exchange_status():
+    return jsonify([c.to_dict() for c in current_user.exchanges.all()])
+
 @app.route('/api/auto-trade/settings', methods=['GET', 'POST'])
 @login_required
 def auto_trade_settings_api():
@@ -1053,6 +1374,30 @@ def auto_trade_settings_api():
     settings = portfolio.get_auto_trade_settings()
     return jsonify(settings.to_dict())
 
+def parse_levels(name):
+    raw = request.args.get(name)
+    if not raw:
+        return None
+    try:
+        levels = [float(x) for x in raw.split(',') if x.strip()]
+    except ValueError:
+        return None
+    return [x for x in levels if 0 < x < 100][:50] or None
+
+@app.route('/api/auto-trade/backtest')
+@login_required
+def auto_trade_backtest():
+    settings = get_portfolio().get_auto_trade_settings()
+    days = max(30, min(request.args.get('days', BacktestService.HISTORY_DAYS, type=int), 1825))
+    report = BacktestService.for_settings(
+        current_user, settings,
+        take_profits=parse_levels('tp'),
+        stop_losses=parse_levels('sl'),
+        days=days,
+        workers=app.config['BACKTEST_WORKERS']
+    )
+    return jsonify(report)
+
 @app.route('/api/auto-trade/stats')
 @login_required
 def auto_trade_stats():
@@ -1181,7 +1526,14 @@ def products():
 @app.route('/analytics')
 @login_required
 def analytics():
-    return render_template('analytics.html', active_page='analytics')
+    holdings = {}
+    for a in get_portfolio().get_assets():
+        if a.coin_id:
+            holdings.setdefault(a.coin_id, a.symbol)
+    specs = [Indicators.parse(s) for s in ('sma:50', 'rsi:14', 'macd:12,26,9', 'bollinger:20,2', 'atr:14')]
+    latest = IndicatorService.latest(list(holdings), specs, refresh_prices=True) if holdings else {}
+    signals = [dict(symbol=holdings[coin], coin_id=coin, **values) for coin, values in sorted(latest.items())]
+    return render_template('analytics.html', active_page='analytics', signals=signals)
 
 
 # CLI Command for init
@@ -1190,6 +1542,78 @@ def init_db():
     db.create_all()
     print("Database tables created (including PortfolioSnapshot).")
 
+@app.cli.command("rebuild-rollups")
+def rebuild_rollups():
+    for user in User.query.all():
+        SnapshotRollup.rebuild(user.id)
+    db.session.commit()
+    print("Snapshot rollups rebuilt.")
+
+@app.cli.command("rebuild-lots")
+def rebuild_lots():
+    for user in User.query.all():
+        LotService.rebuild(user.id)
+    db.session.commit()
+    print("Transaction lots rebuilt.")
+
+@app.cli.command("reprice-simulations")
+def reprice_simulations_command():
+    rows = SimulationPricing.reprice_all()
+    print(f"Repriced {len(rows)} simulations.")
+
+@app.cli.command("evaluate-forecasts")
+def evaluate_forecasts_command():
+    rows = ForecastEvaluationService.run()
+    print(f"Stored {rows} forecast evaluations.")
+
+@app.cli.command("select-forecast-models")
+def select_forecast_models_command():
+    rows = ModelSelectionService.run(workers=app.config['FORECAST_SELECTION_WORKERS'])
+    print(f"Selected forecasting models for {rows} coins.")
+
+@app.cli.command("auto-trade")
+def auto_trade_command():
+    report = AutoTradeScheduler.tick(workers=app.config['AUTO_TRADE_WORKERS'])
+    print(f"Auto trade: {report.get('orders', 0)} orders placed, {report.get('failed', 0)} failed "
+          f"for {report.get('users', 0)} users.")
+
+@app.cli.command("sync-exchanges")
+def sync_exchanges_command():
+    report = ExchangeSyncService.run(workers=app.config['EXCHANGE_SYNC_WORKERS'])
+    print(f"Exchange sync: {report.get('trades', 0)} trades imported, {report.get('assets', 0)} assets updated, "
+          f"{report.get('failed', 0)} of {report.get('accounts', 0) + report.get('failed', 0)} accounts failed.")
+
+@app.cli.command("run-scheduler")
+def run_scheduler_command():
+    """
+    Runs the auto-trading and exchange sync loops until interrupted. Start
+    exactly one of these: each process places its own orders.
+    """
+    loops = [loop for loop, interval in ((auto_trade_loop, app.config['AUTO_TRADE_INTERVAL']),
+                                         (exchange_sync_loop, app.config['EXCHANGE_SYNC_INTERVAL'])) if interval]
+    if not loops:
+        print("Scheduler: every loop is disabled.")
+        return
+    for loop in loops[1:]:
+        threading.Thread(target=loop, daemon=True).start()
+    print(f"Scheduler running: {', '.join(loop.__name__ for loop in loops)}.")
+    loops[0]()
+
+@app.cli.command("rebalance")
+@click.option('--execute', is_flag=True, help="Place the orders instead of only printing them.")
+def rebalance_command(execute):
+    users = {u.id: u for u in User.query.all()}
+    plans = RebalanceService.plan_users(list(users.values()))
+    for user_id, plan in plans.items():
+        user = users[user_id]
+        print(f"{user.username}: {len(plan.orders)} orders, fees {plan.fees:.2f}")
+        for order in plan.orders:
+            print(f"  {order.side} {order.amount:.8g} {order.symbol} (~{order.value:.2f})")
+        if execute and plan.orders:
+            results = RebalanceService.execute(user, plan)
+            print(f"  placed {sum(r['status'] == 'placed' for r in results)}/{len(results)}")
+    print(f"Planned rebalancing for {len(plans)} users.")
+
 from crypto_portfolio.core.events import background_price_fetch
 
 if __name__ == '__main__':
@@ -1199,6 +1623,9 @@ if __name__ == '__main__':
     
     # socketio.start_background_task(background_price_fetch, app)
     import os
+    # With the reloader only its child process serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_prewarm()
     port = int(os.environ.get('PORT', 8888))
     print(f"Server ready! Open this link: http://127.0.0.1:{port}")
     app.run(debug=True, host='127.0.0.1', port=port)
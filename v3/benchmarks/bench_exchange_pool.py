@@ -0,0 +1,98 @@
+"""
+Order latency with a fresh ccxt client per call (decrypt keys, cold
+load_markets) versus the pooled TradingEngine clients, against a local
+mock exchange served over HTTP with a fixed per-request delay.
+
+Run from v3/:  python -m benchmarks.bench_exchange_pool
+"""
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import ccxt
+from crypto_portfolio.core.trading_engine import TradingEngine
+from crypto_portfolio.utils.security import SecurityManager
+
+DELAY = 0.02 # seconds per request, a nearby exchange
+N_MARKETS = 2000
+N_ORDERS = 50
+
+MARKETS = [
+    {"id": f"C{i}USDT", "symbol": f"C{i}/USDT", "base": f"C{i}", "quote": "USDT", "baseId": f"C{i}",
+     "quoteId": "USDT", "active": True, "type": "spot", "spot": True, "precision": {}, "limits": {}}
+    for i in range(N_MARKETS)
+]
+
+class MockHandler(BaseHTTPRequestHandler):
+    def _reply(self, payload):
+        time.sleep(DELAY)
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply(MARKETS if self.path == "/markets" else {"USDT": {"free": 1000.0, "used": 0.0, "total": 1000.0}})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply({"id": "1", "status": "closed", "price": 100.0})
+
+    def log_message(self, *args):
+        pass
+
+class MockExchange(ccxt.Exchange):
+    base_url = None
+
+    def describe(self):
+        return self.deep_extend(super().describe(), {"id": "mockex", "name": "Mock", "has": {"fetchCurrencies": False}})
+
+    def fetch_markets(self, params={}):
+        return self.fetch(self.base_url + "/markets", "GET")
+
+    def fetch_balance(self, params={}):
+        return self.fetch(self.base_url + "/balance", "GET")
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        self.load_markets()
+        market = self.market(symbol)
+        body = json.dumps({"symbol": market["id"], "type": type, "side": side, "amount": amount})
+        return self.fetch(self.base_url + "/order", "POST", {"Content-Type": "application/json"}, body)
+
+def place(client, symbol):
+    return client.create_order(symbol, "market", "buy", 0.01)
+
+def timed(fn):
+    samples = []
+    for i in range(N_ORDERS):
+        t = time.perf_counter()
+        fn(f"C{i % N_MARKETS}/USDT")
+        samples.append(time.perf_counter() - t)
+    return samples
+
+def report(label, samples):
+    print(f"{label:20}: median {statistics.median(samples) * 1000:7.1f} ms   "
+          f"p95 {sorted(samples)[int(len(samples) * 0.95)] * 1000:7.1f} ms")
+
+if __name__ == '__main__':
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    MockExchange.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    TradingEngine.register_exchange("mockex", MockExchange)
+
+    credential = SimpleNamespace(
+        id="bench", exchange_id="mockex",
+        api_key_enc=SecurityManager.encrypt("key"), api_secret_enc=SecurityManager.encrypt("secret")
+    )
+    print(f"mock exchange: {DELAY * 1000:.0f} ms per request, {N_MARKETS} markets, {N_ORDERS} orders")
+    fresh = timed(lambda symbol: place(TradingEngine.build_client(credential), symbol))
+    report("fresh client", fresh)
+    TradingEngine.invalidate()
+    pooled = timed(lambda symbol: place(TradingEngine.get_exchange_client(credential, load_markets=True), symbol))
+    report("pooled client", pooled)
+    print(f"speedup (median)    : {statistics.median(fresh) / statistics.median(pooled):.1f}x")
+    server.shutdown()
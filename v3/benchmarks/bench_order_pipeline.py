@@ -0,0 +1,56 @@
+"""
+Wall time of a rebalance-sized batch against an in-process async exchange
+with a fixed round trip per order: one order at a time through a single
+client, then the pipeline's concurrent phases over the pooled client.
+
+Run from v3/:  python -m benchmarks.bench_order_pipeline
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+import ccxt.async_support as ccxt_async
+from crypto_portfolio.core.order_pipeline import OrderPipeline
+from crypto_portfolio.core.trading_engine import TradingEngine
+from crypto_portfolio.utils.security import SecurityManager
+
+LATENCY = 0.08
+BASES = [f"C{i}" for i in range(20)]
+
+class BenchExchange(ccxt_async.Exchange):
+    def describe(self):
+        return self.deep_extend(super().describe(), {"id": "bench", "has": {"fetchCurrencies": False}})
+
+    async def fetch_markets(self, params={}):
+        return [{"id": f"{b}USDT", "symbol": f"{b}/USDT", "base": b, "quote": "USDT", "baseId": b, "quoteId": "USDT",
+                 "active": True, "type": "spot", "spot": True, "precision": {}, "limits": {}} for b in BASES]
+
+    async def create_order(self, symbol, type, side, amount, price=None, params={}):
+        await asyncio.sleep(LATENCY)
+        return {"id": f"{side}-{symbol}", "average": 1.0, "filled": amount, "status": "closed"}
+
+async def sequential(credential, orders):
+    client = await OrderPipeline._client(credential)
+    for o in orders:
+        await client.create_order(o["symbol"], "market", o["side"], o["amount"])
+
+if __name__ == '__main__':
+    TradingEngine.register_exchange("bench", BenchExchange)
+    credential = SimpleNamespace(id="bench", exchange_id="bench", api_key_enc=SecurityManager.encrypt("k"),
+                                 api_secret_enc=SecurityManager.encrypt("s"))
+    sells = [{"symbol": f"{b}/USDT", "side": "sell", "amount": 1.0} for b in BASES[:8]]
+    buys = [{"symbol": f"{b}/USDT", "side": "buy", "amount": 1.0} for b in BASES[8:]]
+    OrderPipeline.run(OrderPipeline._client(credential)) # warm the pool and markets
+
+    t = time.perf_counter()
+    OrderPipeline.run(sequential(credential, sells + buys))
+    t_seq = time.perf_counter() - t
+
+    t = time.perf_counter()
+    results = OrderPipeline.run(OrderPipeline.submit(credential, [sells, buys]))
+    t_pipe = time.perf_counter() - t
+    latencies = [r.latency for phase in results for r in phase]
+    OrderPipeline.run(OrderPipeline.close())
+
+    print(f"{len(sells)} sells + {len(buys)} buys, {LATENCY * 1000:.0f} ms per order")
+    print(f"sequential : {t_seq * 1000:7.0f} ms")
+    print(f"pipeline   : {t_pipe * 1000:7.0f} ms  ({t_seq / t_pipe:.1f}x, max order latency {max(latencies) * 1000:.0f} ms)")
@@ -0,0 +1,59 @@
+"""
+Throughput of the paper matching engine: resting limit orders placed
+around the price, then synthetic ticks replayed through the heaps, with
+a linear scan of all open orders per tick as the baseline.
+
+Run from v3/:  python -m benchmarks.bench_paper_exchange
+"""
+import time
+import numpy as np
+from crypto_portfolio.core.paper_exchange import PaperMatchingEngine, TickFeed
+
+N_ORDERS = 20_000
+N_TICKS = 20_000
+SYMBOL = "BTC/USDT"
+
+def place_orders(engine, rng):
+    engine.fund("bench", "USDT", 1e12)
+    engine.fund("bench", "BTC", 1e9)
+    for price in rng.normal(100, 5, N_ORDERS).round(2):
+        side = "buy" if price < 100 else "sell"
+        engine.create_order("bench", SYMBOL, "limit", side, 0.01, float(price))
+
+def linear_scan(engine, ticks):
+    # What a book without price levels has to do on every tick
+    open_orders = [o for o in engine.orders.values() if o["status"] == "open"]
+    fills = 0
+    for _, _, price in ticks:
+        remaining = []
+        for o in open_orders:
+            if (o["side"] == "buy" and o["price"] >= price) or (o["side"] == "sell" and o["price"] <= price):
+                fills += 1
+            else:
+                remaining.append(o)
+        open_orders = remaining
+    return fills
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    ticks = TickFeed.synthetic([SYMBOL], N_TICKS, volatility=0.0005, seed=1)
+
+    engine = PaperMatchingEngine()
+    engine.tick(SYMBOL, 100.0)
+    t = time.perf_counter()
+    place_orders(engine, rng)
+    t_place = time.perf_counter() - t
+
+    t = time.perf_counter()
+    baseline_fills = linear_scan(engine, ticks)
+    t_scan = time.perf_counter() - t
+
+    t = time.perf_counter()
+    fills = engine.replay(ticks)
+    t_heap = time.perf_counter() - t
+    assert fills == baseline_fills
+
+    print(f"{N_ORDERS} limit orders placed : {N_ORDERS / t_place:10,.0f} orders/s")
+    print(f"{N_TICKS} ticks, {fills} fills")
+    print(f"linear scan              : {N_TICKS / t_scan:10,.0f} ticks/s")
+    print(f"price-level heaps        : {N_TICKS / t_heap:10,.0f} ticks/s  ({t_scan / t_heap:.1f}x)")
@@ -0,0 +1,52 @@
+"""
+Compares the NumPy and scikit-learn predictor backends: cold import time
+of the predictor module and per-call fit + predict latency.
+
+Run from v3/:  python -m benchmarks.bench_predictor
+"""
+import subprocess
+import sys
+import timeit
+import numpy as np
+from crypto_portfolio.core.ai_predictor import AIPredictor
+
+REPEAT = 200
+IMPORT_REPEAT = 5
+HISTORY_DAYS = (30, 365)
+
+def import_time(statement):
+    # A fresh interpreter per run so nothing is already in sys.modules
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    runs = [
+        float(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout)
+        for _ in range(IMPORT_REPEAT)
+    ]
+    return min(runs)
+
+def fit_predict(backend, X, y, future):
+    model = AIPredictor.make_model(2, backend)
+    model.fit(X, y)
+    return model.predict(future)
+
+if __name__ == '__main__':
+    t_numpy_import = import_time("import crypto_portfolio.core.ai_predictor")
+    t_sklearn_import = import_time(
+        "import crypto_portfolio.core.ai_predictor; "
+        "import sklearn.linear_model, sklearn.preprocessing, sklearn.pipeline"
+    )
+    print("import (cold interpreter)")
+    print(f"numpy backend      : {t_numpy_import * 1000:8.1f} ms")
+    print(f"with sklearn       : {t_sklearn_import * 1000:8.1f} ms  (+{(t_sklearn_import - t_numpy_import) * 1000:.0f} ms per worker)")
+
+    rng = np.random.default_rng(0)
+    for days in HISTORY_DAYS:
+        X = np.arange(days, dtype=float).reshape(-1, 1)
+        y = 30000 + rng.normal(0, 500, days).cumsum()
+        future = np.arange(days, days + 7, dtype=float).reshape(-1, 1)
+        np.testing.assert_allclose(fit_predict('numpy', X, y, future), fit_predict('sklearn', X, y, future), rtol=1e-8)
+
+        t_numpy = min(timeit.repeat(lambda: fit_predict('numpy', X, y, future), number=1, repeat=REPEAT))
+        t_sklearn = min(timeit.repeat(lambda: fit_predict('sklearn', X, y, future), number=1, repeat=REPEAT))
+        print(f"fit + predict, {days} days")
+        print(f"numpy backend      : {t_numpy * 1e6:8.1f} us")
+        print(f"sklearn backend    : {t_sklearn * 1e6:8.1f} us  ({t_sklearn / t_numpy:.1f}x)")
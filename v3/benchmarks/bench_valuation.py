@@ -0,0 +1,84 @@
+"""
+Compares the per-route valuation loop with PortfolioValuation at 10k holdings.
+
+Run from v3/:  python -m benchmarks.bench_valuation
+"""
+import random
+import timeit
+from types import SimpleNamespace
+from crypto_portfolio.core.valuation import PortfolioValuation
+
+N_HOLDINGS = 10_000
+N_COINS = 500
+REPEAT = 20
+
+def make_assets(n):
+    rng = random.Random(42)
+    coins = [f"coin-{i}" for i in range(N_COINS)]
+    assets = [
+        SimpleNamespace(
+            coin_id=rng.choice(coins) if rng.random() < 0.9 else None,
+            quantity=rng.uniform(0.01, 100),
+            buy_price=rng.uniform(1, 50_000),
+            asset_type=rng.choice(['crypto', 'stock', 'real_estate']),
+            currency=rng.choice(['USD', 'EUR'])
+        )
+        for _ in range(n)
+    ]
+    prices = {c: rng.uniform(1, 50_000) for c in coins}
+    return assets, prices
+
+def legacy_loop(assets, prices):
+    # Same arithmetic as the old dashboard/assets/import-export loops,
+    # with the HTTP lookup replaced by a dict lookup.
+    total_val = 0
+    total_cost = 0
+    rows = []
+    type_distribution = {}
+    for a in assets:
+        current_price = a.buy_price
+        if a.coin_id:
+            price = prices.get(a.coin_id)
+            if price: current_price = price
+        value = a.quantity * current_price
+        cost = a.quantity * a.buy_price
+        pl = value - cost
+        pl_percent = (pl / cost * 100) if cost > 0 else 0
+        total_val += value
+        total_cost += cost
+        type_distribution[a.asset_type] = type_distribution.get(a.asset_type, 0) + value
+        rows.append({
+            "current_price": current_price,
+            "value": value,
+            "cost": cost,
+            "pl": pl,
+            "pl_percent": pl_percent
+        })
+    return total_val, total_cost, rows, type_distribution
+
+def engine(assets, prices):
+    valuation = PortfolioValuation.value_assets(assets, prices)
+    return valuation, valuation.rows(), valuation.by_asset_type(), valuation.by_currency()
+
+if __name__ == '__main__':
+    assets, prices = make_assets(N_HOLDINGS)
+
+    legacy_total = legacy_loop(assets, prices)[0]
+    engine_total = engine(assets, prices)[0].total_value
+    assert abs(legacy_total - engine_total) < 1e-6 * legacy_total
+
+    t_legacy = min(timeit.repeat(lambda: legacy_loop(assets, prices), number=1, repeat=REPEAT))
+    t_engine = min(timeit.repeat(lambda: engine(assets, prices), number=1, repeat=REPEAT))
+
+    # Kernel only: columns already built (e.g. cached between requests).
+    v = engine(assets, prices)[0]
+    t_kernel = min(timeit.repeat(
+        lambda: PortfolioValuation.compute(v.quantity, v.buy_price, v.current_price, type_codes=v.type_codes, type_labels=v.type_labels).by_asset_type(),
+        number=1, repeat=REPEAT
+    ))
+    print(f"{N_HOLDINGS} holdings")
+    print(f"legacy loop        : {t_legacy * 1000:8.2f} ms")
+    print(f"valuation (full)   : {t_engine * 1000:8.2f} ms  ({t_legacy / t_engine:.1f}x)")
+    print(f"valuation (kernel) : {t_kernel * 1000:8.2f} ms  ({t_legacy / t_kernel:.1f}x)")
+    print("Note: the legacy routes also made one CoinGecko request per holding; "
+          "the engine fetches all prices in a single request.")
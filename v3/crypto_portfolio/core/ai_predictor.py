@@ -1,57 +1,257 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures
-from sklearn.pipeline import make_pipeline
 from datetime import datetime, timedelta
 from ..utils.api import CoinGeckoAPI
+from ..extensions import db
+from .models import Asset
+from .price_history import PriceHistoryStore
+from .forecast_eval import ForecastEvaluationService
+from .forecast_models import PolynomialTrend, ModelSelectionService, create_model
 
 class AIPredictor:
     """
     Simple AI service to forecast crypto prices using Polynomial Regression.
+    Fitted models are kept in an LRU cache with a TTL, since CoinGecko's
+    daily history only changes once a day. When the nightly model selection
+    picked a better model from the zoo for a coin, that model is served.
     """
-    
+    CACHE_TTL = 6 * 3600 # seconds
+    CACHE_SIZE = 128
+    # 'numpy' (PolynomialTrend) or 'sklearn', imported on first use
+    BACKEND = 'numpy'
+    # (coin_id, days_history, degree, backend) or (coin_id, days_history, model_key, 'zoo')
+    # -> fitted entry, least recently used first
+    _models: "OrderedDict[tuple, dict]" = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def make_model(degree: int = 2, backend: Optional[str] = None):
+        backend = backend or AIPredictor.BACKEND
+        if backend == 'numpy':
+            return PolynomialTrend(degree)
+        if backend == 'sklearn':
+            from sklearn.linear_model import LinearRegression
+            from sklearn.preprocessing import PolynomialFeatures
+            from sklearn.pipeline import make_pipeline
+            return make_pipeline(PolynomialFeatures(degree), LinearRegression())
+        raise ValueError(f"Unknown predictor backend {backend}")
+
     @staticmethod
-    def predict_future(coin_id: str, days_history=30, days_future=7):
+    def fit(coin_id: str, days_history: int = 30, degree: int = 2, now: Optional[float] = None,
+            backend: Optional[str] = None, model_key: Optional[str] = None) -> Optional[dict]:
         """
-        Fetches history and returns (dates, historical_prices, future_dates, predicted_prices).
+        Returns the cached model for (coin, window, degree, backend), or for
+        the zoo model `model_key` when given, downloading the history and
+        fitting it only when missing or older than CACHE_TTL.
         """
-        raw_data = CoinGeckoAPI.get_coin_history(coin_id, days=days_history)
-        if not raw_data or len(raw_data) < 10:
+        backend = backend or AIPredictor.BACKEND
+        key = (coin_id, days_history, model_key, 'zoo') if model_key else (coin_id, days_history, degree, backend)
+        now = time.time() if now is None else now
+        with AIPredictor._lock:
+            entry = AIPredictor._models.get(key)
+            if entry is not None and now - entry["fitted_at"] < AIPredictor.CACHE_TTL:
+                AIPredictor._models.move_to_end(key)
+                return entry
+
+        zoo_model = create_model(model_key) if model_key else None
+        span = max(days_history, zoo_model.window) if zoo_model else days_history
+        raw_data = CoinGeckoAPI.get_coin_history(coin_id, days=span)
+        if not raw_data or len(raw_data) < max(10, zoo_model.min_points if zoo_model else 0):
             return None
-            
+
         # Parse data [timestamp, price]
         # X = days from start, y = price
         data = np.array(raw_data)
         timestamps = data[:, 0]
         prices = data[:, 1]
-        
+
         # Normalize time to "days since start"
+        X = (timestamps - timestamps[0]).reshape(-1, 1) / (1000 * 3600 * 24) # ms to days
+
+        if zoo_model:
+            model = zoo_model.fit(prices)
+        else:
+            # Model: Polynomial Regression (Degree 2 or 3 for curves)
+            model = AIPredictor.make_model(degree, backend)
+            model.fit(X, prices)
+
+        entry = {"fitted_at": now, "model": model, "model_key": model_key,
+                 "timestamps": timestamps, "prices": prices, "X": X}
+        with AIPredictor._lock:
+            AIPredictor._models[key] = entry
+            AIPredictor._models.move_to_end(key)
+            while len(AIPredictor._models) > AIPredictor.CACHE_SIZE:
+                AIPredictor._models.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def predict_future(coin_id: str, days_history=30, days_future=7, degree=2, backend=None, model='auto'):
+        """
+        Fetches history and returns (dates, historical_prices, future_dates, predicted_prices).
+        model='auto' serves the coin's selected zoo model when there is one,
+        None forces the polynomial, any other value is a zoo key.
+        """
+        choice = ModelSelectionService.best(coin_id, days_future) if model == 'auto' else None
+        model_key = choice["model"] if choice else (None if model in ('auto', None) else model)
+        entry = AIPredictor.fit(coin_id, days_history, degree, backend=backend, model_key=model_key)
+        if entry is None:
+            return None
+        model, X, timestamps, prices = entry["model"], entry["X"], entry["timestamps"], entry["prices"]
         start_time = timestamps[0]
-        X = (timestamps - start_time).reshape(-1, 1) / (1000 * 3600 * 24) # ms to days
-        y = prices
-        
-        # Model: Polynomial Regression (Degree 2 or 3 for curves)
-        degree = 2
-        model = make_pipeline(PolynomialFeatures(degree), LinearRegression())
-        model.fit(X, y)
-        
+
         # Predict Future
         last_day = X[-1][0]
         future_days = np.array([last_day + i for i in range(1, days_future + 1)]).reshape(-1, 1)
-        
-        # Combine X for full timeline plotting
-        all_days = np.concatenate((X, future_days))
-        all_predictions = model.predict(all_days)
-        
+        if model_key:
+            predicted = model.forecast(days_future)
+            # Zoo models may need a longer history than the one displayed
+            shown = len(timestamps) - min(len(timestamps), days_history + 1)
+        else:
+            # Combine X for full timeline plotting
+            all_days = np.concatenate((X, future_days))
+            predicted = model.predict(all_days)[len(X):]
+            shown = 0
+
         # Convert days back to dates
-        historical_dates = [datetime.fromtimestamp(ts/1000).strftime('%Y-%m-%d') for ts in timestamps]
+        historical_dates = [datetime.fromtimestamp(ts/1000).strftime('%Y-%m-%d') for ts in timestamps[shown:]]
         future_dates_list = [datetime.fromtimestamp((start_time + d[0]*24*3600*1000)/1000).strftime('%Y-%m-%d') for d in future_days]
-        
+
         return {
             "historical_dates": historical_dates,
-            "historical_prices": prices.tolist(),
+            "historical_prices": prices[shown:].tolist(),
             "future_dates": future_dates_list,
-            "predicted_prices": all_predictions[len(X):].tolist(),
-            "trend": "up" if all_predictions[-1] > prices[-1] else "down",
-            "confidence": 85 # Mock confidence
+            "predicted_prices": predicted.tolist(),
+            "trend": "up" if predicted[-1] > prices[-1] else "down",
+            "model": model_key or f"poly{degree}",
+            **AIPredictor.confidence(coin_id, days_history, degree, days_future, model_key)
         }
+
+    @staticmethod
+    def confidence(coin_id: str, days_history: int, degree: int, days_future: int,
+                   model_key: Optional[str] = None) -> dict:
+        """
+        Walk-forward track record of this model setup for the coin, from the
+        nightly evaluation; confidence is None until the coin is evaluated.
+        A zoo model is scored by the cross-validation that selected it.
+        """
+        if model_key:
+            choice = ModelSelectionService.best(coin_id, days_future)
+            evaluation = dict(choice, confidence=round(choice["directional_accuracy"] * 100)) \
+                if choice and choice["model"] == model_key else None
+        else:
+            evaluation = ForecastEvaluationService.lookup(coin_id, days_history, degree, days_future)
+        return {
+            "confidence": evaluation["confidence"] if evaluation else None,
+            "evaluation": evaluation
+        }
+
+    @staticmethod
+    def polynomial_trends(days: np.ndarray, prices: np.ndarray, future_days: np.ndarray,
+                          degree: int = 2, min_points: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Least-squares polynomial trend of every column of a (T, N) price
+        matrix on the shared time axis `days`. Columns starting on the same
+        row share one design matrix, so all of them are fitted with a single
+        lstsq call (one per distinct start when histories differ in length).
+        Returns (coefficients (degree + 1, N), forecasts (F, N)); columns
+        with fewer than min_points prices stay NaN.
+        """
+        prices = np.asarray(prices, dtype=float)
+        days = np.asarray(days, dtype=float)
+        coefs = np.full((degree + 1, prices.shape[1]), np.nan)
+        valid = np.isfinite(prices)
+        starts = np.where(valid.any(axis=0), valid.argmax(axis=0), len(days))
+        for start in np.unique(starts):
+            if len(days) - start < min_points:
+                continue
+            cols = np.flatnonzero(starts == start)
+            X = np.vander(days[start:], degree + 1, increasing=True)
+            coefs[:, cols] = np.linalg.lstsq(X, prices[start:, cols], rcond=None)[0]
+        forecasts = np.vander(np.asarray(future_days, dtype=float), degree + 1, increasing=True) @ coefs
+        return coefs, forecasts
+
+    @staticmethod
+    def predict_batch(coin_ids: Sequence[str], days_history: int = 30, days_future: int = 7, degree: int = 2,
+                      refresh_prices: bool = True) -> Dict[str, dict]:
+        """
+        predict_future for many coins at once, from the stored daily price
+        history instead of one download per coin. Coins with a selected zoo
+        model use it; the others share the batched polynomial fit. Coins
+        without enough history are left out.
+        """
+        coin_ids = sorted(set(coin_ids))
+        if not coin_ids:
+            return {}
+        if refresh_prices:
+            PriceHistoryStore.refresh(coin_ids, days=days_history)
+        dates, prices = PriceHistoryStore.matrix(coin_ids, days=days_history)
+        if len(dates) < 2:
+            return {}
+        days = np.array([d.toordinal() for d in dates], dtype=float) - dates[0].toordinal()
+        future_days = days[-1] + np.arange(1, days_future + 1)
+        _, forecasts = AIPredictor.polynomial_trends(days, prices, future_days, degree)
+        model_keys = {}
+        choices = {c: ModelSelectionService.best(c, days_future) for c in coin_ids}
+        chosen = [c for c in coin_ids if choices[c]]
+        column = {c: j for j, c in enumerate(coin_ids)}
+        if chosen:
+            models = {c: create_model(choices[c]["model"]) for c in chosen}
+            span = max([days_history] + [m.window for m in models.values()])
+            _, long_prices = PriceHistoryStore.matrix(chosen, days=span)
+            for k, coin in enumerate(chosen):
+                series = long_prices[:, k][np.isfinite(long_prices[:, k])] if len(long_prices) else []
+                if len(series) < max(10, models[coin].min_points):
+                    continue
+                with np.errstate(all='ignore'):
+                    forecasts[:, column[coin]] = models[coin].fit(series).forecast(days_future)
+                model_keys[coin] = choices[coin]["model"]
+
+        future_dates = [(dates[-1] + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(1, days_future + 1)]
+        labels = [d.strftime('%Y-%m-%d') for d in dates]
+        results = {}
+        for j, coin in enumerate(coin_ids):
+            if not np.isfinite(forecasts[:, j]).all():
+                continue
+            has = np.isfinite(prices[:, j])
+            start = int(has.argmax())
+            results[coin] = {
+                "historical_dates": labels[start:],
+                "historical_prices": prices[start:, j].tolist(),
+                "future_dates": future_dates,
+                "predicted_prices": forecasts[:, j].tolist(),
+                "trend": "up" if forecasts[-1, j] > prices[-1, j] else "down",
+                "model": model_keys.get(coin, f"poly{degree}"),
+                **AIPredictor.confidence(coin, days_history, degree, days_future, model_keys.get(coin))
+            }
+        return results
+
+    @staticmethod
+    def most_held_coins(limit: int = 10) -> List[str]:
+        """Coin ids held by the most users, for warming the cache."""
+        rows = db.session.query(Asset.coin_id, db.func.count(db.distinct(Asset.user_id)).label('holders')) \
+            .filter(Asset.coin_id != None) \
+            .group_by(Asset.coin_id) \
+            .order_by(db.desc('holders'), Asset.coin_id) \
+            .limit(limit).all()
+        return [r[0] for r in rows if r[0]]
+
+    @staticmethod
+    def prewarm(coin_ids: Sequence[str], days_history: int = 30, degree: int = 2) -> int:
+        """Fits (or refreshes) the models served for the given coins. Returns how many are cached."""
+        fitted = 0
+        for coin in coin_ids:
+            choice = ModelSelectionService.best(coin)
+            fitted += AIPredictor.fit(coin, days_history, degree, model_key=choice and choice["model"]) is not None
+        return fitted
+
+    @staticmethod
+    def invalidate(coin_id: Optional[str] = None):
+        with AIPredictor._lock:
+            if coin_id is None:
+                AIPredictor._models.clear()
+            else:
+                for key in [k for k in AIPredictor._models if k[0] == coin_id]:
+                    del AIPredictor._models[key]
@@ -0,0 +1,267 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Sequence, Tuple
+from ..extensions import db
+from .models import AutoTradeSettings, ExchangeCredential, Transaction
+from .lots import LotBook, LotService, EPSILON
+from .trading_engine import TradingEngine
+
+@dataclass
+class AutoTradeOrder:
+    """
+    One order decided by the auto-trading rules for a user.
+    """
+    user_id: str
+    credential_id: str
+    exchange_id: str
+    symbol: str
+    side: str
+    amount: float
+    price: float # last price when decided
+    reason: str # entry, take_profit, stop_loss
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread placing orders on one exchange.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AutoTrader:
+    """
+    Take-profit / stop-loss rules of AutoTradeSettings, the live counterpart
+    of the backtest: hold `max_position_size` (quote currency) of every
+    configured pair, sell when the price moved TP% above or SL% below the
+    average entry, and buy back in on the next tick.
+    """
+
+    @staticmethod
+    def pairs(settings: AutoTradeSettings) -> List[str]:
+        return [p.strip() for p in (settings.trading_pairs_str or '').split(',') if p.strip()]
+
+    @staticmethod
+    def decide(settings: AutoTradeSettings, credential: ExchangeCredential, book: LotBook,
+               prices: Dict[str, float]) -> List[AutoTradeOrder]:
+        """Orders for one user given its bot positions and the exchange's last prices."""
+        orders = []
+        positions = book.positions()
+        for pair in AutoTrader.pairs(settings):
+            price = prices.get(pair)
+            if not price or price <= 0:
+                continue
+            position = positions.get(LotBook.key(pair))
+            quantity = position["quantity"] if position else 0.0
+            order = dict(user_id=settings.user_id, credential_id=credential.id,
+                         exchange_id=credential.exchange_id.lower(), symbol=pair, price=price)
+            if quantity > EPSILON:
+                change = (price / position["average_price"] - 1) * 100
+                if change >= (settings.take_profit_percentage or 0):
+                    orders.append(AutoTradeOrder(side='sell', amount=quantity, reason='take_profit', **order))
+                elif change <= -(settings.stop_loss_percentage or 0):
+                    orders.append(AutoTradeOrder(side='sell', amount=quantity, reason='stop_loss', **order))
+            elif settings.max_position_size and settings.max_position_size > 0:
+                orders.append(AutoTradeOrder(side='buy', amount=settings.max_position_size / price,
+                                             reason='entry', **order))
+        return orders
+
+
+class AutoTradeScheduler:
+    """
+    Runs AutoTrader for every enabled user on each tick: one ticker request
+    per exchange, decisions in memory, orders placed concurrently by a
+    bounded thread pool under a per-exchange rate limit, and all resulting
+    transactions committed together.
+    """
+    WORKERS = 16
+    # exchange_id -> orders per second; other exchanges use their ccxt rateLimit
+    RATE_LIMITS: Dict[str, float] = {}
+    QUERY_CHUNK = 500
+    # user_id -> LotBook of the bot's own trades (strategy 'auto_trade')
+    _books: Dict[str, LotBook] = {}
+    _limiters: Dict[str, RateLimiter] = {}
+    _running = threading.Lock()
+
+    @staticmethod
+    def enabled_accounts(user_ids: Optional[Sequence[str]] = None) -> List[Tuple[AutoTradeSettings, ExchangeCredential]]:
+        """Enabled settings with the user's first active exchange credential."""
+        query = db.session.query(AutoTradeSettings, ExchangeCredential) \
+            .join(ExchangeCredential, ExchangeCredential.user_id == AutoTradeSettings.user_id) \
+            .filter(AutoTradeSettings.enabled == True, ExchangeCredential.is_active == True)
+        if user_ids is not None:
+            query = query.filter(AutoTradeSettings.user_id.in_(list(user_ids)))
+        accounts = {}
+        for settings, credential in query.order_by(AutoTradeSettings.user_id, ExchangeCredential.id):
+            accounts.setdefault(settings.user_id, (settings, credential))
+        return list(accounts.values())
+
+    @staticmethod
+    def symbols(exchange_id: str) -> List[str]:
+        """Pairs traded by enabled users on one exchange."""
+        return sorted({
+            p for settings, credential in AutoTradeScheduler.enabled_accounts()
+            if credential.exchange_id.lower() == exchange_id for p in AutoTrader.pairs(settings)
+        })
+
+    @staticmethod
+    def books(user_ids: Sequence[str]) -> Dict[str, LotBook]:
+        """Bot positions per user; missing ones are replayed with one query per chunk."""
+        missing = [u for u in user_ids if u not in AutoTradeScheduler._books]
+        for start in range(0, len(missing), AutoTradeScheduler.QUERY_CHUNK):
+            chunk = missing[start:start + AutoTradeScheduler.QUERY_CHUNK]
+            for user_id in chunk:
+                AutoTradeScheduler._books[user_id] = LotBook()
+            txns = Transaction.query.filter(Transaction.user_id.in_(chunk), Transaction.strategy == 'auto_trade') \
+                .order_by(Transaction.date, Transaction.id)
+            for txn in txns:
+                AutoTradeScheduler._books[txn.user_id].apply(txn)
+        return {u: AutoTradeScheduler._books[u] for u in user_ids}
+
+    @staticmethod
+    def limiter(exchange_id: str, client) -> RateLimiter:
+        limiter = AutoTradeScheduler._limiters.get(exchange_id)
+        if limiter is None:
+            rate = AutoTradeScheduler.RATE_LIMITS.get(exchange_id) or 1000.0 / max(getattr(client, 'rateLimit', 1000) or 1000, 1)
+            limiter = AutoTradeScheduler._limiters.setdefault(exchange_id, RateLimiter(rate))
+        return limiter
+
+    @staticmethod
+    def _submit(client, limiter: RateLimiter, order: AutoTradeOrder) -> dict:
+        """Runs in a worker thread: only exchange I/O, no database access."""
+        limiter.acquire()
+        started = time.perf_counter()
+        try:
+            placed = client.create_order(order.symbol, 'market', order.side, order.amount)
+            return {"order": order, "placed": placed, "latency": time.perf_counter() - started}
+        except Exception as e:
+            return {"order": order, "error": str(e), "latency": time.perf_counter() - started}
+
+    @staticmethod
+    def tick(user_ids: Optional[Sequence[str]] = None, workers: Optional[int] = None) -> dict:
+        """
+        One scheduling pass. Returns counts of evaluated users, placed,
+        unfilled (pending) and failed orders. A tick still running makes the
+        next one a no-op.
+        """
+        if not AutoTradeScheduler._running.acquire(blocking=False):
+            return {"skipped": True}
+        try:
+            return AutoTradeScheduler._tick(user_ids, workers or AutoTradeScheduler.WORKERS)
+        finally:
+            AutoTradeScheduler._running.release()
+
+    @staticmethod
+    def _tick(user_ids, workers: int) -> dict:
+        accounts = AutoTradeScheduler.enabled_accounts(user_ids)
+        books = AutoTradeScheduler.books([s.user_id for s, _ in accounts])
+
+        by_exchange: Dict[str, List[Tuple[AutoTradeSettings, ExchangeCredential]]] = {}
+        for settings, credential in accounts:
+            by_exchange.setdefault(credential.exchange_id.lower(), []).append((settings, credential))
+
+        jobs = []
+        for exchange_id, members in by_exchange.items():
+            symbols = sorted({p for s, _ in members for p in AutoTrader.pairs(s)})
+            try:
+                public = TradingEngine.get_exchange_client(members[0][1], load_markets=True)
+                # One mistyped pair must not cost the whole exchange its prices
+                symbols = [s for s in symbols if s in public.markets]
+                tickers = public.fetch_tickers(symbols) if symbols else {}
+            except Exception as e:
+                print(f"Auto trade: no prices from {exchange_id}: {e}")
+                continue
+            prices = {s: t.get('last') or t.get('close') for s, t in tickers.items()}
+            for settings, credential in members:
+                orders = AutoTrader.decide(settings, credential, books[settings.user_id], prices)
+                if not orders:
+                    continue
+                try:
+                    client = TradingEngine.get_exchange_client(credential, load_markets=True)
+                except Exception as e:
+                    print(f"Auto trade error for user {settings.user_id}: {e}")
+                    continue
+                limiter = AutoTradeScheduler.limiter(exchange_id, client)
+                jobs.extend((client, limiter, order) for order in orders)
+
+        results = []
+        if jobs:
+            with ThreadPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                results = list(pool.map(lambda job: AutoTradeScheduler._submit(*job), jobs))
+
+        fills = []
+        pending = 0
+        for result in results:
+            order = result["order"]
+            if "error" in result:
+                print(f"Auto trade order failed for user {order.user_id}: {result['error']}")
+                continue
+            fill = result["placed"] or {}
+            quantity = order.amount if fill.get('filled') is None else fill['filled']
+            if fill.get('status') == 'open' or quantity <= EPSILON:
+                # Not filled (yet): the exchange sync imports whatever fills later
+                print(f"Auto trade order {fill.get('id')} of user {order.user_id} is not filled, not booked")
+                pending += 1
+                continue
+            txn = TradingEngine.transaction_for(order.user_id, order.symbol, order.side, quantity,
+                                                fill.get('average') or fill.get('price') or order.price, 'auto_trade',
+                                                fill.get('id'))
+            db.session.add(txn)
+            LotService.record(txn)
+            fills.append(txn)
+        placed = len(fills)
+        if fills:
+            try:
+                db.session.flush()
+                # Plain copies: committed rows are expired and would be reloaded one by one
+                booked = [SimpleNamespace(user_id=t.user_id, symbol=t.symbol, type=t.type, quantity=t.quantity,
+                                          price=t.price, date=t.date) for t in fills]
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                # The bot positions are replayed from the ledger on the next tick
+                for user_id in {t.user_id for t in fills}:
+                    AutoTradeScheduler.invalidate(user_id)
+                print(f"Auto trade: booking {len(fills)} fills failed: {e}")
+                booked = []
+            # Only committed fills move the bot positions
+            for txn in booked:
+                books[txn.user_id].apply(txn)
+        latencies = sorted(r["latency"] for r in results)
+        return {
+            "users": len(accounts),
+            "orders": placed,
+            "pending": pending,
+            "failed": len(results) - placed - pending,
+            "max_latency": latencies[-1] if latencies else 0.0
+        }
+
+    @staticmethod
+    def invalidate(user_id: Optional[str] = None):
+        if user_id is None:
+            AutoTradeScheduler._books.clear()
+        else:
+            AutoTradeScheduler._books.pop(user_id, None)
@@ -0,0 +1,247 @@
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from ..utils.api import CoinGeckoAPI
+from ..extensions import db
+from .models import User, Asset, AutoTradeSettings
+from .parallel import map_tasks
+from .price_history import PriceHistoryStore
+
+DEFAULT_TAKE_PROFITS = (1.0, 2.0, 3.0, 5.0, 8.0, 10.0, 15.0, 20.0)
+DEFAULT_STOP_LOSSES = (1.0, 2.0, 3.0, 5.0, 8.0, 10.0, 15.0)
+
+@dataclass
+class BacktestResult:
+    """
+    Outcome of one take-profit / stop-loss pair on one price series.
+    """
+    take_profit_percentage: float
+    stop_loss_percentage: float
+    trades: int
+    profit_loss: float
+    profit_loss_percentage: float
+    win_rate: float
+    max_drawdown: float
+    max_drawdown_percentage: float
+    cashed_out: float
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _first_passages(prices: np.ndarray, up: np.ndarray, down: np.ndarray,
+                    max_elements: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    For every entry bar i and every level, the first later bar whose close
+    reaches entry * up[k] (resp. falls to entry * down[k]); len(prices) if never.
+    Running max/min of the forward price ratios are monotonic along the lag,
+    so the first passage is a count of lags still below (above) the level.
+    The lookahead grows geometrically and only unresolved rows are extended,
+    so the work follows trade durations rather than the series length.
+    """
+    n = len(prices)
+    padded = np.concatenate([prices, np.full(n, np.nan)])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, n)[:n]
+    levels = np.concatenate([up, down])
+    is_up = np.arange(len(levels)) < len(up)
+    passage = np.full((n, len(levels)), -1, dtype=np.intp)
+
+    rows = np.arange(n)
+    lookahead = 16
+    while rows.size:
+        width = min(lookahead, n - 1) + 1
+        for start in range(0, rows.size, max(1, max_elements // width)):
+            chunk = rows[start:start + max(1, max_elements // width)]
+            ratio = windows[chunk, :width] / prices[chunk, None]
+            high = np.fmax.accumulate(np.where(np.isnan(ratio), -np.inf, ratio), axis=1)[:, 1:]
+            low = np.fmin.accumulate(np.where(np.isnan(ratio), np.inf, ratio), axis=1)[:, 1:]
+            reaches_end = chunk + width - 1 >= n - 1
+            for k, level in enumerate(levels):
+                todo = passage[chunk, k] < 0
+                if is_up[k]:
+                    lag = np.count_nonzero(high < level, axis=1) + 1
+                else:
+                    lag = np.count_nonzero(low > level, axis=1) + 1
+                hit = lag < width
+                done = todo & (hit | reaches_end)
+                passage[chunk[done], k] = np.where(hit[done], chunk[done] + lag[done], n)
+        rows = rows[np.any(passage[rows] < 0, axis=1)]
+        lookahead *= 4
+    return passage[:, :len(up)], passage[:, len(up):]
+
+
+def _replay(prices: np.ndarray, exits: np.ndarray, size: float, cashout: Optional[Tuple[float, float]]) -> dict:
+    """
+    Walks the trade chain: always long `size` quote units, entering at a
+    close and re-entering at the close that triggered the previous exit.
+    The last trade is closed at the final price if no level was hit.
+    """
+    n = len(prices)
+    entries, outs = [], []
+    i = 0
+    while i < n - 1:
+        e = min(exits[i], n - 1)
+        entries.append(i)
+        outs.append(e)
+        i = e
+    if not entries:
+        return {"trades": 0, "pnl": 0.0, "wins": 0, "drawdown": 0.0, "drawdown_pct": 0.0, "cashed_out": 0.0}
+
+    entries = np.array(entries)
+    outs = np.array(outs)
+    pnl = size * (prices[outs] / prices[entries] - 1)
+
+    # Equity at every bar: realized P/L of closed trades + open trade marked to market
+    realized_before = np.concatenate([[0.0], np.cumsum(pnl)[:-1]])
+    lengths = outs - entries
+    trade_of_bar = np.repeat(np.arange(len(entries)), lengths)
+    bars = np.arange(entries[0] + 1, outs[-1] + 1)
+    equity = size + realized_before[trade_of_bar] + size * (prices[bars] / prices[entries[trade_of_bar]] - 1)
+    equity = np.concatenate([[size], equity])
+    peaks = np.maximum.accumulate(equity)
+    drawdown = peaks - equity
+    # A position size of 0 leaves nothing to draw down from
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown_pct = np.where(peaks > 0, drawdown / peaks, 0.0)
+
+    cashed_out = 0.0
+    if cashout is not None:
+        fraction, threshold = cashout
+        pending = 0.0
+        for p in pnl.tolist():
+            pending += p
+            if pending > 0 and pending >= threshold:
+                cashed_out += pending * fraction
+                pending = 0.0
+
+    return {
+        "trades": len(pnl),
+        "pnl": float(pnl.sum()),
+        "wins": int(np.count_nonzero(pnl > 0)),
+        "drawdown": float(drawdown.max()),
+        "drawdown_pct": float(drawdown_pct.max()),
+        "cashed_out": cashed_out
+    }
+
+
+def _run_grid(args) -> List[BacktestResult]:
+    """
+    Backtests every (take_profit, stop_loss) pair of the grid on one price
+    series. Module-level so a process pool can pickle it.
+    """
+    prices, take_profits, stop_losses, size, cashout, max_elements = args
+    up = 1 + np.asarray(take_profits) / 100
+    down = 1 - np.asarray(stop_losses) / 100
+    up_idx, down_idx = _first_passages(prices, up, down, max_elements)
+
+    results = []
+    for a, tp in enumerate(take_profits):
+        for b, sl in enumerate(stop_losses):
+            # Bars only have closes: when both levels are crossed on the same
+            # bar, the exit is that bar's close either way
+            exits = np.minimum(up_idx[:, a], down_idx[:, b])
+            r = _replay(prices, exits, size, cashout)
+            results.append(BacktestResult(
+                take_profit_percentage=float(tp),
+                stop_loss_percentage=float(sl),
+                trades=r["trades"],
+                profit_loss=r["pnl"],
+                profit_loss_percentage=r["pnl"] / size * 100 if size else 0.0,
+                win_rate=r["wins"] / r["trades"] * 100 if r["trades"] else 0.0,
+                max_drawdown=r["drawdown"],
+                max_drawdown_percentage=r["drawdown_pct"] * 100,
+                cashed_out=r["cashed_out"]
+            ))
+    return results
+
+
+class Backtester:
+    """
+    Replays daily closes against take-profit / stop-loss rules.
+    """
+    # Upper bound on floats held by one block of forward price ratios
+    MAX_BLOCK_ELEMENTS = 2_000_000
+
+    @staticmethod
+    def run(prices: Sequence[float], take_profits: Sequence[float], stop_losses: Sequence[float],
+            position_size: float = 1000.0, cashout: Optional[Tuple[float, float]] = None,
+            workers: int = 0) -> List[BacktestResult]:
+        """
+        Backtests the full TP x SL grid (percentages) on one price series.
+        cashout: (fraction of profit withdrawn, profit threshold) or None.
+        workers > 0 splits the take-profit levels over a process pool.
+        """
+        prices = np.asarray(prices, dtype=float)
+        prices = prices[np.isfinite(prices) & (prices > 0)]
+        if len(prices) < 2 or not len(take_profits) or not len(stop_losses):
+            return []
+        tasks = [
+            (prices, [tp], list(stop_losses), position_size, cashout, Backtester.MAX_BLOCK_ELEMENTS)
+            for tp in take_profits
+        ] if workers else [
+            (prices, list(take_profits), list(stop_losses), position_size, cashout, Backtester.MAX_BLOCK_ELEMENTS)
+        ]
+        return [r for part in map_tasks(_run_grid, tasks, workers) for r in part]
+
+
+class BacktestService:
+    """
+    Backtests a user's AutoTradeSettings on the stored price history of each
+    configured trading pair.
+    """
+    HISTORY_DAYS = 365
+
+    @staticmethod
+    def resolve_coin(user: User, pair: str) -> Optional[str]:
+        """CoinGecko id for the base currency of a 'BASE/QUOTE' pair."""
+        base = pair.split('/')[0].strip().upper()
+        asset = user.assets.filter(db.func.upper(Asset.symbol) == base).first()
+        if asset and asset.coin_id:
+            return asset.coin_id
+        return CoinGeckoAPI.search_coin(base)
+
+    @staticmethod
+    def for_settings(user: User, settings: AutoTradeSettings,
+                     take_profits: Optional[Sequence[float]] = None,
+                     stop_losses: Optional[Sequence[float]] = None,
+                     days: int = HISTORY_DAYS, workers: int = 0) -> Dict[str, dict]:
+        """
+        pair -> {"current": result for the saved TP/SL, "grid": all results,
+        "best": the most profitable result, "history_start"/"history_days":
+        the stored window tested}, or {"error": ...}.
+        """
+        if settings.id is None:
+            db.session.flush() # fills in the column defaults of freshly created settings
+        take_profits = sorted(set(take_profits or DEFAULT_TAKE_PROFITS) | {settings.take_profit_percentage})
+        stop_losses = sorted(set(stop_losses or DEFAULT_STOP_LOSSES) | {settings.stop_loss_percentage})
+        cashout = None
+        if settings.auto_cashout_enabled:
+            cashout = ((settings.cashout_percentage or 0) / 100, settings.min_profit_to_cashout or 0)
+        pairs = [p.strip() for p in (settings.trading_pairs_str or '').split(',') if p.strip()]
+
+        report = {}
+        for pair in pairs:
+            coin_id = BacktestService.resolve_coin(user, pair)
+            if not coin_id:
+                report[pair] = {"error": "Unknown coin"}
+                continue
+            PriceHistoryStore.refresh([coin_id], days=days)
+            dates, prices = PriceHistoryStore.matrix([coin_id], days=days)
+            results = Backtester.run(prices[:, 0] if prices.size else [], take_profits, stop_losses,
+                                     settings.max_position_size or 0.0, cashout, workers)
+            if not results:
+                report[pair] = {"error": "Not enough price history"}
+                continue
+            current = next(r for r in results
+                           if r.take_profit_percentage == settings.take_profit_percentage
+                           and r.stop_loss_percentage == settings.stop_loss_percentage)
+            # CoinGecko may not reach back `days` days; report the window actually tested
+            report[pair] = {
+                "coin_id": coin_id,
+                "history_start": dates[0].isoformat(),
+                "history_days": (dates[-1] - dates[0]).days + 1,
+                "current": current.to_dict(),
+                "best": max(results, key=lambda r: r.profit_loss).to_dict(),
+                "grid": [r.to_dict() for r in results]
+            }
+        return report
@@ -0,0 +1,179 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+from .price_history import PriceHistoryStore
+
+@dataclass
+class CovarianceState:
+    """
+    Running sums of daily returns over a trailing window:
+    sums = sum(r), cross = sum(r r^T), over the rows kept in `returns`.
+    """
+    coin_ids: Tuple[str, ...]
+    window: int
+    returns: np.ndarray
+    sums: np.ndarray
+    cross: np.ndarray
+    last_date: Optional[date]
+    last_prices: np.ndarray
+    updates: int = 0
+
+    @classmethod
+    def build(cls, coin_ids, window, returns, last_date, last_prices) -> 'CovarianceState':
+        returns = returns[-window:]
+        return cls(
+            coin_ids=tuple(coin_ids),
+            window=window,
+            returns=returns,
+            sums=returns.sum(axis=0),
+            cross=returns.T @ returns,
+            last_date=last_date,
+            last_prices=last_prices
+        )
+
+    def push(self, r: np.ndarray):
+        """Adds one day of returns and drops the oldest once the window is full."""
+        self.returns = np.vstack([self.returns, r])
+        self.sums += r
+        self.cross += np.outer(r, r)
+        if len(self.returns) > self.window:
+            old = self.returns[0]
+            self.returns = self.returns[1:]
+            self.sums -= old
+            self.cross -= np.outer(old, old)
+        self.updates += 1
+        # Re-derive the sums now and then so rounding errors cannot build up
+        if self.updates >= self.window:
+            self.sums = self.returns.sum(axis=0)
+            self.cross = self.returns.T @ self.returns
+            self.updates = 0
+
+    @property
+    def observations(self) -> int:
+        return len(self.returns)
+
+    def covariance(self) -> np.ndarray:
+        n = self.observations
+        if n < 2:
+            return np.full_like(self.cross, np.nan)
+        return (self.cross - np.outer(self.sums, self.sums) / n) / (n - 1)
+
+    def correlation(self) -> np.ndarray:
+        cov = self.covariance()
+        sd = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.outer(sd, sd)
+        corr = np.clip(corr, -1, 1)
+        np.fill_diagonal(corr, np.where(sd > 0, 1.0, np.nan))
+        return corr
+
+
+class CorrelationService:
+    """
+    Covariance and correlation of daily returns across a set of coins,
+    cached per (coin set, window) and rolled forward as new days arrive.
+    Only days where every coin has a price count, so coins whose history
+    covers less than MIN_COVERAGE of the window (or nothing at all) are
+    left out instead of shrinking the sample of every pair.
+    """
+    DEFAULT_WINDOW = 90
+    MIN_COVERAGE = 0.5
+    _cache: Dict[Tuple[Tuple[str, ...], int], CovarianceState] = {}
+
+    @staticmethod
+    def _returns(prices: np.ndarray) -> np.ndarray:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = prices[1:] / prices[:-1] - 1
+        # Only days where every coin has a price contribute
+        return r[np.all(np.isfinite(r), axis=1)]
+
+    @staticmethod
+    def _build(coin_ids: Tuple[str, ...], window: int, until: date) -> Optional[CovarianceState]:
+        # The window ends at the last day every coin has a price for, which may be before today
+        dates, prices = PriceHistoryStore.matrix(coin_ids, days=window + 7, today=until, until=until)
+        if len(dates) < 2:
+            return None
+        return CovarianceState.build(
+            coin_ids, window, CorrelationService._returns(prices), dates[-1], prices[-1]
+        )
+
+    @staticmethod
+    def _roll_forward(state: CovarianceState, until: date):
+        # Days a lagging coin has no price for yet would only add forward-filled zero returns
+        dates, prices = PriceHistoryStore.matrix(state.coin_ids, after=state.last_date, until=until)
+        if not dates:
+            return
+        prices = PriceHistoryStore.forward_fill(np.vstack([state.last_prices, prices]))
+        for r in CorrelationService._returns(prices):
+            state.push(r)
+        state.last_date = dates[-1]
+        state.last_prices = prices[-1]
+
+    @staticmethod
+    def eligible(coin_ids: Sequence[str], window: int) -> Tuple[str, ...]:
+        """The coins with at least max(2, MIN_COVERAGE * window) days of history before the common last day."""
+        ranges = PriceHistoryStore.ranges(sorted(set(coin_ids)))
+        if not ranges:
+            return ()
+        common = min(last for _, last in ranges.values())
+        need = max(2, int(window * CorrelationService.MIN_COVERAGE))
+        return tuple(c for c, (first, _) in sorted(ranges.items()) if (common - first).days >= need)
+
+    @staticmethod
+    def get(coin_ids: Sequence[str], window: int = DEFAULT_WINDOW) -> Optional[CovarianceState]:
+        """
+        Returns the up-to-date state for the eligible ones among these coins,
+        building it with a single matrix product the first time and updating
+        it in O(N^2) per new day afterwards.
+        """
+        coins = CorrelationService.eligible(coin_ids, window)
+        if not coins:
+            return None
+        key = (coins, window)
+        state = CorrelationService._cache.get(key)
+        common = min(PriceHistoryStore.latest_dates(coins).values())
+
+        if state is None:
+            state = CorrelationService._build(coins, window, common)
+            if state is None:
+                return None
+            CorrelationService._cache[key] = state
+        elif common > state.last_date:
+            CorrelationService._roll_forward(state, common)
+        return state
+
+    @staticmethod
+    def report(coin_ids: Sequence[str], labels: Optional[Dict[str, str]] = None,
+               window: int = DEFAULT_WINDOW) -> Optional[dict]:
+        """
+        JSON-friendly matrices plus the average pairwise correlation.
+        """
+        state = CorrelationService.get(coin_ids, window)
+        if state is None:
+            return None
+        labels = labels or {}
+        corr = state.correlation()
+        cov = state.covariance()
+        n = len(state.coin_ids)
+        off_diag = corr[~np.eye(n, dtype=bool)]
+        off_diag = off_diag[np.isfinite(off_diag)]
+
+        def to_list(m):
+            return [[float(x) if np.isfinite(x) else None for x in row] for row in m]
+
+        return {
+            "coins": list(state.coin_ids),
+            "labels": [labels.get(c, c) for c in state.coin_ids],
+            "excluded": [labels.get(c, c) for c in sorted(set(coin_ids) - set(state.coin_ids))],
+            "window": window,
+            "observations": state.observations,
+            "as_of": state.last_date.isoformat() if state.last_date else None,
+            "covariance": to_list(cov),
+            "correlation": to_list(corr),
+            "average_correlation": float(off_diag.mean()) if off_diag.size else None
+        }
+
+    @staticmethod
+    def invalidate():
+        CorrelationService._cache.clear()
@@ -1,6 +1,7 @@
 from typing import List, Optional
 from ..extensions import db
 from .models import User, Asset, Transaction, Goal, Alert, Simulation, Dividend, Post, AutoTradeSettings
+from .lots import LotService
 
 class DBPortfolioAdapter:
     def __init__(self, user: User):
@@ -32,6 +33,7 @@ class DBPortfolioAdapter:
     def add_transaction(self, transaction: Transaction):
         transaction.user_id = self.user.id
         db.session.add(transaction)
+        LotService.record(transaction)
 
     def get_transactions(self) -> List[Transaction]:
         return self.user.transactions.order_by(Transaction.date.desc()).all()
@@ -1,3 +1,5 @@
+from flask_login import current_user
+from flask_socketio import join_room
 from ..extensions import socketio, db
 from .models import Asset
 from ..utils.api import CoinGeckoAPI
@@ -26,3 +28,9 @@ def background_price_fetch(app):
                         # print(f"Emitted prices for {len(prices)} coins")
         except Exception as e:
             print(f"Error in background fetch: {e}")
+
+@socketio.on('connect')
+def join_user_room():
+    """Each logged-in client joins a room named after its user id for private pushes."""
+    if current_user.is_authenticated:
+        join_room(current_user.id)
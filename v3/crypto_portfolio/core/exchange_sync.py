@@ -0,0 +1,255 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+import ccxt
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from ..extensions import db, socketio
+from ..utils.api import CoinGeckoAPI
+from .models import Asset, ExchangeCredential, Transaction
+from .lots import LotService, EPSILON
+from .trading_engine import TradingEngine
+
+class ExchangeSyncService:
+    """
+    Imports fills made on users' exchange accounts, in the app or not, into
+    the ledger. Each credential keeps a `trades_since` cursor, so a run only
+    asks the exchange for newer trades; trades already booked (by trade id,
+    or by order id for orders placed through the app) are skipped. Exchange
+    I/O runs in a thread pool across users, the database work in one commit.
+    Assets whose broker is the exchange are set to the fetched balances,
+    except fiat and stablecoin cash, which is not tracked as an asset.
+    """
+    WORKERS = 8
+    PAGE_SIZE = 500
+    MAX_PAGES = 20 # per symbol and run; the cursor resumes there next time
+    INITIAL_LOOKBACK_DAYS = 30
+    # Quote currencies tried on exchanges that only list trades per market
+    QUOTES = ('USDT', 'USDC', 'USD', 'EUR', 'BTC')
+    # Balances left out of asset reconciliation
+    CASH = frozenset({'USD', 'EUR', 'GBP', 'CHF', 'JPY', 'CAD', 'AUD',
+                      'USDT', 'USDC', 'BUSD', 'FDUSD', 'TUSD', 'DAI'})
+    QUERY_CHUNK = 500
+    _running = threading.Lock()
+    _background: Optional[ThreadPoolExecutor] = None
+    _background_lock = threading.Lock()
+
+    @staticmethod
+    def credentials(user_ids: Optional[Sequence[str]] = None) -> List[ExchangeCredential]:
+        query = ExchangeCredential.query.filter(ExchangeCredential.is_active == True)
+        if user_ids is not None:
+            query = query.filter(ExchangeCredential.user_id.in_(list(user_ids)))
+        return query.order_by(ExchangeCredential.user_id, ExchangeCredential.id).all()
+
+    @staticmethod
+    def _pages(client, symbol: Optional[str], since: Optional[int]) -> Tuple[List[dict], Optional[int]]:
+        """
+        Trades from `since` on, and the timestamp to resume from when
+        MAX_PAGES ran out first (None when every trade was fetched).
+        """
+        trades = []
+        for _ in range(ExchangeSyncService.MAX_PAGES):
+            page = client.fetch_my_trades(symbol, since, ExchangeSyncService.PAGE_SIZE)
+            trades.extend(page)
+            if len(page) < ExchangeSyncService.PAGE_SIZE:
+                return trades, None
+            last = max(t.get('timestamp') or 0 for t in page)
+            if since is not None and last <= since:
+                return trades, None
+            since = last # inclusive: the overlap is deduplicated by trade id
+        return trades, since
+
+    @staticmethod
+    def _fetch(client, since: Optional[int], symbols: Set[str]) -> dict:
+        """Runs in a worker thread: only exchange I/O, no database access."""
+        try:
+            balance = client.fetch_balance()
+            totals = {c.upper(): float(v or 0.0) for c, v in (balance.get('total') or {}).items()}
+            try:
+                trades, resume = ExchangeSyncService._pages(client, None, since)
+            except ccxt.ArgumentsRequired:
+                # Exchanges such as Binance only list trades one market at a time
+                bases = {c for c, v in totals.items() if v > EPSILON} | symbols
+                pairs = [f"{b}/{q}" for b in sorted(bases) for q in ExchangeSyncService.QUOTES
+                         if f"{b}/{q}" in (client.markets or {})]
+                trades, resume = [], None
+                for pair in pairs:
+                    fetched, truncated = ExchangeSyncService._pages(client, pair, since)
+                    trades.extend(fetched)
+                    if truncated is not None:
+                        # The shared cursor must not pass a pair's unfetched trades
+                        resume = truncated if resume is None else min(resume, truncated)
+            return {"balance": totals, "trades": trades, "resume": resume}
+        except Exception as e:
+            return {"error": str(e)}
+
+    @staticmethod
+    def booked(user_ids: Sequence[str], trade_ids: Sequence[str], order_ids: Sequence[str]) -> Tuple[set, set]:
+        """(user_id, trade id) and (user_id, order id) pairs already in the ledger."""
+        trades, orders = set(), set()
+        for column, ids, found in ((Transaction.exchange_trade_id, trade_ids, trades),
+                                   (Transaction.exchange_order_id, order_ids, orders)):
+            ids = sorted(set(ids))
+            for start in range(0, len(ids), ExchangeSyncService.QUERY_CHUNK):
+                found.update(db.session.query(Transaction.user_id, column).filter(
+                    Transaction.user_id.in_(list(user_ids)),
+                    column.in_(ids[start:start + ExchangeSyncService.QUERY_CHUNK])))
+        return trades, orders
+
+    @staticmethod
+    def coin_ids(symbols: Set[str]) -> Dict[str, str]:
+        """CoinGecko ids of new asset symbols: known ones from Asset, the rest in one request."""
+        if not symbols:
+            return {}
+        known = dict(db.session.query(Asset.symbol, Asset.coin_id)
+                     .filter(Asset.symbol.in_(sorted(symbols)), Asset.coin_id != None).distinct())
+        unknown = sorted(symbols - set(known))
+        if unknown:
+            known.update(CoinGeckoAPI.resolve_symbols(unknown))
+        return known
+
+    @staticmethod
+    def run(user_ids: Optional[Sequence[str]] = None, workers: Optional[int] = None,
+            now: Optional[datetime] = None) -> dict:
+        """
+        One incremental sync of every active credential (or those of
+        user_ids). Returns counts of synced accounts, imported trades,
+        updated assets and failed accounts. A run still going in this
+        process makes the next one a no-op; across processes, the run that
+        commits second rolls back on the unique trade id and books nothing.
+        """
+        if not ExchangeSyncService._running.acquire(blocking=False):
+            return {"skipped": True}
+        try:
+            return ExchangeSyncService._run(user_ids, workers or ExchangeSyncService.WORKERS, now or datetime.utcnow())
+        finally:
+            ExchangeSyncService._running.release()
+
+    @staticmethod
+    def run_in_background(user_id: str) -> Future:
+        """
+        Queues a sync of one user's accounts on a worker thread, so the
+        request does not wait on the exchanges. The report is pushed to the
+        user's Socket.IO room as 'exchange_sync'.
+        """
+        with ExchangeSyncService._background_lock:
+            if ExchangeSyncService._background is None:
+                ExchangeSyncService._background = ThreadPoolExecutor(max_workers=1)
+        return ExchangeSyncService._background.submit(
+            ExchangeSyncService._sync_user, current_app._get_current_object(), user_id)
+
+    @staticmethod
+    def _sync_user(app, user_id: str) -> dict:
+        with app.app_context():
+            try:
+                report = ExchangeSyncService.run([user_id])
+                socketio.emit('exchange_sync', report, to=user_id)
+                return report
+            finally:
+                db.session.remove()
+
+    @staticmethod
+    def _run(user_ids, workers: int, now: datetime) -> dict:
+        credentials = ExchangeSyncService.credentials(user_ids)
+        users = sorted({c.user_id for c in credentials})
+        # (user_id, broker) -> {SYMBOL: Asset} held on that exchange
+        held: Dict[Tuple[str, str], Dict[str, Asset]] = {}
+        for start in range(0, len(users), ExchangeSyncService.QUERY_CHUNK):
+            chunk = users[start:start + ExchangeSyncService.QUERY_CHUNK]
+            for asset in Asset.query.filter(Asset.user_id.in_(chunk), Asset.broker != None):
+                held.setdefault((asset.user_id, asset.broker.lower()), {})[asset.symbol.upper()] = asset
+
+        default_since = int((now - timedelta(days=ExchangeSyncService.INITIAL_LOOKBACK_DAYS)).timestamp() * 1000)
+        jobs = []
+        for credential in credentials:
+            try:
+                client = TradingEngine.get_exchange_client(credential, load_markets=True)
+            except Exception as e:
+                print(f"Exchange sync error for user {credential.user_id}: {e}")
+                continue
+            symbols = set(held.get((credential.user_id, credential.exchange_id.lower()), {}))
+            since = credential.trades_since if credential.trades_since is not None else default_since
+            jobs.append((credential, client, since, symbols))
+
+        results = []
+        if jobs:
+            with ThreadPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                results = list(pool.map(lambda job: ExchangeSyncService._fetch(*job[1:]), jobs))
+
+        fetched = [(job[0], result) for job, result in zip(jobs, results) if "error" not in result]
+        for job, result in zip(jobs, results):
+            if "error" in result:
+                print(f"Exchange sync failed for user {job[0].user_id}: {result['error']}")
+        booked_trades, booked_orders = ExchangeSyncService.booked(
+            users,
+            [str(t['id']) for _, r in fetched for t in r["trades"] if t.get('id') is not None],
+            [str(t['order']) for _, r in fetched for t in r["trades"] if t.get('order') is not None])
+
+        new = []
+        for credential, result in fetched:
+            last = credential.trades_since
+            for trade in sorted(result["trades"], key=lambda t: t.get('timestamp') or 0):
+                trade_id = str(trade['id']) if trade.get('id') is not None else None
+                order_id = str(trade['order']) if trade.get('order') is not None else None
+                last = max(last or 0, trade.get('timestamp') or 0)
+                if trade_id is None or (credential.user_id, trade_id) in booked_trades \
+                        or (credential.user_id, order_id) in booked_orders:
+                    continue
+                booked_trades.add((credential.user_id, trade_id))
+                txn = TradingEngine.transaction_for(credential.user_id, trade['symbol'], trade['side'],
+                                                    trade['amount'], trade.get('price'), 'exchange_sync', order_id)
+                txn.exchange_trade_id = trade_id
+                txn.date = datetime.utcfromtimestamp(trade['timestamp'] / 1000) if trade.get('timestamp') else now
+                new.append(txn)
+            if result["resume"] is not None:
+                last = min(last, result["resume"])
+            credential.trades_since = last
+            credential.synced_at = now
+
+        try:
+            # Date order lets the cached lot books advance instead of replaying
+            for txn in sorted(new, key=lambda t: (t.user_id, t.date)):
+                db.session.add(txn)
+                LotService.record(txn)
+
+            updated = 0
+            missing = {c for credential, result in fetched for c, v in result["balance"].items()
+                       if v > EPSILON and c not in ExchangeSyncService.CASH
+                       and c not in held.get((credential.user_id, credential.exchange_id.lower()), {})}
+            coin_ids = ExchangeSyncService.coin_ids(missing)
+            for credential, result in fetched:
+                exchange_id = credential.exchange_id.lower()
+                assets = held.setdefault((credential.user_id, exchange_id), {})
+                positions = None
+                for symbol in sorted((set(assets) | set(result["balance"])) - ExchangeSyncService.CASH):
+                    quantity = result["balance"].get(symbol, 0.0)
+                    asset = assets.get(symbol)
+                    if asset is None:
+                        if quantity <= EPSILON:
+                            continue
+                        if positions is None:
+                            positions = LotService.book(credential.user_id).positions()
+                        asset = assets[symbol] = Asset(user_id=credential.user_id, symbol=symbol, name=symbol,
+                                                       asset_type='crypto', coin_id=coin_ids.get(symbol),
+                                                       broker=exchange_id, quantity=0.0,
+                                                       buy_price=positions.get(symbol, {}).get("average_price", 0.0))
+                        db.session.add(asset)
+                    if abs((asset.quantity or 0.0) - quantity) > EPSILON:
+                        asset.quantity = quantity
+                        updated += 1
+
+            db.session.commit()
+        except IntegrityError as e:
+            # Another process (web worker or scheduler) booked the same fills
+            # first; the cursors were not advanced, so the next run dedupes them
+            db.session.rollback()
+            print(f"Exchange sync conflict, nothing booked: {e.orig}")
+            return {"accounts": len(fetched), "trades": 0, "assets": 0,
+                    "failed": len(credentials) - len(fetched), "conflict": True}
+        return {
+            "accounts": len(fetched),
+            "trades": len(new),
+            "assets": updated,
+            "failed": len(credentials) - len(fetched)
+        }
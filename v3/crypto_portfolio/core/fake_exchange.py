@@ -0,0 +1,119 @@
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+import ccxt
+
+class FakeExchange(ccxt.Exchange):
+    """
+    In-memory ccxt-compatible venue for offline tests and load runs.
+    Every instance trades on the same class-level prices; market orders,
+    and limit orders that cross the last price, fill at once.
+    """
+    prices: Dict[str, float] = {}
+    # apiKey -> currency -> free amount; unknown keys start with STARTING_BALANCE
+    balances: Dict[str, Dict[str, float]] = {}
+    order_log: List[dict] = []
+    STARTING_BALANCE = {"USDT": 1_000_000.0}
+    latency = 0.0 # seconds added to every call, to mimic a remote venue
+    _lock = threading.Lock()
+
+    def describe(self):
+        return self.deep_extend(super().describe(), {
+            "id": "fake",
+            "name": "Fake Exchange",
+            "rateLimit": 1,
+            "has": {"fetchCurrencies": False, "fetchTicker": True, "fetchTickers": True,
+                    "fetchBalance": True, "createOrder": True},
+        })
+
+    @classmethod
+    def set_prices(cls, prices: Dict[str, float]):
+        cls.prices.update(prices)
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls.prices = {}
+            cls.balances = {}
+            cls.order_log = []
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def fetch_markets(self, params={}):
+        self._wait()
+        markets = []
+        for symbol in sorted(self.prices):
+            base, quote = symbol.split("/")
+            markets.append({
+                "id": base + quote, "symbol": symbol, "base": base, "quote": quote, "baseId": base,
+                "quoteId": quote, "active": True, "type": "spot", "spot": True,
+                "precision": {"amount": 1e-8, "price": 1e-8}, "limits": {}
+            })
+        return markets
+
+    def fetch_ticker(self, symbol, params={}):
+        return self.fetch_tickers([symbol])[symbol]
+
+    def fetch_tickers(self, symbols=None, params={}):
+        self._wait()
+        symbols = symbols or list(self.prices)
+        missing = [s for s in symbols if s not in self.prices]
+        if missing:
+            raise ccxt.BadSymbol(f"fake does not have market symbol {missing[0]}")
+        now = self.milliseconds()
+        return {
+            s: {"symbol": s, "last": self.prices[s], "close": self.prices[s], "bid": self.prices[s],
+                "ask": self.prices[s], "timestamp": now}
+            for s in symbols
+        }
+
+    def _account(self) -> Dict[str, float]:
+        return self.balances.setdefault(self.apiKey, dict(self.STARTING_BALANCE))
+
+    def fetch_balance(self, params={}):
+        self._wait()
+        with self._lock:
+            account = dict(self._account())
+        balance = {"info": account, "free": account, "used": {c: 0.0 for c in account}, "total": account}
+        for currency, amount in account.items():
+            balance[currency] = {"free": amount, "used": 0.0, "total": amount}
+        return balance
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        self._wait()
+        if symbol not in self.prices:
+            raise ccxt.BadSymbol(f"fake does not have market symbol {symbol}")
+        if amount is None or amount <= 0:
+            raise ccxt.InvalidOrder("amount must be positive")
+        base, quote = symbol.split("/")
+        last = self.prices[symbol]
+        fills = type == "market" or (side == "buy" and price >= last) or (side == "sell" and price <= last)
+        fill_price = last if type == "market" else price
+        with self._lock:
+            account = self._account()
+            if fills:
+                pay, pay_amount = (quote, amount * fill_price) if side == "buy" else (base, amount)
+                if account.get(pay, 0.0) < pay_amount - 1e-12:
+                    raise ccxt.InsufficientFunds(f"fake: not enough {pay}")
+                get, get_amount = (base, amount) if side == "buy" else (quote, amount * fill_price)
+                account[pay] = account.get(pay, 0.0) - pay_amount
+                account[get] = account.get(get, 0.0) + get_amount
+            order = {
+                "id": uuid.uuid4().hex, "clientOrderId": None, "timestamp": self.milliseconds(),
+                "symbol": symbol, "type": type, "side": side, "amount": amount,
+                "price": fill_price if fills else price, "average": fill_price if fills else None,
+                "filled": amount if fills else 0.0, "remaining": 0.0 if fills else amount,
+                "cost": amount * fill_price if fills else 0.0, "status": "closed" if fills else "open",
+                "fee": None, "trades": [], "info": {"apiKey": self.apiKey}
+            }
+            self.order_log.append(order)
+        return order
+
+    def fetch_order(self, id, symbol=None, params={}):
+        order: Optional[dict] = next((o for o in self.order_log if o["id"] == id), None)
+        if order is None:
+            raise ccxt.OrderNotFound(id)
+        return order
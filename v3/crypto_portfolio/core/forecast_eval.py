@@ -0,0 +1,145 @@
+from datetime import date
+from typing import List, Optional, Sequence
+import numpy as np
+from ..extensions import db
+from .models import Asset, ForecastEvaluation
+from .price_history import PriceHistoryStore
+from .table_cache import TableCache
+
+DEFAULT_HORIZONS = (1, 7, 14)
+
+def forecast_weights(window: int, horizons: Sequence[int], degree: int = 2) -> np.ndarray:
+    """
+    (H, window) weights turning the last `window` prices into the degree-d
+    least-squares trend evaluated `h` days after the last one. The fit is
+    linear in the prices, so one matrix serves every origin and coin.
+    """
+    t = np.arange(window, dtype=float)
+    shift, scale = t.mean(), t.std() or 1.0
+    X = np.vander((t - shift) / scale, degree + 1, increasing=True)
+    future = (window - 1 + np.asarray(horizons, dtype=float) - shift) / scale
+    return np.vander(future, degree + 1, increasing=True) @ np.linalg.pinv(X)
+
+
+class WalkForwardEvaluator:
+    """
+    Replays the polynomial predictor over stored history: at every day,
+    fit on the previous `window` prices and compare each horizon's
+    forecast with what happened.
+    """
+
+    @staticmethod
+    def evaluate(prices, window: int = 30, horizons: Sequence[int] = DEFAULT_HORIZONS,
+                 degree: int = 2) -> List[List[Optional[dict]]]:
+        """
+        Metrics per column of a (T, N) daily price matrix and per horizon:
+        [coin][horizon] -> {samples, mae, mape, directional_accuracy} or None.
+        """
+        prices = np.asarray(prices, dtype=float).reshape(len(prices), -1)
+        T, N = prices.shape
+        H = len(horizons)
+        out = [[None] * H for _ in range(N)]
+        if T < window + 1:
+            return out
+        weights = forecast_weights(window, horizons, degree)
+        windows = np.lib.stride_tricks.sliding_window_view(prices, window, axis=0) # (T - window + 1, N, window)
+        forecasts = windows @ weights.T # (origins, N, H)
+        last = prices[window - 1:] # price at each origin
+        for k, h in enumerate(horizons):
+            origins = T - window + 1 - h # origins with a known outcome h days later
+            if origins <= 0:
+                continue
+            f = forecasts[:origins, :, k]
+            base = last[:origins]
+            actual = prices[window - 1 + h:window - 1 + h + origins]
+            usable = np.isfinite(f) & np.isfinite(actual) & (actual != 0)
+            error = np.where(usable, np.abs(f - actual), 0.0)
+            moved = usable & (actual != base)
+            hits = moved & (np.sign(f - base) == np.sign(actual - base))
+            n = usable.sum(axis=0)
+            n_moved = moved.sum(axis=0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mae = error.sum(axis=0) / n
+                mape = np.where(usable, error / np.abs(np.where(usable, actual, 1.0)), 0.0).sum(axis=0) / n * 100
+                direction = hits.sum(axis=0) / n_moved
+            for j in range(N):
+                if n[j]:
+                    out[j][k] = {
+                        "samples": int(n[j]),
+                        "mae": float(mae[j]),
+                        "mape": float(mape[j]),
+                        "directional_accuracy": float(direction[j]) if n_moved[j] else None
+                    }
+        return out
+
+
+class ForecastEvaluationService:
+    """
+    Stores walk-forward results in ForecastEvaluation and serves them as
+    the confidence of live predictions. Meant to be refreshed nightly.
+    """
+    HISTORY_DAYS = 365
+    WINDOWS = (30,)
+    # (coin_id, window, degree, horizon) -> metrics
+    _cache = TableCache(ForecastEvaluation, lambda r: (r.coin_id, r.window, r.degree, r.horizon),
+                        ForecastEvaluation.evaluated_on)
+
+    @staticmethod
+    def run(coin_ids: Optional[Sequence[str]] = None, windows: Sequence[int] = WINDOWS,
+            horizons: Sequence[int] = DEFAULT_HORIZONS, degree: int = 2, history_days: int = HISTORY_DAYS,
+            refresh_prices: bool = True, today: Optional[date] = None) -> int:
+        """
+        Evaluates the given coins (default: every held coin) and upserts
+        the results. Returns the number of stored rows.
+        """
+        today = today or date.today()
+        if coin_ids is None:
+            coin_ids = [r[0] for r in db.session.query(Asset.coin_id).filter(Asset.coin_id != None).distinct()]
+        coin_ids = sorted(set(c for c in coin_ids if c))
+        if not coin_ids:
+            return 0
+        if refresh_prices:
+            PriceHistoryStore.refresh(coin_ids, days=history_days)
+        _, prices = PriceHistoryStore.matrix(coin_ids, days=history_days, today=today)
+
+        existing = {
+            (r.coin_id, r.window, r.degree, r.horizon): r
+            for r in ForecastEvaluation.query.filter(ForecastEvaluation.coin_id.in_(coin_ids))
+        }
+        stored = 0
+        for window in windows:
+            results = WalkForwardEvaluator.evaluate(prices, window, horizons, degree)
+            for coin, per_horizon in zip(coin_ids, results):
+                for h, metrics in zip(horizons, per_horizon):
+                    if metrics is None:
+                        continue
+                    key = (coin, window, degree, h)
+                    row = existing.get(key)
+                    if row is None:
+                        row = existing[key] = ForecastEvaluation(coin_id=coin, window=window, degree=degree, horizon=h)
+                        db.session.add(row)
+                    row.samples = metrics["samples"]
+                    row.mae = metrics["mae"]
+                    row.mape = metrics["mape"]
+                    row.directional_accuracy = metrics["directional_accuracy"]
+                    row.evaluated_on = today
+                    stored += 1
+        db.session.commit()
+        ForecastEvaluationService._cache.clear()
+        return stored
+
+    @staticmethod
+    def last_run() -> Optional[date]:
+        return db.session.query(db.func.max(ForecastEvaluation.evaluated_on)).scalar()
+
+    @staticmethod
+    def lookup(coin_id: str, window: int = 30, degree: int = 2, horizon: int = 7) -> Optional[dict]:
+        """
+        Stored metrics plus a 0-100 confidence (the share of past forecasts
+        that got the direction right), or None if never evaluated.
+        """
+        metrics = ForecastEvaluationService._cache.get((coin_id, window, degree, horizon))
+        if metrics is None:
+            return None
+        accuracy = metrics["directional_accuracy"]
+        return dict(metrics, confidence=round(accuracy * 100) if accuracy is not None else None)
@@ -0,0 +1,288 @@
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import Callable, Dict, List, Optional, Sequence
+import numpy as np
+from ..extensions import db
+from .models import Asset, ForecastModelChoice
+from .parallel import map_tasks
+from .price_history import PriceHistoryStore
+from .table_cache import TableCache
+
+class PolynomialTrend:
+    """
+    Least-squares polynomial in one feature: the plain NumPy equivalent of
+    make_pipeline(PolynomialFeatures(degree), LinearRegression()). The
+    feature is standardized before building the Vandermonde matrix, which
+    changes the basis but not the fitted curve.
+    """
+
+    def __init__(self, degree: int = 2):
+        self.degree = degree
+
+    def _design(self, X) -> np.ndarray:
+        t = (np.asarray(X, dtype=float).reshape(-1) - self.shift_) / self.scale_
+        return np.vander(t, self.degree + 1, increasing=True)
+
+    def fit(self, X, y) -> 'PolynomialTrend':
+        t = np.asarray(X, dtype=float).reshape(-1)
+        self.shift_ = t.mean()
+        self.scale_ = t.std() or 1.0
+        self.coef_ = np.linalg.lstsq(self._design(t), np.asarray(y, dtype=float), rcond=None)[0]
+        return self
+
+    def predict(self, X) -> np.ndarray:
+        return self._design(X) @ self.coef_
+
+
+class ForecastModel(ABC):
+    """
+    A model fitted on the last `window` daily prices of one coin that
+    forecasts the next `horizon` days.
+    """
+    window = 30
+    min_points = 10
+
+    @abstractmethod
+    def fit(self, prices: np.ndarray) -> 'ForecastModel':
+        ...
+
+    @abstractmethod
+    def forecast(self, horizon: int) -> np.ndarray:
+        ...
+
+
+class PolynomialModel(ForecastModel):
+    def __init__(self, degree: int = 2, window: int = 30):
+        self.degree = degree
+        self.window = window
+
+    def fit(self, prices):
+        y = np.asarray(prices, dtype=float)[-self.window:]
+        self.n_ = len(y)
+        self.trend_ = PolynomialTrend(self.degree).fit(np.arange(self.n_), y)
+        return self
+
+    def forecast(self, horizon):
+        return self.trend_.predict(self.n_ - 1 + np.arange(1, horizon + 1))
+
+
+class HoltWintersModel(ForecastModel):
+    """
+    Additive Holt-Winters smoothing with a damped trend and an optional
+    additive season of `season` days (0 = Holt's linear method).
+    """
+    min_points = 14
+
+    def __init__(self, alpha: float = 0.5, beta: float = 0.1, gamma: float = 0.1, phi: float = 0.9,
+                 season: int = 0, window: int = 90):
+        self.alpha, self.beta, self.gamma, self.phi = alpha, beta, gamma, phi
+        self.season = season
+        self.window = window
+
+    def fit(self, prices):
+        y = np.asarray(prices, dtype=float)[-self.window:]
+        m = self.season
+        if m and len(y) >= 2 * m:
+            level = y[:m].mean()
+            trend = (y[m:2 * m].mean() - level) / m
+            seasonal = list(y[:m] - level)
+        else:
+            m = 0
+            level, trend, seasonal = y[0], y[1] - y[0], []
+        a, b, g, phi = self.alpha, self.beta, self.gamma, self.phi
+        for t in range(m or 1, len(y)):
+            s = seasonal[t - m] if m else 0.0
+            previous = level
+            level = a * (y[t] - s) + (1 - a) * (previous + phi * trend)
+            trend = b * (level - previous) + (1 - b) * phi * trend
+            if m:
+                seasonal.append(g * (y[t] - level) + (1 - g) * s)
+        self.level_, self.trend_ = level, trend
+        self.seasonal_ = np.array(seasonal[-m:]) if m else None
+        return self
+
+    def forecast(self, horizon):
+        h = np.arange(1, horizon + 1)
+        damped = np.cumsum(self.phi ** h)
+        out = self.level_ + damped * self.trend_
+        if self.seasonal_ is not None:
+            out = out + self.seasonal_[(h - 1) % len(self.seasonal_)]
+        return out
+
+
+class AutoRegressiveModel(ForecastModel):
+    """
+    AR(p) with intercept on daily log returns, fitted by least squares and
+    iterated forward; prices follow from the cumulated returns.
+    """
+    min_points = 30
+
+    def __init__(self, order: int = 3, window: int = 90):
+        self.order = order
+        self.window = window
+
+    def fit(self, prices):
+        y = np.asarray(prices, dtype=float)[-self.window:]
+        r = np.diff(np.log(y))
+        p = self.order
+        lags = np.lib.stride_tricks.sliding_window_view(r, p)[:-1] # rows: r[t-p..t-1]
+        X = np.column_stack([np.ones(len(lags)), lags])
+        self.coef_ = np.linalg.lstsq(X, r[p:], rcond=None)[0]
+        self.last_price_ = y[-1]
+        self.recent_ = r[-p:]
+        return self
+
+    def forecast(self, horizon):
+        recent = list(self.recent_)
+        returns = []
+        for _ in range(horizon):
+            nxt = self.coef_[0] + np.dot(self.coef_[1:], recent[-self.order:])
+            returns.append(nxt)
+            recent.append(nxt)
+        return self.last_price_ * np.exp(np.cumsum(returns))
+
+
+# key -> factory of an unfitted model; register_model adds more
+MODEL_ZOO: Dict[str, Callable[[], ForecastModel]] = {
+    "poly1": lambda: PolynomialModel(1),
+    "poly2": lambda: PolynomialModel(2),
+    "poly3": lambda: PolynomialModel(3),
+    "holt": lambda: HoltWintersModel(alpha=0.5, beta=0.1),
+    "holt_fast": lambda: HoltWintersModel(alpha=0.8, beta=0.2),
+    "holt_winters": lambda: HoltWintersModel(alpha=0.5, beta=0.1, gamma=0.1, season=7),
+    "ar1": lambda: AutoRegressiveModel(1),
+    "ar3": lambda: AutoRegressiveModel(3),
+    "ar7": lambda: AutoRegressiveModel(7),
+}
+
+def register_model(key: str, factory: Callable[[], ForecastModel]):
+    MODEL_ZOO[key] = factory
+
+def create_model(key: str) -> ForecastModel:
+    if key not in MODEL_ZOO:
+        raise ValueError(f"Unknown forecasting model {key}")
+    return MODEL_ZOO[key]()
+
+
+def _select_chunk(args) -> List[Optional[dict]]:
+    """
+    Cross-validates every model on each price column of a block. Module
+    level so a process pool can pickle it (models are rebuilt from keys).
+    """
+    prices, keys, horizon, folds, step = args
+    return [ModelSelector.cross_validate(prices[:, j], keys, horizon, folds, step) for j in range(prices.shape[1])]
+
+
+class ModelSelector:
+    """
+    Rolling-origin cross-validation of the model zoo on one coin's history.
+    """
+
+    @staticmethod
+    def cross_validate(prices, keys: Sequence[str], horizon: int = 7, folds: int = 8,
+                       step: int = 7) -> Optional[dict]:
+        """
+        Fits every model at `folds` origins, `step` days apart and ending
+        `horizon` days before the last price, and scores the forecasts
+        against what followed. Returns {"best", "scores"} where scores maps
+        each model with a complete set of folds to its mean MAPE (percent)
+        and directional accuracy; None if no model could be scored.
+        """
+        y = np.asarray(prices, dtype=float)
+        y = y[np.isfinite(y)]
+        ends = [len(y) - horizon - i * step for i in range(folds)]
+        scores = {}
+        for key in keys:
+            model = create_model(key)
+            usable = [e for e in ends if e >= max(model.window, model.min_points)]
+            if len(usable) < folds:
+                continue
+            errors, hits = [], []
+            for end in usable:
+                with np.errstate(all='ignore'):
+                    f = create_model(key).fit(y[:end]).forecast(horizon)
+                actual = y[end:end + horizon]
+                if not np.isfinite(f).all():
+                    break
+                errors.append(np.mean(np.abs(f - actual) / np.abs(actual)) * 100)
+                hits.append(np.sign(f[-1] - y[end - 1]) == np.sign(actual[-1] - y[end - 1]))
+            else:
+                scores[key] = {"mape": float(np.mean(errors)), "directional_accuracy": float(np.mean(hits))}
+        if not scores:
+            return None
+        best = min(scores, key=lambda k: (scores[k]["mape"], k))
+        return {"best": best, "scores": scores}
+
+    @staticmethod
+    def select(prices, keys: Optional[Sequence[str]] = None, horizon: int = 7, folds: int = 8, step: int = 7,
+               workers: int = 0, chunk: int = 16) -> List[Optional[dict]]:
+        """cross_validate for every column of a (T, N) matrix; workers > 0 uses a process pool."""
+        prices = np.asarray(prices, dtype=float).reshape(len(prices), -1)
+        keys = list(keys or MODEL_ZOO)
+        tasks = [(prices[:, s:s + chunk], keys, horizon, folds, step) for s in range(0, prices.shape[1], chunk)]
+        return [row for part in map_tasks(_select_chunk, tasks, workers) for row in part]
+
+
+class ModelSelectionService:
+    """
+    Keeps the cross-validated best model of each coin in ForecastModelChoice
+    so predictions use it without any selection work at request time.
+    """
+    HISTORY_DAYS = 365
+    FOLDS = 8
+    # (coin_id, horizon) -> stored choice
+    _cache = TableCache(ForecastModelChoice, lambda r: (r.coin_id, r.horizon), ForecastModelChoice.evaluated_on)
+
+    @staticmethod
+    def run(coin_ids: Optional[Sequence[str]] = None, horizon: int = 7, history_days: int = HISTORY_DAYS,
+            folds: int = FOLDS, workers: int = 0, refresh_prices: bool = True,
+            today: Optional[date] = None) -> int:
+        """
+        Cross-validates the zoo on the given coins (default: every held coin)
+        and upserts the winner of each. Returns the number of stored choices.
+        """
+        today = today or date.today()
+        if coin_ids is None:
+            coin_ids = [r[0] for r in db.session.query(Asset.coin_id).filter(Asset.coin_id != None).distinct()]
+        coin_ids = sorted(set(c for c in coin_ids if c))
+        if not coin_ids:
+            return 0
+        if refresh_prices:
+            PriceHistoryStore.refresh(coin_ids, days=history_days)
+        _, prices = PriceHistoryStore.matrix(coin_ids, days=history_days, today=today)
+        if not len(prices):
+            return 0
+        results = ModelSelector.select(prices, horizon=horizon, folds=folds, workers=workers)
+
+        existing = {
+            r.coin_id: r for r in ForecastModelChoice.query.filter(
+                ForecastModelChoice.coin_id.in_(coin_ids), ForecastModelChoice.horizon == horizon)
+        }
+        stored = 0
+        for coin, result in zip(coin_ids, results):
+            if result is None:
+                continue
+            row = existing.get(coin)
+            if row is None:
+                row = ForecastModelChoice(coin_id=coin, horizon=horizon)
+                db.session.add(row)
+            best = result["scores"][result["best"]]
+            row.model_key = result["best"]
+            row.mape = best["mape"]
+            row.directional_accuracy = best["directional_accuracy"]
+            row.folds = folds
+            row.evaluated_on = today
+            stored += 1
+        db.session.commit()
+        ModelSelectionService._cache.clear()
+        return stored
+
+    @staticmethod
+    def last_run() -> Optional[date]:
+        return db.session.query(db.func.max(ForecastModelChoice.evaluated_on)).scalar()
+
+    @staticmethod
+    def best(coin_id: str, horizon: int = 7) -> Optional[dict]:
+        """The stored choice for the coin, if its model is still registered."""
+        choice = ModelSelectionService._cache.get((coin_id, horizon))
+        return choice if choice and choice["model"] in MODEL_ZOO else None
@@ -0,0 +1,198 @@
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from .models import User, Asset, Goal
+from .monte_carlo import MonteCarloEngine
+from .price_history import PriceHistoryStore
+
+DAYS_PER_MONTH = 365.25 / 12
+
+class GoalProjection:
+    """
+    Monte Carlo projection of savings goals. Every goal is invested in the
+    same portfolio, so one matrix of monthly growth paths serves all of them:
+    with C_t the cumulative growth after t months, a goal starting at `a`
+    and receiving `c` each month is worth C_T * (a + c * sum_{k<=T} 1/C_k).
+    """
+    MAX_MONTHS = 600
+    REQUIRED_PROBABILITY = 0.8
+
+    @staticmethod
+    def months_until(deadline: Optional[str], today: date) -> int:
+        """Whole months left before an ISO deadline; 0 if missing or past."""
+        if not deadline:
+            return 0
+        try:
+            end = datetime.strptime(deadline[:10], "%Y-%m-%d").date()
+        except ValueError:
+            return 0
+        days = (end - today).days
+        return int(min(max(days // DAYS_PER_MONTH, 0), GoalProjection.MAX_MONTHS))
+
+    @staticmethod
+    def split_contribution(monthly: float, shortfalls: np.ndarray) -> np.ndarray:
+        """Shares the monthly contribution between goals in proportion to what each still needs."""
+        shortfalls = np.clip(shortfalls, 0, None)
+        total = shortfalls.sum()
+        if monthly <= 0 or total <= 0:
+            return np.zeros_like(shortfalls)
+        return monthly * shortfalls / total
+
+    @staticmethod
+    def growth_paths(mu: float, sigma: float, months: int, n_paths: int,
+                     seed: Optional[int] = None) -> np.ndarray:
+        """(paths, months + 1) cumulative growth factors, column 0 being 1."""
+        rng = np.random.default_rng(seed)
+        log_returns = rng.standard_normal((n_paths, months)) * sigma + mu
+        growth = np.ones((n_paths, months + 1))
+        np.exp(np.cumsum(log_returns, axis=1), out=growth[:, 1:])
+        return growth
+
+    @staticmethod
+    def project(current: Sequence[float], target: Sequence[float], months: Sequence[int],
+                contribution: Sequence[float], mu: float, sigma: float, n_paths: int = 5000,
+                probability: float = REQUIRED_PROBABILITY, seed: Optional[int] = 0) -> Dict[str, np.ndarray]:
+        """
+        Vectorized over goals. mu/sigma are the monthly log-return mean and
+        standard deviation of the invested portfolio.
+        Returns per-goal arrays: probability of reaching the target with the
+        given contribution, median final value, and the monthly contribution
+        needed to reach the target with `probability`.
+        """
+        current = np.asarray(current, dtype=float)
+        target = np.asarray(target, dtype=float)
+        months = np.asarray(months, dtype=int)
+        contribution = np.asarray(contribution, dtype=float)
+        if current.size == 0:
+            empty = np.empty(0)
+            return {"probability": empty, "median": empty, "required_contribution": empty}
+
+        growth = GoalProjection.growth_paths(mu, sigma, int(months.max()), n_paths, seed)
+        # S_t = sum_{k=1..t} 1/C_k, with S_0 = 0
+        discount = np.zeros_like(growth)
+        np.cumsum(1.0 / growth[:, 1:], axis=1, out=discount[:, 1:])
+
+        c_t = growth[:, months] # (paths, goals)
+        s_t = discount[:, months]
+        base = c_t * current # value of today's amount at the deadline
+        per_unit = c_t * s_t # value of one unit contributed monthly
+
+        final = base + per_unit * contribution
+        reached = final >= target
+
+        # Each path reaches the target iff the contribution is at least
+        # (target - base) / per_unit, so the required contribution is a quantile
+        with np.errstate(divide='ignore', invalid='ignore'):
+            needed = np.where(per_unit > 0, (target - base) / per_unit,
+                              np.where(base >= target, 0.0, np.inf))
+        required = np.quantile(needed, probability, axis=0, method='higher')
+        return {
+            "probability": reached.mean(axis=0),
+            "median": np.median(final, axis=0),
+            "required_contribution": np.clip(required, 0, None)
+        }
+
+
+class GoalProjectionService:
+    """
+    Goal projections for a user, with return assumptions taken from the
+    price history of their holdings. Cached until goals, holdings, the
+    monthly contribution or the stored prices change.
+    """
+    HISTORY_DAYS = 365
+    N_PATHS = 5000
+    _cache: Dict[str, tuple] = {}
+
+    @staticmethod
+    def _fingerprint(user: User, assets: List[Asset], goals: List[Goal], today: date) -> tuple:
+        coin_ids = sorted({a.coin_id for a in assets if a.coin_id})
+        return (
+            today,
+            user.monthly_contribution or 0.0,
+            tuple(sorted((a.id, a.coin_id, a.quantity, a.buy_price) for a in assets)),
+            tuple((g.id, g.target_amount, g.current_amount, g.deadline) for g in goals),
+            tuple(sorted(PriceHistoryStore.latest_dates(coin_ids).items()))
+        )
+
+    @staticmethod
+    def portfolio_returns(assets: Sequence[Asset]) -> Tuple[float, float]:
+        """
+        Monthly log-return mean and volatility of the user's current mix.
+        Holdings without price history count as cash (no return, no risk)
+        at their buy value.
+        """
+        coin_qty: Dict[str, float] = {}
+        coin_cost: Dict[str, float] = {}
+        static_value = 0.0
+        for a in assets:
+            cost = (a.quantity or 0.0) * (a.buy_price or 0.0)
+            if a.coin_id:
+                coin_qty[a.coin_id] = coin_qty.get(a.coin_id, 0.0) + (a.quantity or 0.0)
+                coin_cost[a.coin_id] = coin_cost.get(a.coin_id, 0.0) + cost
+            else:
+                static_value += cost
+
+        coin_ids = sorted(coin_qty)
+        if not coin_ids:
+            return 0.0, 0.0
+        _, prices = PriceHistoryStore.matrix(coin_ids, GoalProjectionService.HISTORY_DAYS)
+        has_history = np.sum(np.isfinite(prices), axis=0) > 2 if prices.size else np.zeros(len(coin_ids), bool)
+        if not has_history.any():
+            return 0.0, 0.0
+        static_value += sum(coin_cost[c] for c, ok in zip(coin_ids, has_history) if not ok)
+        prices = prices[:, has_history]
+        quantities = np.array([coin_qty[c] for c, ok in zip(coin_ids, has_history) if ok])
+        last = np.array([col[np.isfinite(col)][-1] for col in prices.T])
+        values = quantities * last
+        total = values.sum() + static_value
+        if total <= 0:
+            return 0.0, 0.0
+
+        mu, cov = MonteCarloEngine.estimate(prices)
+        w = values / total
+        return float(w @ mu) * DAYS_PER_MONTH, float(np.sqrt(max(w @ cov @ w, 0.0) * DAYS_PER_MONTH))
+
+    @staticmethod
+    def for_user(user: User, refresh_prices: bool = True, today: Optional[date] = None) -> Dict[str, dict]:
+        """goal id -> projection for each active goal."""
+        today = today or date.today()
+        assets = user.assets.all()
+        goals = user.goals.filter_by(status='active').all()
+        coin_ids = sorted({a.coin_id for a in assets if a.coin_id})
+        if refresh_prices and coin_ids:
+            PriceHistoryStore.refresh(coin_ids, days=GoalProjectionService.HISTORY_DAYS)
+
+        key = GoalProjectionService._fingerprint(user, assets, goals, today)
+        cached = GoalProjectionService._cache.get(user.id)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        result = {}
+        if goals:
+            mu, sigma = GoalProjectionService.portfolio_returns(assets)
+            current = np.array([g.current_amount or 0.0 for g in goals])
+            target = np.array([g.target_amount or 0.0 for g in goals])
+            months = np.array([GoalProjection.months_until(g.deadline, today) for g in goals])
+            # Goals past their deadline cannot receive contributions any more
+            contribution = GoalProjection.split_contribution(
+                user.monthly_contribution or 0.0, np.where(months > 0, target - current, 0.0)
+            )
+            projection = GoalProjection.project(
+                current, target, months, contribution, mu, sigma, GoalProjectionService.N_PATHS
+            )
+            for i, g in enumerate(goals):
+                required = float(projection["required_contribution"][i])
+                result[g.id] = {
+                    "months": int(months[i]),
+                    "monthly_contribution": float(contribution[i]),
+                    "probability": float(projection["probability"][i]),
+                    "median_value": float(projection["median"][i]),
+                    "required_contribution": required if np.isfinite(required) else None
+                }
+
+        GoalProjectionService._cache[user.id] = (key, result)
+        return result
+
+    @staticmethod
+    def invalidate(user_id: str):
+        GoalProjectionService._cache.pop(user_id, None)
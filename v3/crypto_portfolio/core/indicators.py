@@ -0,0 +1,297 @@
+import bisect
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from .price_history import PriceHistoryStore
+
+# name -> default parameters
+DEFAULTS = {
+    "sma": (20,),
+    "ema": (20,),
+    "rsi": (14,),
+    "macd": (12, 26, 9),
+    "bollinger": (20, 2.0),
+    "atr": (14,),
+}
+
+class Indicators:
+    """
+    Technical indicators over (T,) or (T, N) price arrays, one column per
+    coin. Every function is O(T) per column and vectorized across columns;
+    rows before a column's first price, or before a window fills, are NaN.
+    """
+
+    @staticmethod
+    def _as_matrix(x) -> np.ndarray:
+        x = np.asarray(x, dtype=float)
+        return x.reshape(len(x), -1)
+
+    @staticmethod
+    def _rolling_sum(x: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Trailing-window sums and counts of valid values, via cumulative sums."""
+        valid = ~np.isnan(x)
+        zero = np.zeros((1, x.shape[1]))
+        s = np.concatenate([zero, np.cumsum(np.where(valid, x, 0.0), axis=0)])
+        n = np.concatenate([zero, np.cumsum(valid, axis=0)])
+        return s[window:] - s[:-window], n[window:] - n[:-window]
+
+    @staticmethod
+    def sma(prices, window: int = 20) -> np.ndarray:
+        x = Indicators._as_matrix(prices)
+        out = np.full(x.shape, np.nan)
+        if window < 1 or len(x) < window:
+            return out
+        total, count = Indicators._rolling_sum(x, window)
+        with np.errstate(invalid='ignore'):
+            out[window - 1:] = np.where(count == window, total / window, np.nan)
+        return out
+
+    @staticmethod
+    def rolling_std(prices, window: int = 20) -> np.ndarray:
+        """Population standard deviation over a trailing window."""
+        x = Indicators._as_matrix(prices)
+        out = np.full(x.shape, np.nan)
+        if window < 1 or len(x) < window:
+            return out
+        # Centre each column first so the sum of squares keeps its precision
+        first = np.nanmean(x[:window], axis=0) if np.isfinite(x[:window]).any() else np.zeros(x.shape[1])
+        centred = x - np.nan_to_num(first)
+        s1, count = Indicators._rolling_sum(centred, window)
+        s2, _ = Indicators._rolling_sum(centred * centred, window)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var = s2 / window - (s1 / window) ** 2
+        out[window - 1:] = np.where(count == window, np.sqrt(np.clip(var, 0, None)), np.nan)
+        return out
+
+    @staticmethod
+    def ewm(values, alpha: float) -> np.ndarray:
+        """
+        Exponential moving average y_t = a x_t + (1 - a) y_{t-1}, seeded
+        with each column's first value. Solved in closed form over blocks
+        short enough that (1 - a)^-k cannot overflow, carrying the last
+        value between blocks.
+        """
+        x = Indicators._as_matrix(values)
+        out = np.full(x.shape, np.nan)
+        if not len(x):
+            return out
+        valid = ~np.isnan(x)
+        started = np.maximum.accumulate(valid, axis=0)
+        # Leading NaNs take the first value, so y stays at the seed until the series starts
+        first_idx = np.where(valid.any(axis=0), valid.argmax(axis=0), 0)
+        seed = np.nan_to_num(x[first_idx, np.arange(x.shape[1])])
+        x = np.where(started, x, seed)
+        x = np.where(np.isnan(x), seed, x) # all-NaN columns; masked below
+
+        decay = 1.0 - alpha
+        if decay <= 0:
+            out[:] = x
+        else:
+            block = max(1, int(50 / -np.log(decay)))
+            prev = seed
+            for start in range(0, len(x), block):
+                chunk = x[start:start + block]
+                k = np.arange(len(chunk))[:, None]
+                # y_{s+k} = (1-a)^(k+1) y_{s-1} + a * sum_j (1-a)^(k-j) x_{s+j}
+                acc = np.cumsum(chunk * decay ** -k, axis=0)
+                y = decay ** k * (decay * prev + alpha * acc)
+                out[start:start + len(chunk)] = y
+                prev = y[-1]
+        out[~started] = np.nan
+        return out
+
+    @staticmethod
+    def ema(prices, span: int = 20) -> np.ndarray:
+        return Indicators.ewm(prices, 2.0 / (span + 1))
+
+    @staticmethod
+    def rsi(prices, period: int = 14) -> np.ndarray:
+        """Wilder's RSI (smoothing factor 1 / period), 0-100."""
+        x = Indicators._as_matrix(prices)
+        out = np.full(x.shape, np.nan)
+        if len(x) < 2:
+            return out
+        delta = np.diff(x, axis=0)
+        gains = Indicators.ewm(np.where(np.isnan(delta), np.nan, np.clip(delta, 0, None)), 1.0 / period)
+        losses = Indicators.ewm(np.where(np.isnan(delta), np.nan, np.clip(-delta, 0, None)), 1.0 / period)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = np.where(losses > 0, 100 - 100 / (1 + gains / losses), np.where(gains > 0, 100.0, 50.0))
+        rsi[np.isnan(gains)] = np.nan
+        # The first `period` values are still dominated by the seed
+        rsi[:period - 1] = np.nan
+        out[1:] = rsi
+        return out
+
+    @staticmethod
+    def macd(prices, fast: int = 12, slow: int = 26, signal: int = 9) -> Dict[str, np.ndarray]:
+        line = Indicators.ema(prices, fast) - Indicators.ema(prices, slow)
+        signal_line = Indicators.ema(line, signal)
+        return {"macd": line, "signal": signal_line, "histogram": line - signal_line}
+
+    @staticmethod
+    def bollinger(prices, window: int = 20, k: float = 2.0) -> Dict[str, np.ndarray]:
+        x = Indicators._as_matrix(prices)
+        middle = Indicators.sma(x, window)
+        width = k * Indicators.rolling_std(x, window)
+        upper, lower = middle + width, middle - width
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percent_b = (x - lower) / (upper - lower)
+        return {"middle": middle, "upper": upper, "lower": lower, "percent_b": percent_b}
+
+    @staticmethod
+    def atr(close, period: int = 14, high=None, low=None) -> np.ndarray:
+        """
+        Wilder's average true range. Without high/low (daily closes only)
+        the true range reduces to the absolute close-to-close move.
+        """
+        c = Indicators._as_matrix(close)
+        prev = np.vstack([np.full((1, c.shape[1]), np.nan), c[:-1]])
+        if high is None or low is None:
+            tr = np.abs(c - prev)
+        else:
+            h, l = Indicators._as_matrix(high), Indicators._as_matrix(low)
+            with np.errstate(invalid='ignore'):
+                tr = np.fmax(h - l, np.fmax(np.abs(h - prev), np.abs(l - prev)))
+        out = Indicators.ewm(tr, 1.0 / period)
+        out[:period] = np.nan
+        return out
+
+    @staticmethod
+    def compute(name: str, prices, params: Sequence = ()) -> Dict[str, np.ndarray]:
+        """Runs one indicator by name; always returns named output arrays."""
+        params = tuple(params) or DEFAULTS[name]
+        if name == "sma":
+            return {"sma": Indicators.sma(prices, int(params[0]))}
+        if name == "ema":
+            return {"ema": Indicators.ema(prices, int(params[0]))}
+        if name == "rsi":
+            return {"rsi": Indicators.rsi(prices, int(params[0]))}
+        if name == "macd":
+            return Indicators.macd(prices, *(int(p) for p in params))
+        if name == "bollinger":
+            return Indicators.bollinger(prices, int(params[0]), float(params[1]))
+        if name == "atr":
+            return {"atr": Indicators.atr(prices, int(params[0]))}
+        raise ValueError(f"Unknown indicator {name}")
+
+    @staticmethod
+    def parse(spec: str) -> Tuple[str, tuple]:
+        """'macd:12,26,9' -> ('macd', (12, 26, 9)); missing params use the defaults."""
+        name, _, raw = spec.strip().lower().partition(":")
+        if name not in DEFAULTS:
+            raise ValueError(f"Unknown indicator {name}")
+        defaults = DEFAULTS[name]
+        values = [float(v) for v in raw.split(",") if v.strip()] if raw else []
+        if len(values) > len(defaults) or any(v <= 0 for v in values):
+            raise ValueError(f"Invalid parameters for {name}")
+        params = tuple(values) + defaults[len(values):]
+        return name, tuple(type(d)(v) for d, v in zip(defaults, params))
+
+
+class IndicatorService:
+    """
+    Indicators over the stored daily price history, memoized per
+    (coin, indicator, params, window bucket) until a newer price is stored.
+    Requested windows are rounded up to one of DAY_BUCKETS and trimmed on
+    the way out, so nearby `days` values share one entry; the memo is an
+    LRU capped at CACHE_SIZE entries.
+    """
+    HISTORY_DAYS = 365
+    CACHE_SIZE = 512
+    DAY_BUCKETS = (30, 90, 180, 365, 730, 1825, 3650)
+    # (coin, name, params, bucket) -> (latest price date, dates, outputs), least recently used first
+    _cache: "OrderedDict[tuple, Tuple[date, List[date], Dict[str, np.ndarray]]]" = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def bucket(days: int) -> int:
+        """Smallest history window of DAY_BUCKETS covering `days`."""
+        for bucket in IndicatorService.DAY_BUCKETS:
+            if days <= bucket:
+                return bucket
+        return days
+
+    @staticmethod
+    def for_coins(coin_ids: Sequence[str], specs: Sequence[Tuple[str, tuple]],
+                  days: int = HISTORY_DAYS, refresh_prices: bool = True) -> Dict[str, dict]:
+        """
+        coin_id -> {"dates": [...], "<indicator>[_<output>]": [...]} over the
+        last `days` days. Coins missing from the memo are computed together,
+        one batched call per indicator.
+        """
+        coin_ids = sorted(set(coin_ids))
+        bucket = IndicatorService.bucket(days)
+        since = date.today() - timedelta(days=days)
+        if refresh_prices and coin_ids:
+            PriceHistoryStore.refresh(coin_ids, days=bucket)
+        latest = PriceHistoryStore.latest_dates(coin_ids)
+
+        results: Dict[str, dict] = {c: {} for c in coin_ids if c in latest}
+        stale: Dict[Tuple[str, tuple], List[str]] = {}
+        for coin in results:
+            for spec in specs:
+                key = (coin,) + spec + (bucket,)
+                with IndicatorService._lock:
+                    hit = IndicatorService._cache.get(key)
+                    fresh = hit is not None and hit[0] == latest[coin]
+                    if fresh:
+                        IndicatorService._cache.move_to_end(key)
+                if fresh:
+                    IndicatorService._serve(results[coin], spec, hit[1], hit[2], since)
+                else:
+                    stale.setdefault(spec, []).append(coin)
+
+        need = sorted({c for coins in stale.values() for c in coins})
+        if need:
+            dates, prices = PriceHistoryStore.matrix(need, days=bucket)
+            column = {c: j for j, c in enumerate(need)}
+            for spec, coins in stale.items():
+                cols = [column[c] for c in coins]
+                outputs = Indicators.compute(spec[0], prices[:, cols], spec[1])
+                for j, coin in enumerate(coins):
+                    # Drop the rows before this coin's history starts
+                    has = np.isfinite(prices[:, cols[j]])
+                    start = int(has.argmax()) if has.any() else len(dates)
+                    coin_dates = dates[start:]
+                    values = {k: v[start:, j].copy() for k, v in outputs.items()}
+                    IndicatorService._store((coin,) + spec + (bucket,), (latest[coin], coin_dates, values))
+                    IndicatorService._serve(results[coin], spec, coin_dates, values, since)
+
+        for data in results.values():
+            data["dates"] = [d.isoformat() for d in data.get("dates", [])]
+        return results
+
+    @staticmethod
+    def _store(key: tuple, entry: Tuple[date, List[date], Dict[str, np.ndarray]]):
+        with IndicatorService._lock:
+            IndicatorService._cache[key] = entry
+            IndicatorService._cache.move_to_end(key)
+            while len(IndicatorService._cache) > IndicatorService.CACHE_SIZE:
+                IndicatorService._cache.popitem(last=False)
+
+    @staticmethod
+    def _serve(data: dict, spec: Tuple[str, tuple], dates: List[date], values: Dict[str, np.ndarray], since: date):
+        """Adds the rows of a bucket-wide entry from `since` onwards to `data`."""
+        start = bisect.bisect_left(dates, since)
+        data["dates"] = dates[start:]
+        data.update(IndicatorService._series(spec, {k: v[start:] for k, v in values.items()}))
+
+    @staticmethod
+    def _series(spec: Tuple[str, tuple], values: Dict[str, np.ndarray]) -> dict:
+        name, params = spec
+        label = name + "_" + "_".join(f"{p:g}" for p in params)
+        return {
+            (label if key == name else f"{label}_{key}"): [float(v) if np.isfinite(v) else None for v in arr.tolist()]
+            for key, arr in values.items()
+        }
+
+    @staticmethod
+    def latest(coin_ids: Sequence[str], specs: Sequence[Tuple[str, tuple]], **kwargs) -> Dict[str, dict]:
+        """Only the most recent value of every series, for summary tables."""
+        full = IndicatorService.for_coins(coin_ids, specs, **kwargs)
+        return {
+            coin: {k: (v[-1] if v else None) for k, v in data.items() if k != "dates"}
+            for coin, data in full.items()
+        }
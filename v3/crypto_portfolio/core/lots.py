@@ -0,0 +1,274 @@
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..extensions import db
+from .models import Transaction
+
+METHODS = ('fifo', 'lifo', 'average')
+BUY_TYPES = {'buy', 'achat'}
+SELL_TYPES = {'sell', 'vente', 'auto_cashout'}
+EPSILON = 1e-12
+
+class LotQueue:
+    """
+    Open lots of one symbol in two growable float arrays used as a deque:
+    FIFO sells consume from `head`, LIFO sells from `tail`. Every lot is
+    pushed once and fully consumed at most once, so a fill costs amortized
+    O(1) plus one partial lot. In 'average' mode all buys merge into a single lot.
+    """
+    __slots__ = ('method', 'qty', 'price', 'head', 'tail', 'quantity', 'cost')
+
+    def __init__(self, method: str = 'fifo', capacity: int = 8):
+        if method not in METHODS:
+            raise ValueError(f"Unknown lot method {method}")
+        self.method = method
+        self.qty = np.empty(capacity)
+        self.price = np.empty(capacity)
+        self.head = 0
+        self.tail = 0
+        self.quantity = 0.0 # running totals of the open lots
+        self.cost = 0.0
+
+    def _reserve(self):
+        if self.tail < len(self.qty):
+            return
+        used = self.tail - self.head
+        if used * 2 <= len(self.qty):
+            # Plenty of consumed slots at the front: slide the lots down
+            self.qty[:used] = self.qty[self.head:self.tail]
+            self.price[:used] = self.price[self.head:self.tail]
+        else:
+            qty, price = self.qty, self.price
+            self.qty = np.empty(len(qty) * 2)
+            self.price = np.empty(len(price) * 2)
+            self.qty[:used] = qty[self.head:self.tail]
+            self.price[:used] = price[self.head:self.tail]
+        self.head, self.tail = 0, used
+
+    def buy(self, quantity: float, price: float):
+        if quantity <= 0:
+            return
+        self.quantity += quantity
+        self.cost += quantity * price
+        if self.method == 'average':
+            self.head, self.tail = 0, 1
+            self.qty[0] = self.quantity
+            self.price[0] = self.cost / self.quantity
+            return
+        self._reserve()
+        self.qty[self.tail] = quantity
+        self.price[self.tail] = price
+        self.tail += 1
+
+    def sell(self, quantity: float) -> Tuple[float, float]:
+        """
+        Removes up to `quantity` from the open lots.
+        Returns (matched quantity, cost basis of the matched quantity).
+        """
+        if quantity <= 0 or self.quantity <= EPSILON:
+            return 0.0, 0.0
+        if self.method == 'average':
+            matched = min(quantity, self.quantity)
+            basis = matched * self.cost / self.quantity
+            self.quantity -= matched
+            self.cost -= basis
+            if self.quantity <= EPSILON:
+                self.quantity, self.cost, self.head, self.tail = 0.0, 0.0, 0, 0
+            else:
+                self.qty[0] = self.quantity
+            return matched, basis
+
+        remaining = quantity
+        basis = 0.0
+        lifo = self.method == 'lifo'
+        while remaining > EPSILON and self.head < self.tail:
+            i = self.tail - 1 if lifo else self.head
+            take = min(remaining, self.qty[i])
+            basis += take * self.price[i]
+            remaining -= take
+            self.qty[i] -= take
+            if self.qty[i] <= EPSILON:
+                if lifo:
+                    self.tail -= 1
+                else:
+                    self.head += 1
+        matched = quantity - remaining
+        self.quantity -= matched
+        self.cost -= basis
+        if self.head >= self.tail:
+            self.quantity, self.cost, self.head, self.tail = 0.0, 0.0, 0, 0
+        return matched, basis
+
+    def lots(self) -> List[dict]:
+        return [
+            {"quantity": float(q), "price": float(p)}
+            for q, p in zip(self.qty[self.head:self.tail], self.price[self.head:self.tail])
+        ]
+
+
+class LotBook:
+    """
+    Open lots of every symbol of one user, fed transactions in date order.
+    """
+
+    def __init__(self, method: str = 'fifo'):
+        self.method = method
+        self.queues: Dict[str, LotQueue] = {}
+        self.realized: Dict[str, float] = {}
+        self.last_date: Optional[datetime] = None
+        self.count = 0 # transactions applied
+
+    @staticmethod
+    def key(symbol: str) -> str:
+        # Exchange pairs ('BTC/USDT') book against their base asset
+        return (symbol or '').split('/')[0].strip().upper()
+
+    def apply(self, txn: Transaction) -> Optional[float]:
+        """
+        Books one transaction and returns the realized P/L of a sell
+        (None for other types). Quantity sold beyond the open lots has no
+        known cost and is booked at the sale price, i.e. without P/L.
+        """
+        self.count += 1
+        kind = (txn.type or '').lower()
+        symbol = LotBook.key(txn.symbol)
+        qty = txn.quantity or 0.0
+        price = txn.price or 0.0
+        if txn.date is not None and (self.last_date is None or txn.date > self.last_date):
+            self.last_date = txn.date
+
+        if kind in BUY_TYPES:
+            queue = self.queues.get(symbol)
+            if queue is None:
+                queue = self.queues[symbol] = LotQueue(self.method)
+            queue.buy(qty, price)
+            return None
+        if kind in SELL_TYPES:
+            queue = self.queues.get(symbol)
+            matched, basis = queue.sell(qty) if queue else (0.0, 0.0)
+            pnl = matched * price - basis
+            self.realized[symbol] = self.realized.get(symbol, 0.0) + pnl
+            return pnl
+        return None
+
+    def positions(self, prices: Optional[Dict[str, float]] = None) -> Dict[str, dict]:
+        """
+        SYMBOL -> open quantity, cost, average price, realized and (when a
+        price is given) unrealized P/L.
+        """
+        prices = prices or {}
+        result = {}
+        for symbol in sorted(set(self.queues) | set(self.realized)):
+            queue = self.queues.get(symbol)
+            quantity = queue.quantity if queue else 0.0
+            cost = queue.cost if queue else 0.0
+            price = prices.get(symbol)
+            result[symbol] = {
+                "quantity": quantity,
+                "cost": cost,
+                "average_price": cost / quantity if quantity > EPSILON else 0.0,
+                "realized_pl": self.realized.get(symbol, 0.0),
+                "unrealized_pl": quantity * price - cost if price is not None else None,
+                "lots": queue.lots() if queue else []
+            }
+        return result
+
+
+class LotService:
+    """
+    Per-user lot books kept in memory and advanced one transaction at a time.
+    A backdated transaction triggers a replay of the user's history, and so
+    does a book whose transaction count no longer matches the database
+    (rows written by another worker, or deleted); record() checks the count
+    on the first fill of a session transaction only. Books advanced in a
+    session transaction that ends without a commit are dropped.
+    """
+    DEFAULT_METHOD = 'fifo' # method whose result is stored in Transaction.profit_loss
+    _books: Dict[Tuple[str, str], LotBook] = {}
+    _lock = threading.RLock()
+
+    @staticmethod
+    def _count(user_id: str) -> int:
+        # Autoflushes, so transactions added to the session are counted
+        return Transaction.query.filter_by(user_id=user_id).count()
+
+    @staticmethod
+    def rebuild(user_id: str, method: str = DEFAULT_METHOD) -> LotBook:
+        """Replays every transaction of the user; the default method also rewrites sell P/L."""
+        book = LotBook(method)
+        txns = Transaction.query.filter_by(user_id=user_id) \
+            .order_by(Transaction.date, Transaction.id).all()
+        for txn in txns:
+            pnl = book.apply(txn)
+            if pnl is not None and method == LotService.DEFAULT_METHOD:
+                txn.profit_loss = pnl
+        with LotService._lock:
+            LotService._books[(user_id, method)] = book
+        return book
+
+    @staticmethod
+    def book(user_id: str, method: str = DEFAULT_METHOD) -> LotBook:
+        book = LotService._books.get((user_id, method))
+        if book is not None and book.count == LotService._count(user_id):
+            return book
+        return LotService.rebuild(user_id, method)
+
+    @staticmethod
+    def _touch(user_id: str):
+        # Remembered until the session's transaction ends; see _discard_uncommitted
+        db.session.info.setdefault('lot_users', set()).add(user_id)
+
+    @staticmethod
+    def record(txn: Transaction) -> Optional[float]:
+        """
+        Books a new transaction (already added to the session) in every
+        cached book of its user and fills in its profit_loss with the
+        DEFAULT_METHOD result. The caller commits.
+        """
+        if txn.date is None:
+            txn.date = datetime.utcnow()
+        # Books are checked against the database once per session transaction;
+        # later records in it only advance the count they already track
+        verified = txn.user_id in db.session.info.get('lot_users', ())
+        count = None if verified else LotService._count(txn.user_id) # includes txn
+        with LotService._lock:
+            for method in METHODS:
+                key = (txn.user_id, method)
+                book = LotService._books.get(key)
+                if book is None:
+                    continue
+                stale = count is not None and book.count != count - 1
+                if stale or (book.last_date is not None and txn.date < book.last_date):
+                    del LotService._books[key] # stale or backdated: replayed on next use
+                    continue
+                pnl = book.apply(txn)
+                if method == LotService.DEFAULT_METHOD and pnl is not None:
+                    txn.profit_loss = pnl
+            current = (txn.user_id, LotService.DEFAULT_METHOD) in LotService._books
+        LotService._touch(txn.user_id)
+
+        if not current:
+            LotService.rebuild(txn.user_id, LotService.DEFAULT_METHOD)
+        return txn.profit_loss
+
+    @staticmethod
+    def invalidate(user_id: str):
+        with LotService._lock:
+            for key in [k for k in LotService._books if k[0] == user_id]:
+                del LotService._books[key]
+
+
+@event.listens_for(Session, 'after_commit')
+def _keep_committed(session):
+    session.info.pop('lot_users', None)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_uncommitted(session, transaction):
+    """Books advanced in a transaction that was rolled back or closed may hold phantom lots."""
+    if transaction.parent is None:
+        for user_id in session.info.pop('lot_users', ()):
+            LotService.invalidate(user_id)
@@ -104,7 +104,7 @@ class Asset(db.Model):
 
 class Transaction(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
-    user_id = db.Column(db.String(36), db.ForeignKey('user.id'))
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), index=True)
     
     symbol = db.Column(db.String(20))
     type = db.Column(db.String(20)) # buy, sell
@@ -113,8 +113,14 @@ class Transaction(db.Model):
     date = db.Column(db.DateTime, default=datetime.utcnow)
     asset_name = db.Column(db.String(100))
     asset_type = db.Column(db.String(20))
-    strategy = db.Column(db.String(50)) # manual, auto_trade
+    strategy = db.Column(db.String(50)) # manual, auto_trade, exchange_sync
     profit_loss = db.Column(db.Float, default=0.0)
+    exchange_order_id = db.Column(db.String(100), index=True) # order placed through the app
+    exchange_trade_id = db.Column(db.String(100)) # fill imported by ExchangeSyncService
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'exchange_trade_id', name='uq_transaction_exchange_trade'),
+    )
     
     def to_dict(self):
         return {
@@ -171,6 +177,11 @@ class ExchangeCredential(db.Model):
     api_key_enc = db.Column(db.Text)
     api_secret_enc = db.Column(db.Text)
     is_active = db.Column(db.Boolean, default=True)
+    status = db.Column(db.String(20)) # pending, verified, failed; NULL for keys saved before verification was async
+    status_message = db.Column(db.String(255)) # why verification failed
+    checked_at = db.Column(db.DateTime)
+    trades_since = db.Column(db.BigInteger) # ms timestamp of the last synced trade
+    synced_at = db.Column(db.DateTime)
     
     # Relationship to user
     user = db.relationship('User', backref=db.backref('exchanges', lazy='dynamic'))
@@ -180,7 +191,11 @@ class ExchangeCredential(db.Model):
             'id': self.id,
             'exchange_id': self.exchange_id,
             'is_active': self.is_active,
-            'has_key': bool(self.api_key_enc)
+            'has_key': bool(self.api_key_enc),
+            'status': self.status or ('verified' if self.is_active else 'failed'),
+            'status_message': self.status_message,
+            'checked_at': self.checked_at.isoformat() if self.checked_at else None,
+            'synced_at': self.synced_at.isoformat() if self.synced_at else None
         }
 
 class Simulation(db.Model):
@@ -283,3 +298,133 @@ class PortfolioSnapshot(db.Model):
             'date': self.date.isoformat(),
             'total_value': self.total_value
         }
+
+class PortfolioRollup(db.Model):
+    """
+    Pre-aggregated PortfolioSnapshot values per day, week or month.
+    """
+    id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), index=True)
+    period = db.Column(db.String(10)) # day, week, month
+    bucket_start = db.Column(db.Date)
+    open_value = db.Column(db.Float)
+    close_value = db.Column(db.Float)
+    min_value = db.Column(db.Float)
+    max_value = db.Column(db.Float)
+    first_date = db.Column(db.Date) # snapshot date behind open_value
+    last_date = db.Column(db.Date) # snapshot date behind close_value
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'period', 'bucket_start', name='uq_rollup_bucket'),
+    )
+
+    def to_dict(self):
+        return {
+            'period': self.period,
+            'date': self.bucket_start.isoformat(),
+            'open': self.open_value,
+            'close': self.close_value,
+            'min': self.min_value,
+            'max': self.max_value
+        }
+
+class PriceHistory(db.Model):
+    """
+    Local store of daily coin prices (CoinGecko market_chart data).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    coin_id = db.Column(db.String(50), index=True)
+    date = db.Column(db.Date)
+    price = db.Column(db.Float)
+
+    __table_args__ = (
+        db.UniqueConstraint('coin_id', 'date', name='uq_price_history_day'),
+    )
+
+    def to_dict(self):
+        return {
+            'coin_id': self.coin_id,
+            'date': self.date.isoformat(),
+            'price': self.price
+        }
+
+class RebalanceTarget(db.Model):
+    """
+    Target weight (percent) of a user's portfolio for one coin symbol
+    ('BTC'), CoinGecko id or asset class ('crypto').
+    """
+    id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), index=True)
+    key = db.Column(db.String(50))
+    weight = db.Column(db.Float)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_rebalance_target'),
+    )
+
+    def to_dict(self):
+        return {
+            'key': self.key,
+            'weight': self.weight
+        }
+
+class ForecastEvaluation(db.Model):
+    """
+    Walk-forward accuracy of the price predictor for one coin, history
+    window, polynomial degree and forecast horizon (days).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    coin_id = db.Column(db.String(50), index=True)
+    window = db.Column(db.Integer)
+    degree = db.Column(db.Integer)
+    horizon = db.Column(db.Integer)
+    samples = db.Column(db.Integer)
+    mae = db.Column(db.Float)
+    mape = db.Column(db.Float) # percent
+    directional_accuracy = db.Column(db.Float) # 0-1
+    evaluated_on = db.Column(db.Date)
+
+    __table_args__ = (
+        db.UniqueConstraint('coin_id', 'window', 'degree', 'horizon', name='uq_forecast_evaluation'),
+    )
+
+    def to_dict(self):
+        return {
+            'coin_id': self.coin_id,
+            'window': self.window,
+            'degree': self.degree,
+            'horizon': self.horizon,
+            'samples': self.samples,
+            'mae': self.mae,
+            'mape': self.mape,
+            'directional_accuracy': self.directional_accuracy,
+            'evaluated_on': self.evaluated_on.isoformat() if self.evaluated_on else None
+        }
+
+class ForecastModelChoice(db.Model):
+    """
+    Forecasting model picked by cross-validation for one coin and horizon.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    coin_id = db.Column(db.String(50), index=True)
+    horizon = db.Column(db.Integer)
+    model_key = db.Column(db.String(30))
+    mape = db.Column(db.Float) # percent, averaged over the validation folds
+    directional_accuracy = db.Column(db.Float) # 0-1
+    folds = db.Column(db.Integer)
+    evaluated_on = db.Column(db.Date)
+
+    __table_args__ = (
+        db.UniqueConstraint('coin_id', 'horizon', name='uq_forecast_model_choice'),
+    )
+
+    def to_dict(self):
+        return {
+            'coin_id': self.coin_id,
+            'horizon': self.horizon,
+            'model': self.model_key,
+            'mape': self.mape,
+            'directional_accuracy': self.directional_accuracy,
+            'folds': self.folds,
+            'evaluated_on': self.evaluated_on.isoformat() if self.evaluated_on else None
+        }
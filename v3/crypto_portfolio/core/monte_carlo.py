@@ -0,0 +1,224 @@
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from ..utils.api import CoinGeckoAPI
+from .parallel import map_tasks
+from .price_history import PriceHistoryStore
+from .valuation import PortfolioValuation
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+@dataclass
+class MonteCarloResult:
+    """
+    Percentile bands of simulated portfolio values.
+    """
+    n_paths: int
+    horizon_days: int
+    initial_value: float
+    checkpoints: List[int]
+    bands: dict # percentile -> values at each checkpoint
+    terminal: dict # percentile -> terminal value
+    target: Optional[float] = None
+    probability_of_target: Optional[float] = None
+    time_to_target: Optional[dict] = None # percentile -> days, None if not reached
+
+    def to_dict(self) -> dict:
+        return {
+            "n_paths": self.n_paths,
+            "horizon_days": self.horizon_days,
+            "initial_value": self.initial_value,
+            "checkpoints": self.checkpoints,
+            "bands": {str(k): v for k, v in self.bands.items()},
+            "terminal": {str(k): v for k, v in self.terminal.items()},
+            "target": self.target,
+            "probability_of_target": self.probability_of_target,
+            "time_to_target": {str(k): v for k, v in self.time_to_target.items()} if self.time_to_target else None
+        }
+
+
+def _simulate_chunk(args) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Simulates one chunk of paths, made of whole blocks that each draw from
+    their own seed. Module-level so a process pool can pickle it.
+    Returns (terminal values, first day at/above target or -1, values at checkpoints).
+    """
+    blocks, values, mu, chol, horizon, checkpoints, static_value, target = args
+    n_assets = len(values)
+    n_paths = sum(size for _, size in blocks)
+
+    # (paths, days, assets) correlated daily log-returns
+    z = np.empty((n_paths, horizon, n_assets))
+    start = 0
+    for seed, size in blocks:
+        np.random.default_rng(seed).standard_normal((size, horizon, n_assets), out=z[start:start + size])
+        start += size
+    log_returns = z @ chol.T + mu
+    np.cumsum(log_returns, axis=1, out=log_returns)
+    portfolio = np.exp(log_returns) @ values + static_value # (paths, days)
+
+    terminal = portfolio[:, -1]
+    if target is not None:
+        hit = portfolio >= target
+        first = np.where(hit.any(axis=1), hit.argmax(axis=1) + 1, -1)
+    else:
+        first = np.full(n_paths, -1)
+    return terminal, first, portfolio[:, checkpoints]
+
+
+class MonteCarloEngine:
+    """
+    Correlated geometric Brownian motion simulation of a set of holdings.
+    """
+
+    # Upper bound on floats held by one chunk's (paths, days, assets) array;
+    # a chunk always holds at least one block
+    MAX_CHUNK_ELEMENTS = 4_000_000
+    # Paths drawn from one seed, so results do not depend on the chunk size
+    BLOCK_PATHS = 64
+    MAX_CHECKPOINTS = 60
+
+    @staticmethod
+    def estimate(prices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Daily mean and covariance of log-returns from a (T, N) price matrix.
+        Days where any coin lacks a price are skipped.
+        """
+        prices = np.asarray(prices, dtype=float).reshape(len(prices), -1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = np.diff(np.log(prices), axis=0)
+        r = r[np.all(np.isfinite(r), axis=1)]
+        if len(r) < 2:
+            raise ValueError("Not enough price history to estimate returns")
+        return r.mean(axis=0), np.atleast_2d(np.cov(r, rowvar=False))
+
+    @staticmethod
+    def cholesky(cov: np.ndarray) -> np.ndarray:
+        """
+        Cholesky factor, falling back to an eigenvalue-clipped factor for
+        matrices that are only positive semi-definite.
+        """
+        cov = np.atleast_2d(cov)
+        try:
+            return np.linalg.cholesky(cov)
+        except np.linalg.LinAlgError:
+            w, v = np.linalg.eigh(cov)
+            return v * np.sqrt(np.clip(w, 0, None))
+
+    @staticmethod
+    def chunk_blocks(horizon: int, n_assets: int) -> int:
+        paths = MonteCarloEngine.MAX_CHUNK_ELEMENTS // (horizon * max(n_assets, 1))
+        return max(1, paths // MonteCarloEngine.BLOCK_PATHS)
+
+    @staticmethod
+    def simulate(values: Sequence[float], mu: np.ndarray, cov: np.ndarray, horizon_days: int = 365,
+                 n_paths: int = 10_000, target: Optional[float] = None, static_value: float = 0.0,
+                 workers: int = 0, seed: Optional[int] = None) -> MonteCarloResult:
+        """
+        Simulates `n_paths` daily paths of the holdings' total value.
+
+        values: current value of each simulated holding; mu/cov: daily
+        log-return mean and covariance; static_value: value held outside
+        the simulation (e.g. assets without price history).
+        workers > 0 spreads the chunks over a process pool.
+        """
+        if horizon_days < 1 or n_paths < 1:
+            raise ValueError("horizon_days and n_paths must be positive")
+        values = np.asarray(values, dtype=float)
+        mu = np.asarray(mu, dtype=float).reshape(-1)
+        cov = np.atleast_2d(np.asarray(cov, dtype=float))
+        chol = MonteCarloEngine.cholesky(cov)
+
+        n_checkpoints = min(horizon_days, MonteCarloEngine.MAX_CHECKPOINTS)
+        checkpoints = np.unique(np.linspace(0, horizon_days - 1, n_checkpoints).round().astype(int))
+
+        block = MonteCarloEngine.BLOCK_PATHS
+        sizes = [min(block, n_paths - start) for start in range(0, n_paths, block)]
+        blocks = list(zip(np.random.SeedSequence(seed).spawn(len(sizes)), sizes))
+        per_chunk = MonteCarloEngine.chunk_blocks(horizon_days, len(values))
+        tasks = [
+            (blocks[i:i + per_chunk], values, mu, chol, horizon_days, checkpoints, static_value, target)
+            for i in range(0, len(blocks), per_chunk)
+        ]
+
+        parts = map_tasks(_simulate_chunk, tasks, workers)
+
+        terminal = np.concatenate([p[0] for p in parts])
+        first = np.concatenate([p[1] for p in parts])
+        at_checkpoints = np.concatenate([p[2] for p in parts])
+
+        bands_matrix = np.percentile(at_checkpoints, PERCENTILES, axis=0)
+        terminal_pct = np.percentile(terminal, PERCENTILES)
+        result = MonteCarloResult(
+            n_paths=n_paths,
+            horizon_days=horizon_days,
+            initial_value=float(values.sum() + static_value),
+            checkpoints=(checkpoints + 1).tolist(),
+            bands={p: row.tolist() for p, row in zip(PERCENTILES, bands_matrix)},
+            terminal={p: float(v) for p, v in zip(PERCENTILES, terminal_pct)}
+        )
+
+        if target is not None:
+            reached = first >= 0
+            result.target = float(target)
+            result.probability_of_target = float(reached.mean())
+            # Paths that never reach the target count as +inf, so high
+            # percentiles can be "not reached" (None)
+            days = np.where(reached, first, np.inf)
+            ttt = np.percentile(days, PERCENTILES, method='nearest')
+            result.time_to_target = {p: (int(d) if np.isfinite(d) else None) for p, d in zip(PERCENTILES, ttt)}
+        return result
+
+
+class MonteCarloService:
+    """
+    Builds simulation inputs from the user's holdings and the local price history.
+    """
+    HISTORY_DAYS = 365
+    MAX_ASSETS = 50 # largest holdings simulated; the rest are held constant
+
+    @staticmethod
+    def _run(coin_values: dict, static_value: float, **kwargs) -> MonteCarloResult:
+        if len(coin_values) > MonteCarloService.MAX_ASSETS:
+            ranked = sorted(coin_values, key=coin_values.get, reverse=True)
+            for coin_id in ranked[MonteCarloService.MAX_ASSETS:]:
+                static_value += coin_values.pop(coin_id)
+        coin_ids = sorted(coin_values)
+        if coin_ids:
+            PriceHistoryStore.refresh(coin_ids, days=MonteCarloService.HISTORY_DAYS)
+            _, prices = PriceHistoryStore.matrix(coin_ids, days=MonteCarloService.HISTORY_DAYS)
+            # Coins without any stored price are held constant
+            has_history = np.sum(np.isfinite(prices), axis=0) > 2 if prices.size else np.zeros(len(coin_ids), bool)
+            for coin_id, ok in zip(coin_ids, has_history):
+                if not ok:
+                    static_value += coin_values.pop(coin_id)
+            prices = prices[:, has_history] if prices.size else prices
+            coin_ids = sorted(coin_values)
+
+        if not coin_ids:
+            # Nothing to simulate: a flat path at the current value
+            return MonteCarloEngine.simulate([0.0], [0.0], [[0.0]], static_value=static_value, **kwargs)
+
+        mu, cov = MonteCarloEngine.estimate(prices)
+        values = [coin_values[c] for c in coin_ids]
+        return MonteCarloEngine.simulate(values, mu, cov, static_value=static_value, **kwargs)
+
+    @staticmethod
+    def for_assets(assets: Sequence, prices: Optional[dict] = None, **kwargs) -> MonteCarloResult:
+        valuation = PortfolioValuation.value_assets(assets, prices)
+        coin_values = {}
+        static_value = 0.0
+        for asset, value in zip(assets, valuation.value.tolist()):
+            if asset.coin_id:
+                coin_values[asset.coin_id] = coin_values.get(asset.coin_id, 0.0) + value
+            else:
+                static_value += value
+        return MonteCarloService._run(coin_values, static_value, **kwargs)
+
+    @staticmethod
+    def for_simulation(simulation, **kwargs) -> MonteCarloResult:
+        value = simulation.current_value or simulation.investment or 0.0
+        coin_id = CoinGeckoAPI.search_coin(simulation.symbol) if simulation.asset_type == 'crypto' else None
+        if coin_id:
+            return MonteCarloService._run({coin_id: value}, 0.0, **kwargs)
+        return MonteCarloService._run({}, value, **kwargs)
@@ -0,0 +1,161 @@
+import hashlib
+from typing import Dict, Optional, Sequence
+import numpy as np
+from .correlation import CorrelationService
+
+class MeanVarianceOptimizer:
+    """
+    Long-only mean-variance optimization. All frontier points are solved
+    together as one batch of projected-gradient problems, so the cost per
+    iteration is a single (K, N) x (N, N) product.
+    """
+
+    @staticmethod
+    def project_simplex(v: np.ndarray) -> np.ndarray:
+        """
+        Euclidean projection of each row onto {w >= 0, sum(w) = 1}.
+        """
+        n = v.shape[1]
+        u = -np.sort(-v, axis=1)
+        css = np.cumsum(u, axis=1) - 1
+        k = np.arange(1, n + 1)
+        rho = np.count_nonzero(u - css / k > 0, axis=1)
+        theta = css[np.arange(len(v)), rho - 1] / rho
+        return np.maximum(v - theta[:, None], 0)
+
+    @staticmethod
+    def solve(mu: np.ndarray, cov: np.ndarray, tradeoff: Sequence[float], iterations: int = 500,
+              tol: float = 1e-10) -> np.ndarray:
+        """
+        For each t in `tradeoff`, minimizes  w'Cw - t * w'mu  over the
+        simplex with FISTA; t = 0 is the minimum-variance portfolio.
+        Returns a (K, N) weight matrix.
+        """
+        mu = np.asarray(mu, dtype=float)
+        cov = np.asarray(cov, dtype=float)
+        t = np.asarray(tradeoff, dtype=float)[:, None]
+        n = len(mu)
+
+        step = 1.0 / (2 * max(np.linalg.eigvalsh(cov)[-1], 1e-12))
+        w = np.full((len(t), n), 1.0 / n)
+        y = w.copy()
+        momentum = 1.0
+        for _ in range(iterations):
+            grad = 2 * y @ cov - t * mu
+            w_next = MeanVarianceOptimizer.project_simplex(y - step * grad)
+            momentum_next = (1 + np.sqrt(1 + 4 * momentum * momentum)) / 2
+            y = w_next + ((momentum - 1) / momentum_next) * (w_next - w)
+            converged = np.max(np.abs(w_next - w)) < tol
+            w, momentum = w_next, momentum_next
+            if converged:
+                break
+        return w
+
+    @staticmethod
+    def frontier(mu: np.ndarray, cov: np.ndarray, points: int = 40, risk_free: float = 0.0) -> dict:
+        """
+        Efficient frontier plus the min-variance and max-Sharpe portfolios.
+        Returns and volatilities are in the units of mu/cov.
+        """
+        mu = np.asarray(mu, dtype=float)
+        cov = np.asarray(cov, dtype=float)
+        # Tradeoffs from "variance only" to "almost return only", log-spaced
+        # around the ratio of typical variance to typical return
+        scale = max(float(np.diag(cov).max()), 1e-12) / max(float(np.abs(mu).max()), 1e-12)
+        tradeoffs = np.concatenate([[0.0], scale * np.logspace(-3, 3, points - 2)])
+        weights = MeanVarianceOptimizer.solve(mu, cov, tradeoffs)
+
+        # The maximum-return end of the frontier is the best single asset
+        corner = np.zeros((1, len(mu)))
+        corner[0, int(np.argmax(mu))] = 1.0
+        weights = np.vstack([weights, corner])
+
+        rets = weights @ mu
+        vols = np.sqrt(np.einsum('kn,nm,km->k', weights, cov, weights).clip(0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sharpe = np.where(vols > 0, (rets - risk_free) / vols, -np.inf)
+
+        order = np.argsort(vols, kind='stable')
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        return {
+            "weights": weights[order],
+            "returns": rets[order],
+            "volatilities": vols[order],
+            "min_variance": int(rank[0]),
+            "max_sharpe": int(rank[int(np.argmax(sharpe))])
+        }
+
+
+class FrontierService:
+    """
+    Efficient frontier for a user's coin holdings, cached per holdings
+    fingerprint and price-history date.
+    """
+    WINDOW = 365
+    PERIODS_PER_YEAR = 365
+    MAX_CACHE_ENTRIES = 256
+    _cache: Dict[str, dict] = {}
+
+    @staticmethod
+    def fingerprint(holdings: Dict[str, float]) -> str:
+        payload = ";".join(f"{c}:{q:.8g}" for c, q in sorted(holdings.items()))
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    @staticmethod
+    def for_holdings(values: Dict[str, float], quantities: Dict[str, float],
+                     labels: Optional[Dict[str, str]] = None, points: int = 40) -> Optional[dict]:
+        """
+        values/quantities: coin_id -> current value / quantity held.
+        """
+        coins = sorted(values)
+        if len(coins) < 2:
+            return None
+        state = CorrelationService.get(coins, FrontierService.WINDOW)
+        if state is None or state.observations < 2:
+            return None
+
+        key = f"{FrontierService.fingerprint(quantities)}:{state.last_date}:{points}"
+        if key in FrontierService._cache:
+            return FrontierService._cache[key]
+
+        n = state.observations
+        periods = FrontierService.PERIODS_PER_YEAR
+        mu = state.sums / n * periods
+        cov = state.covariance() * periods
+        result = MeanVarianceOptimizer.frontier(mu, cov, points)
+
+        labels = labels or {}
+        names = [labels.get(c, c) for c in state.coin_ids]
+        # Coins left out of the covariance (too little history) are left out of the current mix too
+        total = sum(values[c] for c in state.coin_ids)
+        current = np.array([values[c] / total if total else 0 for c in state.coin_ids])
+
+        def portfolio(i: int) -> dict:
+            return {
+                "return": float(result["returns"][i]),
+                "volatility": float(result["volatilities"][i]),
+                "weights": dict(zip(names, result["weights"][i].round(6).tolist()))
+            }
+
+        report = {
+            "coins": list(state.coin_ids),
+            "labels": names,
+            "excluded": [labels.get(c, c) for c in coins if c not in state.coin_ids],
+            "as_of": state.last_date.isoformat() if state.last_date else None,
+            "frontier": [
+                {"return": float(r), "volatility": float(v)}
+                for r, v in zip(result["returns"], result["volatilities"])
+            ],
+            "min_variance": portfolio(result["min_variance"]),
+            "max_sharpe": portfolio(result["max_sharpe"]),
+            "current": {
+                "return": float(current @ mu),
+                "volatility": float(np.sqrt(max(current @ cov @ current, 0))),
+                "weights": dict(zip(names, current.round(6).tolist()))
+            }
+        }
+        if len(FrontierService._cache) >= FrontierService.MAX_CACHE_ENTRIES:
+            FrontierService._cache.clear()
+        FrontierService._cache[key] = report
+        return report
@@ -0,0 +1,196 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import List, Optional, Sequence
+import ccxt.async_support as ccxt_async
+from ..extensions import db
+from ..utils.security import SecurityManager
+from .models import ExchangeCredential, User
+from .lots import LotService, EPSILON
+from .trading_engine import TradingEngine
+
+@dataclass
+class OrderResult:
+    """
+    Outcome of one order of a batch; latency is the exchange round trip.
+    """
+    symbol: str
+    side: str
+    amount: float
+    status: str # placed, pending (resting on the book), failed, skipped
+    order_id: Optional[str] = None
+    price: Optional[float] = None
+    filled: Optional[float] = None
+    latency: Optional[float] = None # seconds
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class ThreadedClient:
+    """
+    Async facade over a synchronous client (venues registered in
+    TradingEngine without an async implementation); calls run in threads.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    async def create_order(self, *args):
+        return await asyncio.to_thread(self.client.create_order, *args)
+
+    async def close(self):
+        pass
+
+
+class OrderPipeline:
+    """
+    Submits a batch of orders for one exchange account concurrently with
+    ccxt.async_support, whose throttler keeps each client within the
+    exchange's rate limit, then books every fill in a single commit.
+    Orders are given in phases: a phase starts once the previous one is
+    done, so sells can fund the buys that follow them.
+    Async clients live on one background event loop, pooled per credential
+    like the synchronous ones, so a batch pays neither client setup nor
+    ccxt's shutdown delay.
+    """
+    MAX_CONCURRENCY = 8
+    POOL_SIZE = 64
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _loop_lock = threading.Lock()
+    # credential id -> {"client", "fingerprint", "created_at", "markets_at"}; only touched on the loop
+    _clients: "OrderedDict[str, dict]" = OrderedDict()
+
+    @staticmethod
+    def run(coro):
+        """Runs a coroutine on the pipeline's event loop and waits for its result."""
+        with OrderPipeline._loop_lock:
+            if OrderPipeline._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, daemon=True).start()
+                OrderPipeline._loop = loop
+        return asyncio.run_coroutine_threadsafe(coro, OrderPipeline._loop).result()
+
+    @staticmethod
+    async def _client(credential: ExchangeCredential):
+        eid = credential.exchange_id.lower()
+        custom = TradingEngine.CUSTOM_EXCHANGES.get(eid)
+        if custom is not None and not asyncio.iscoroutinefunction(custom.create_order):
+            return ThreadedClient(TradingEngine.get_exchange_client(credential, load_markets=True))
+
+        now = time.time()
+        fingerprint = (credential.exchange_id, credential.api_key_enc, credential.api_secret_enc)
+        entry = OrderPipeline._clients.get(credential.id)
+        if entry is not None and (entry["fingerprint"] != fingerprint or now - entry["created_at"] >= TradingEngine.CLIENT_TTL):
+            del OrderPipeline._clients[credential.id]
+            await entry["client"].close()
+            entry = None
+        if entry is None:
+            exchange_class = custom or getattr(ccxt_async, eid, None)
+            if exchange_class is None:
+                raise ValueError(f"Exchange {eid} not supported by CCXT")
+            client = exchange_class({
+                'apiKey': SecurityManager.decrypt(credential.api_key_enc),
+                'secret': SecurityManager.decrypt(credential.api_secret_enc),
+                'enableRateLimit': True,
+            })
+            entry = OrderPipeline._clients[credential.id] = {"client": client, "fingerprint": fingerprint,
+                                                               "created_at": now, "markets_at": None}
+            while len(OrderPipeline._clients) > OrderPipeline.POOL_SIZE:
+                _, evicted = OrderPipeline._clients.popitem(last=False)
+                await evicted["client"].close()
+        OrderPipeline._clients.move_to_end(credential.id)
+
+        # Markets are shared with the synchronous pool, whose lock guards the map
+        client = entry["client"]
+        with TradingEngine._lock:
+            shared = TradingEngine._markets.get(eid)
+        if shared is None or now - shared[0] >= TradingEngine.MARKETS_TTL:
+            await client.load_markets(reload=True)
+            with TradingEngine._lock:
+                shared = TradingEngine._markets[eid] = (now, client.markets, client.currencies)
+            entry["markets_at"] = now
+        elif entry["markets_at"] != shared[0]:
+            client.set_markets(shared[1], shared[2])
+            entry["markets_at"] = shared[0]
+        return client
+
+    @staticmethod
+    async def close():
+        """Closes the pooled async clients."""
+        while OrderPipeline._clients:
+            _, entry = OrderPipeline._clients.popitem()
+            await entry["client"].close()
+
+    @staticmethod
+    async def _place(client, semaphore: asyncio.Semaphore, order: dict) -> OrderResult:
+        result = OrderResult(order["symbol"], order["side"], order["amount"], "failed")
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                args = [order["symbol"], 'limit' if order.get("price") else 'market', order["side"], order["amount"]]
+                if order.get("price"):
+                    args.append(order["price"])
+                placed = await client.create_order(*args) or {}
+                # A resting order is not booked here: the exchange sync imports its fills
+                result.status = "pending" if placed.get('status') == 'open' else "placed"
+                result.order_id = placed.get('id')
+                result.price = placed.get('average') or placed.get('price') or order.get("price")
+                result.filled = placed.get('filled')
+            except Exception as e:
+                result.error = str(e)
+            result.latency = time.perf_counter() - started
+        return result
+
+    @staticmethod
+    async def submit(credential: ExchangeCredential, phases: Sequence[Sequence[dict]],
+                     stop_on_failure: bool = True, max_concurrency: Optional[int] = None) -> List[List[OrderResult]]:
+        """
+        Places {symbol, side, amount, price} orders, each phase concurrently.
+        With stop_on_failure, phases after a failed one are skipped.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or OrderPipeline.MAX_CONCURRENCY)
+        client = await OrderPipeline._client(credential)
+        results = []
+        failed = False
+        for phase in phases:
+            if failed and stop_on_failure:
+                results.append([OrderResult(o["symbol"], o["side"], o["amount"], "skipped") for o in phase])
+                continue
+            done = await asyncio.gather(*(OrderPipeline._place(client, semaphore, o) for o in phase))
+            failed = failed or any(r.status == "failed" for r in done)
+            results.append(list(done))
+        return results
+
+    @staticmethod
+    def execute(user: User, phases: Sequence[Sequence[dict]], strategy: Optional[str] = None,
+                stop_on_failure: bool = True) -> List[List[OrderResult]]:
+        """
+        Runs submit on the user's active exchange from a synchronous caller
+        and records a Transaction per placed order for the quantity it
+        filled, committed together.
+        """
+        credential = user.exchanges.filter_by(is_active=True).first()
+        if not credential:
+            raise ValueError("No connected exchange")
+        results = OrderPipeline.run(OrderPipeline.submit(credential, phases, stop_on_failure))
+
+        booked = 0
+        for phase, done in zip(phases, results):
+            for order, result in zip(phase, done):
+                # Venues that do not report the fill are taken as filled in full
+                quantity = order["amount"] if result.filled is None else result.filled
+                if result.status != "placed" or quantity <= EPSILON:
+                    continue
+                txn = TradingEngine.transaction_for(user.id, order["symbol"], order["side"], quantity, result.price,
+                                                    strategy or ('manual' if order.get("price") else 'market_auto'),
+                                                    result.order_id)
+                db.session.add(txn)
+                LotService.record(txn)
+                booked += 1
+        if booked:
+            db.session.commit()
+        return results
@@ -0,0 +1,402 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import ccxt
+import numpy as np
+
+class OrderBook:
+    """
+    Resting limit orders of one symbol. Prices live in two heaps (bids
+    negated, asks as-is) pointing at FIFO queues of orders, so the best
+    level is O(1) to read and O(log L) to add or remove. Cancelled orders
+    and emptied levels are dropped lazily when they reach the top.
+    """
+
+    def __init__(self):
+        self.bids: List[float] = []
+        self.asks: List[float] = []
+        self.levels: Dict[Tuple[str, float], deque] = {}
+
+    def add(self, order: dict):
+        key = (order["side"], order["price"])
+        level = self.levels.get(key)
+        if level is None:
+            level = self.levels[key] = deque()
+            heapq.heappush(self.bids if order["side"] == "buy" else self.asks,
+                           -order["price"] if order["side"] == "buy" else order["price"])
+        level.append(order)
+
+    def _top(self, side: str) -> Optional[deque]:
+        heap = self.bids if side == "buy" else self.asks
+        while heap:
+            price = -heap[0] if side == "buy" else heap[0]
+            level = self.levels.get((side, price))
+            while level and level[0]["status"] != "open":
+                level.popleft()
+            if level:
+                return level
+            heapq.heappop(heap)
+            self.levels.pop((side, price), None)
+        return None
+
+    def best(self, side: str) -> Optional[float]:
+        level = self._top(side)
+        return level[0]["price"] if level else None
+
+    def crossing(self, price: float, volume: Optional[float] = None) -> List[Tuple[dict, float]]:
+        """
+        (order, quantity) filled by a trade at `price`: bids at or above it
+        and asks at or below it, best price first then oldest first. With a
+        volume, each side fills at most that much and the last order may
+        fill partially.
+        """
+        fills = []
+        for side in ("buy", "sell"):
+            left = volume
+            while left is None or left > 0:
+                level = self._top(side)
+                if level is None:
+                    break
+                order = level[0]
+                if (side == "buy" and order["price"] < price) or (side == "sell" and order["price"] > price):
+                    break
+                qty = order["remaining"] if left is None else min(order["remaining"], left)
+                fills.append((order, qty))
+                if left is not None:
+                    left -= qty
+                if qty >= order["remaining"]:
+                    level.popleft()
+                # else: partially filled, it keeps its place for the next tick
+        return fills
+
+    def open_orders(self) -> List[dict]:
+        return [o for level in self.levels.values() for o in level if o["status"] == "open"]
+
+
+class PaperMatchingEngine:
+    """
+    Simulated venue fed by price ticks. Market orders fill at the last
+    price plus slippage; limit orders rest in the OrderBook and fill at
+    their limit when a tick trades through them. Balances reserve the
+    funds of open orders, and every fill is kept as a ccxt-style trade.
+    """
+    FEE_RATE = 0.001 # charged in the quote currency
+    SLIPPAGE = 0.0005 # market orders pay this fraction over (under) the last price
+    STARTING_BALANCE = {"USDT": 100_000.0}
+
+    def __init__(self):
+        self.books: Dict[str, OrderBook] = {}
+        self.last: Dict[str, float] = {}
+        self.accounts: Dict[str, Dict[str, List[float]]] = {} # account -> currency -> [free, used]
+        self.orders: Dict[str, dict] = {}
+        self.trades: Dict[str, List[dict]] = {}
+        self.clock: Optional[int] = None # ms of the last tick; wall clock when None
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+
+    def now(self) -> int:
+        return self.clock if self.clock is not None else int(time.time() * 1000)
+
+    def account(self, account: str) -> Dict[str, List[float]]:
+        if account not in self.accounts:
+            self.accounts[account] = {c: [v, 0.0] for c, v in self.STARTING_BALANCE.items()}
+        return self.accounts[account]
+
+    def balance(self, account: str) -> Dict[str, Tuple[float, float]]:
+        with self._lock:
+            return {c: (free, used) for c, (free, used) in self.account(account).items()}
+
+    def fund(self, account: str, currency: str, amount: float):
+        with self._lock:
+            self.account(account).setdefault(currency, [0.0, 0.0])[0] += amount
+
+    def tick(self, symbol: str, price: float, volume: Optional[float] = None,
+             timestamp: Optional[int] = None) -> List[dict]:
+        """Records a trade on the market and fills the resting orders it crosses."""
+        with self._lock:
+            if timestamp is not None:
+                self.clock = timestamp
+            self.last[symbol] = price
+            book = self.books.get(symbol)
+            if book is None:
+                self.books[symbol] = OrderBook()
+                return []
+            return [self._fill(order, qty, order["price"], "maker") for order, qty in book.crossing(price, volume)]
+
+    def replay(self, ticks: Iterable[Tuple[int, str, float]]) -> int:
+        """Feeds (timestamp_ms, symbol, price) ticks in order; returns the number of fills."""
+        return sum(len(self.tick(symbol, price, timestamp=ts)) for ts, symbol, price in ticks)
+
+    def create_order(self, account: str, symbol: str, type: str, side: str, amount: float,
+                     price: Optional[float] = None) -> dict:
+        with self._lock:
+            last = self.last.get(symbol)
+            if last is None:
+                raise ccxt.BadSymbol(f"paper has no price for {symbol}")
+            if not amount or amount <= 0:
+                raise ccxt.InvalidOrder("amount must be positive")
+            if type == "limit" and (price is None or price <= 0):
+                raise ccxt.InvalidOrder("limit orders need a positive price")
+            base, quote = symbol.split("/")
+            marketable = type == "market" or (side == "buy" and price >= last) or (side == "sell" and price <= last)
+            if type == "market":
+                fill_price = last * (1 + self.SLIPPAGE if side == "buy" else 1 - self.SLIPPAGE)
+            else:
+                fill_price = min(price, last) if side == "buy" else max(price, last)
+            reserve_price = fill_price if marketable else price
+
+            funds = self.account(account)
+            currency, needed = (quote, amount * reserve_price * (1 + self.FEE_RATE)) if side == "buy" else (base, amount)
+            wallet = funds.setdefault(currency, [0.0, 0.0])
+            if wallet[0] < needed - 1e-12:
+                raise ccxt.InsufficientFunds(f"paper: {needed:.8g} {currency} needed, {wallet[0]:.8g} free")
+            wallet[0] -= needed
+            wallet[1] += needed
+
+            order = {
+                "id": str(next(self._ids)), "clientOrderId": None, "timestamp": self.now(),
+                "datetime": ccxt.Exchange.iso8601(self.now()), "lastTradeTimestamp": None,
+                "symbol": symbol, "type": type, "side": side, "price": price if type == "limit" else None,
+                "amount": amount, "filled": 0.0, "remaining": amount, "cost": 0.0, "average": None,
+                "status": "open", "fee": {"currency": quote, "cost": 0.0}, "trades": [],
+                "account": account, "reserved": needed, "reserve_price": reserve_price
+            }
+            self.orders[order["id"]] = order
+            if marketable:
+                self._fill(order, amount, fill_price, "taker")
+            else:
+                self.books.setdefault(symbol, OrderBook()).add(order)
+            return order
+
+    def _fill(self, order: dict, qty: float, price: float, role: str) -> dict:
+        base, quote = order["symbol"].split("/")
+        funds = self.account(order["account"])
+        cost = qty * price
+        fee = cost * self.FEE_RATE
+        if order["side"] == "buy":
+            # Release what was reserved for this quantity, pay the actual cost
+            released = qty * order["reserve_price"] * (1 + self.FEE_RATE)
+            funds[quote][1] -= released
+            funds[quote][0] += released - cost - fee
+            funds.setdefault(base, [0.0, 0.0])[0] += qty
+        else:
+            released = qty
+            funds[base][1] -= qty
+            funds.setdefault(quote, [0.0, 0.0])[0] += cost - fee
+        order["reserved"] -= released
+
+        order["cost"] += cost
+        order["filled"] += qty
+        order["remaining"] = max(order["amount"] - order["filled"], 0.0)
+        order["average"] = order["cost"] / order["filled"]
+        order["fee"]["cost"] += fee
+        order["lastTradeTimestamp"] = self.now()
+        if order["remaining"] <= 1e-12:
+            order["remaining"] = 0.0
+            order["status"] = "closed"
+        trade = {
+            "id": f"{order['id']}-{len(order['trades']) + 1}", "order": order["id"], "timestamp": self.now(),
+            "datetime": ccxt.Exchange.iso8601(self.now()), "symbol": order["symbol"], "type": order["type"],
+            "side": order["side"], "takerOrMaker": role, "price": price, "amount": qty, "cost": cost,
+            "fee": {"currency": quote, "cost": fee}
+        }
+        order["trades"].append(trade)
+        self.trades.setdefault(order["account"], []).append(trade)
+        return trade
+
+    def cancel_order(self, account: str, order_id: str) -> dict:
+        with self._lock:
+            order = self.orders.get(order_id)
+            if order is None or order["account"] != account:
+                raise ccxt.OrderNotFound(order_id)
+            if order["status"] != "open":
+                raise ccxt.InvalidOrder(f"order {order_id} is {order['status']}")
+            base, quote = order["symbol"].split("/")
+            wallet = self.account(account)[quote if order["side"] == "buy" else base]
+            wallet[1] -= order["reserved"]
+            wallet[0] += order["reserved"]
+            order["reserved"] = 0.0
+            order["status"] = "canceled"
+            return order
+
+    def open_orders(self, account: str, symbol: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            return [o for o in self.orders.values()
+                    if o["account"] == account and o["status"] == "open" and (symbol is None or o["symbol"] == symbol)]
+
+    def my_trades(self, account: str, symbol: Optional[str] = None, since: Optional[int] = None,
+                  limit: Optional[int] = None) -> List[dict]:
+        with self._lock:
+            trades = [t for t in self.trades.get(account, [])
+                      if (symbol is None or t["symbol"] == symbol) and (since is None or t["timestamp"] >= since)]
+        return trades[:limit] if limit else trades
+
+
+class PaperExchange(ccxt.Exchange):
+    """
+    ccxt front end of a shared PaperMatchingEngine. The account is the
+    client's uid, which TradingEngine sets to the credential's user id, so
+    the free-text API key of a paper connection does not matter. Registered
+    in TradingEngine as 'paper'.
+    Pairs the engine has no price for yet get a live CoinGecko tick on
+    first use. The engine lives in process memory: balances, orders and
+    fills start over on restart, and each process (web workers, `flask
+    run-scheduler`) has its own. It is therefore meant for load tests and
+    single-process development runs, and only offered in the UI when
+    PAPER_TRADING is enabled.
+    """
+    engine = PaperMatchingEngine()
+
+    def describe(self):
+        return self.deep_extend(super().describe(), {
+            "id": "paper",
+            "name": "Paper Trading",
+            "rateLimit": 1,
+            "has": {"fetchCurrencies": False, "fetchTicker": True, "fetchTickers": True, "fetchBalance": True,
+                    "createOrder": True, "cancelOrder": True, "fetchOrder": True, "fetchOpenOrders": True,
+                    "fetchMyTrades": True},
+        })
+
+    def _account(self) -> str:
+        if not self.uid:
+            raise ccxt.AuthenticationError("paper: the uid names the account")
+        return str(self.uid)
+
+    def _priced(self, symbols: Sequence[str]):
+        """Ticks the engine with live prices of the symbols it has never traded."""
+        missing = [s for s in symbols if s not in self.engine.last]
+        if missing:
+            for _, symbol, price in TickFeed.live(missing):
+                self.engine.tick(symbol, price)
+
+    @staticmethod
+    def _public(order: dict) -> dict:
+        return {k: v for k, v in order.items() if k not in ("account", "reserved", "reserve_price")}
+
+    def fetch_markets(self, params={}):
+        markets = []
+        for symbol in sorted(self.engine.last):
+            base, quote = symbol.split("/")
+            markets.append({
+                "id": base + quote, "symbol": symbol, "base": base, "quote": quote, "baseId": base,
+                "quoteId": quote, "active": True, "type": "spot", "spot": True,
+                "precision": {"amount": 1e-8, "price": 1e-8}, "limits": {},
+                "taker": PaperMatchingEngine.FEE_RATE, "maker": PaperMatchingEngine.FEE_RATE
+            })
+        return markets
+
+    def fetch_ticker(self, symbol, params={}):
+        return self.fetch_tickers([symbol])[symbol]
+
+    def fetch_tickers(self, symbols=None, params={}):
+        engine = self.engine
+        if symbols:
+            self._priced(symbols)
+        with engine._lock:
+            symbols = symbols or list(engine.last)
+            missing = [s for s in symbols if s not in engine.last]
+            if missing:
+                raise ccxt.BadSymbol(f"paper has no price for {missing[0]}")
+            now = engine.now()
+            tickers = {}
+            for s in symbols:
+                book = engine.books.get(s)
+                tickers[s] = {
+                    "symbol": s, "timestamp": now, "datetime": self.iso8601(now), "last": engine.last[s],
+                    "close": engine.last[s], "bid": book.best("buy") if book else None,
+                    "ask": book.best("sell") if book else None
+                }
+        return tickers
+
+    def fetch_balance(self, params={}):
+        balance = {"info": {}, "free": {}, "used": {}, "total": {}}
+        for currency, (free, used) in self.engine.balance(self._account()).items():
+            balance[currency] = {"free": free, "used": used, "total": free + used}
+            balance["free"][currency], balance["used"][currency], balance["total"][currency] = free, used, free + used
+        return balance
+
+    def create_order(self, symbol, type, side, amount, price=None, params={}):
+        self._priced([symbol])
+        return self._public(self.engine.create_order(self._account(), symbol, type, side, amount, price))
+
+    def cancel_order(self, id, symbol=None, params={}):
+        return self._public(self.engine.cancel_order(self._account(), id))
+
+    def fetch_order(self, id, symbol=None, params={}):
+        order = self.engine.orders.get(id)
+        if order is None or order["account"] != self._account():
+            raise ccxt.OrderNotFound(id)
+        return self._public(order)
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params={}):
+        return [self._public(o) for o in self.engine.open_orders(self._account(), symbol)]
+
+    def fetch_my_trades(self, symbol=None, since=None, limit=None, params={}):
+        return self.engine.my_trades(self._account(), symbol, since, limit)
+
+
+class TickFeed:
+    """
+    Price ticks for the paper engine: synthetic random walks for load
+    tests, the stored daily history for replaying past markets, or live
+    CoinGecko prices for paper portfolios.
+    """
+    # Quotes worth one US dollar, and fiat quotes live prices cannot be given in
+    USD_QUOTES = frozenset({'USD', 'USDT', 'USDC', 'BUSD', 'FDUSD', 'TUSD', 'DAI'})
+    OTHER_FIAT = frozenset({'EUR', 'GBP', 'CHF', 'JPY', 'CAD', 'AUD'})
+    # symbol -> CoinGecko id
+    _coin_ids: Dict[str, str] = {}
+
+    @staticmethod
+    def synthetic(symbols: Sequence[str], steps: int, start: float = 100.0, volatility: float = 0.001,
+                  interval_ms: int = 1000, start_ms: int = 0, seed: int = 0) -> List[Tuple[int, str, float]]:
+        """Geometric random walks, one per symbol, interleaved by time."""
+        rng = np.random.default_rng(seed)
+        paths = start * np.exp(np.cumsum(rng.normal(0, volatility, size=(steps, len(symbols))), axis=0))
+        return [(start_ms + i * interval_ms, s, float(paths[i, j]))
+                for i in range(steps) for j, s in enumerate(symbols)]
+
+    @staticmethod
+    def recorded(pairs: Dict[str, str], days: int = 365, today: Optional[date] = None) -> List[Tuple[int, str, float]]:
+        """Daily closes of PriceHistory as ticks; pairs maps 'BTC/USDT' to a CoinGecko id."""
+        from .price_history import PriceHistoryStore
+        symbols = list(pairs)
+        dates, prices = PriceHistoryStore.matrix([pairs[s] for s in symbols], days=days, today=today)
+        ticks = []
+        for i, d in enumerate(dates):
+            ts = int(datetime(d.year, d.month, d.day, tzinfo=timezone.utc).timestamp() * 1000)
+            ticks.extend((ts, s, float(prices[i, j])) for j, s in enumerate(symbols) if np.isfinite(prices[i, j]))
+        return ticks
+
+    @staticmethod
+    def live(symbols: Sequence[str]) -> List[Tuple[int, str, float]]:
+        """
+        Current prices of 'BASE/QUOTE' pairs: the base's USD price over the
+        quote's (stablecoin quotes taken at par). Pairs quoted in another
+        fiat currency, or with an unknown coin, are left out.
+        """
+        from ..utils.api import CoinGeckoAPI
+        pairs = [(s, *s.upper().partition("/")[::2]) for s in symbols]
+        pairs = [(s, base, quote) for s, base, quote in pairs if quote not in TickFeed.OTHER_FIAT]
+        coins = sorted({base for _, base, _ in pairs} | {q for _, _, q in pairs if q not in TickFeed.USD_QUOTES})
+        unknown = [c for c in coins if c not in TickFeed._coin_ids]
+        if unknown:
+            TickFeed._coin_ids.update(CoinGeckoAPI.resolve_symbols(unknown))
+        prices = CoinGeckoAPI.get_prices(sorted({TickFeed._coin_ids[c] for c in coins if c in TickFeed._coin_ids}))
+
+        def usd(symbol: str) -> Optional[float]:
+            if symbol in TickFeed.USD_QUOTES:
+                return 1.0
+            return prices.get(TickFeed._coin_ids.get(symbol))
+
+        now = int(time.time() * 1000)
+        ticks = []
+        for s, base, quote in pairs:
+            base_usd, quote_usd = usd(base), usd(quote)
+            if base_usd and quote_usd:
+                ticks.append((now, s, float(base_usd) / float(quote_usd)))
+        return ticks
@@ -0,0 +1,13 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Sequence
+
+def map_tasks(func: Callable, tasks: Sequence, workers: int = 0) -> List:
+    """
+    [func(task) for task in tasks], spread over a process pool when
+    workers > 0 and there is more than one task. `func` must be a
+    module-level function so the pool can pickle it.
+    """
+    if workers and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            return list(pool.map(func, tasks))
+    return [func(t) for t in tasks]
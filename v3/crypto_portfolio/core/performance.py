@@ -0,0 +1,275 @@
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from ..extensions import db
+from .models import User, Transaction, PortfolioSnapshot
+from .lots import LotBook, BUY_TYPES, SELL_TYPES
+from .price_history import PriceHistoryStore
+from .valuation import PortfolioValuation
+
+DAYS_PER_YEAR = 365.25
+
+class ReturnMetrics:
+    """
+    Money-weighted (XIRR) and time-weighted returns, vectorized over
+    portfolios/holdings.
+    """
+
+    @staticmethod
+    def xirr(amounts: np.ndarray, years: np.ndarray, mask: Optional[np.ndarray] = None,
+             tol: float = 1e-10, max_iter: int = 100) -> np.ndarray:
+        """
+        Annual internal rate of return of each row of a padded (K, M) flow
+        matrix. `years` are flow times in years from the row's first flow;
+        `mask` marks the real flows. Rows whose NPV does not change sign on
+        the search interval get NaN.
+
+        Solves NPV(x) = sum(a * exp(-x t)) = 0 in x = log(1 + r), which is
+        defined for any x, with safeguarded Newton steps: a step that leaves
+        the sign bracket, or would not halve it, is replaced by bisection.
+        Only unconverged rows are evaluated on each iteration.
+        """
+        a = np.atleast_2d(np.asarray(amounts, dtype=float))
+        t = np.atleast_2d(np.asarray(years, dtype=float))
+        if mask is not None:
+            a = np.where(mask, a, 0.0)
+
+        def npv(x, rows):
+            disc = np.exp(-x[:, None] * t[rows])
+            flows = a[rows] * disc
+            return flows.sum(axis=1), -(flows * t[rows]).sum(axis=1)
+
+        everything = np.arange(len(a))
+        lo = np.full(len(a), np.log(1e-4)) # r = -99.99%
+        hi = np.full(len(a), np.log(1e4)) # r = +999900%
+        f_lo, _ = npv(lo, everything)
+        f_hi, _ = npv(hi, everything)
+        valid = np.sign(f_lo) * np.sign(f_hi) < 0
+
+        # Start from the money multiple spread over the cash-weighted duration
+        money_in = np.where(a < 0, -a, 0.0)
+        money_out = np.where(a > 0, a, 0.0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            duration = ((money_out * t).sum(axis=1) / money_out.sum(axis=1)
+                        - (money_in * t).sum(axis=1) / money_in.sum(axis=1))
+            x = np.log(money_out.sum(axis=1) / money_in.sum(axis=1)) / duration
+        x = np.where(np.isfinite(x), np.clip(x, lo + 1e-6, hi - 1e-6), 0.0)
+        width = hi - lo
+
+        active = np.flatnonzero(valid)
+        for _ in range(max_iter):
+            if not active.size:
+                break
+            xa = x[active]
+            f, df = npv(xa, active)
+            # Shrink the bracket around the root
+            same_as_lo = np.sign(f) == np.sign(f_lo[active])
+            lo[active] = np.where(same_as_lo, xa, lo[active])
+            f_lo[active] = np.where(same_as_lo, f, f_lo[active])
+            hi[active] = np.where(same_as_lo, hi[active], xa)
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                step = xa - f / df
+            low, high = np.minimum(lo[active], hi[active]), np.maximum(lo[active], hi[active])
+            slow = np.abs(step - xa) * 2 > width[active]
+            bisect = ~np.isfinite(step) | (step <= low) | (step >= high) | slow
+            x_next = np.where(bisect, (low + high) / 2, step)
+            width[active] = np.abs(x_next - xa)
+            done = (width[active] < tol) | (f == 0)
+            x[active] = np.where(f == 0, xa, x_next)
+            active = active[~done]
+        return np.where(valid, np.expm1(x), np.nan)
+
+    @staticmethod
+    def twr(values: np.ndarray, flows: np.ndarray) -> np.ndarray:
+        """
+        Chain-linked time-weighted return of each column of a (T, N) value
+        matrix, where flows[t] is the net cash added during period t (and
+        already included in values[t]). Periods starting from a zero or
+        missing value are skipped.
+        """
+        v = np.asarray(values, dtype=float).reshape(len(values), -1)
+        f = np.asarray(flows, dtype=float).reshape(len(flows), -1)
+        if len(v) < 2:
+            return np.full(v.shape[1], np.nan)
+        prev = v[:-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = (v[1:] - f[1:]) / prev
+        usable = np.isfinite(growth) & (prev > 0)
+        growth = np.where(usable, growth, 1.0)
+        total = np.prod(growth, axis=0) - 1
+        return np.where(usable.any(axis=0), total, np.nan)
+
+    @staticmethod
+    def annualize(total: np.ndarray, days: np.ndarray) -> np.ndarray:
+        total = np.asarray(total, dtype=float)
+        days = np.asarray(days, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(days > 0, np.power(1 + total, DAYS_PER_YEAR / days) - 1, np.nan)
+
+
+class PerformanceService:
+    """
+    TWR and XIRR for a user's portfolio and each holding, cached until a
+    new transaction arrives (or the day changes).
+    """
+    _cache: Dict[str, tuple] = {}
+
+    @staticmethod
+    def _fingerprint(user_id: str, today: date) -> tuple:
+        row = db.session.query(
+            db.func.count(Transaction.id),
+            db.func.max(Transaction.date),
+            db.func.sum(Transaction.quantity * Transaction.price)
+        ).filter(Transaction.user_id == user_id).one()
+        return (today,) + tuple(row)
+
+    @staticmethod
+    def cash_flows(txns: Sequence[Transaction]) -> List[Tuple[str, date, float, float]]:
+        """(SYMBOL, day, signed quantity, cash put in) for buys and sells."""
+        flows = []
+        for t in txns:
+            kind = (t.type or '').lower()
+            sign = 1.0 if kind in BUY_TYPES else -1.0 if kind in SELL_TYPES else 0.0
+            if sign == 0.0 or t.date is None:
+                continue
+            qty = t.quantity or 0.0
+            flows.append((LotBook.key(t.symbol), t.date.date(), sign * qty, sign * qty * (t.price or 0.0)))
+        return flows
+
+    @staticmethod
+    def _xirr_rows(groups: Dict[str, List[Tuple[date, float]]], terminal: Dict[str, float],
+                   today: date) -> Dict[str, Optional[float]]:
+        """Packs every group's flows into one padded matrix and solves them together."""
+        names = [n for n in groups if groups[n]]
+        if not names:
+            return {}
+        width = max(len(groups[n]) for n in names) + 1
+        amounts = np.zeros((len(names), width))
+        years = np.zeros((len(names), width))
+        mask = np.zeros((len(names), width), dtype=bool)
+        for i, name in enumerate(names):
+            rows = groups[name]
+            start = min(d for d, _ in rows)
+            # Investor's view: money in is negative, today's value comes back out
+            days = [(d - start).days for d, _ in rows] + [(today - start).days]
+            cash = [-c for _, c in rows] + [terminal.get(name, 0.0)]
+            amounts[i, :len(cash)] = cash
+            years[i, :len(days)] = np.array(days) / DAYS_PER_YEAR
+            mask[i, :len(cash)] = True
+        rates = ReturnMetrics.xirr(amounts, years, mask)
+        return {n: (float(r) if np.isfinite(r) else None) for n, r in zip(names, rates)}
+
+    @staticmethod
+    def _portfolio_twr(user_id: str, flows) -> Tuple[Optional[float], int]:
+        snaps = db.session.query(PortfolioSnapshot.date, PortfolioSnapshot.total_value) \
+            .filter(PortfolioSnapshot.user_id == user_id) \
+            .order_by(PortfolioSnapshot.date).all()
+        if len(snaps) < 2:
+            return None, 0
+        days = np.array([s[0].toordinal() for s in snaps])
+        values = np.array([s[1] or 0.0 for s in snaps], dtype=float)
+        cash = np.zeros(len(snaps))
+        if flows:
+            # A flow lands in the first snapshot taken on or after its day
+            idx = np.searchsorted(days, [d.toordinal() for _, d, _, _ in flows])
+            keep = idx < len(days)
+            np.add.at(cash, idx[keep], np.array([c for _, _, _, c in flows])[keep])
+        total = ReturnMetrics.twr(values, cash)[0]
+        return (float(total) if np.isfinite(total) else None), int(days[-1] - days[0])
+
+    @staticmethod
+    def _holdings_twr(flows, coin_ids: Dict[str, str], today: date) -> Dict[str, Tuple[Optional[float], int]]:
+        """
+        Per-symbol TWR from daily prices and the quantity held each day,
+        rebuilt from the transactions.
+        """
+        symbols = sorted(s for s in {f[0] for f in flows} if s in coin_ids)
+        if not symbols:
+            return {}
+        start = min(f[1] for f in flows if f[0] in coin_ids)
+        dates, prices = PriceHistoryStore.matrix([coin_ids[s] for s in symbols],
+                                                 days=(today - start).days + 1, today=today)
+        if len(dates) < 2:
+            return {}
+        ordinals = np.array([d.toordinal() for d in dates])
+        col = {s: j for j, s in enumerate(symbols)}
+        qty_change = np.zeros(prices.shape)
+        cash = np.zeros(prices.shape)
+        for symbol, day, qty, c in flows:
+            j = col.get(symbol)
+            if j is None:
+                continue
+            i = min(np.searchsorted(ordinals, day.toordinal()), len(ordinals) - 1)
+            qty_change[i, j] += qty
+            cash[i, j] += c
+        held = np.cumsum(qty_change, axis=0)
+        values = np.where(np.isfinite(prices), held * prices, np.nan)
+        totals = ReturnMetrics.twr(values, cash)
+        active = held > 0
+        first = np.where(active.any(axis=0), active.argmax(axis=0), len(ordinals) - 1)
+        spans = ordinals[-1] - ordinals[first]
+        return {
+            s: ((float(totals[j]) if np.isfinite(totals[j]) else None), int(spans[j]))
+            for s, j in col.items()
+        }
+
+    @staticmethod
+    def for_user(user: User, prices: Optional[Dict[str, float]] = None, refresh_prices: bool = True,
+                 today: Optional[date] = None) -> dict:
+        """prices: live coin prices already fetched by the caller, if any."""
+        today = today or date.today()
+        key = PerformanceService._fingerprint(user.id, today)
+        cached = PerformanceService._cache.get(user.id)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        txns = user.transactions.order_by(Transaction.date).all()
+        flows = PerformanceService.cash_flows(txns)
+        assets = user.assets.all()
+        valuation = PortfolioValuation.value_assets(assets, prices)
+        values: Dict[str, float] = {}
+        coin_ids: Dict[str, str] = {}
+        for a, v in zip(assets, valuation.value.tolist()):
+            symbol = LotBook.key(a.symbol)
+            values[symbol] = values.get(symbol, 0.0) + v
+            if a.coin_id:
+                coin_ids.setdefault(symbol, a.coin_id)
+        if refresh_prices and coin_ids:
+            PriceHistoryStore.refresh(sorted(set(coin_ids.values())))
+
+        groups: Dict[str, List[Tuple[date, float]]] = {"__portfolio__": []}
+        for symbol, day, _, c in flows:
+            groups.setdefault(symbol, []).append((day, c))
+            groups["__portfolio__"].append((day, c))
+        terminal = dict(values)
+        # Holdings without flows (e.g. synced from balances older than the
+        # lookback) have no known cost, so their value is not a return
+        terminal["__portfolio__"] = sum(v for s, v in values.items() if s in groups)
+        xirr = PerformanceService._xirr_rows(groups, terminal, today)
+
+        twr_total, twr_days = PerformanceService._portfolio_twr(user.id, flows)
+        holding_twr = PerformanceService._holdings_twr(flows, coin_ids, today)
+
+        def entry(rate, total, days):
+            annual = ReturnMetrics.annualize(total, days) if total is not None and days else np.nan
+            return {
+                "xirr": rate,
+                "twr": total,
+                "twr_annualized": float(annual) if np.isfinite(annual) else None,
+                "days": days
+            }
+
+        report = {
+            "portfolio": entry(xirr.get("__portfolio__"), twr_total, twr_days),
+            "holdings": {
+                s: entry(xirr.get(s), *holding_twr.get(s, (None, 0)))
+                for s in sorted(n for n in groups if n != "__portfolio__")
+            }
+        }
+        PerformanceService._cache[user.id] = (key, report)
+        return report
+
+    @staticmethod
+    def invalidate(user_id: str):
+        PerformanceService._cache.pop(user_id, None)
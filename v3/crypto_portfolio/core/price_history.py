@@ -0,0 +1,140 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from ..extensions import db
+from ..utils.api import CoinGeckoAPI
+from .models import PriceHistory
+
+class PriceHistoryStore:
+    """
+    Daily coin prices persisted in the PriceHistory table.
+    CoinGecko is only queried for coins whose stored history is stale.
+    """
+    # Days a stored history may start after the requested window before its head is downloaded again
+    BACKFILL_TOLERANCE = 7
+    # coin_id -> (last day a download was attempted by this process, longest span asked that day)
+    _attempted: Dict[str, Tuple[date, int]] = {}
+
+    @staticmethod
+    def latest_dates(coin_ids: Sequence[str]) -> Dict[str, date]:
+        if not coin_ids:
+            return {}
+        rows = db.session.query(PriceHistory.coin_id, db.func.max(PriceHistory.date)) \
+            .filter(PriceHistory.coin_id.in_(list(coin_ids))) \
+            .group_by(PriceHistory.coin_id).all()
+        return {cid: d for cid, d in rows}
+
+    @staticmethod
+    def ranges(coin_ids: Sequence[str]) -> Dict[str, Tuple[date, date]]:
+        """coin_id -> (first, last) stored day."""
+        if not coin_ids:
+            return {}
+        rows = db.session.query(PriceHistory.coin_id, db.func.min(PriceHistory.date), db.func.max(PriceHistory.date)) \
+            .filter(PriceHistory.coin_id.in_(list(coin_ids))) \
+            .group_by(PriceHistory.coin_id).all()
+        return {cid: (first, last) for cid, first, last in rows}
+
+    @staticmethod
+    def store(coin_id: str, points: Sequence[Tuple[date, float]]) -> int:
+        """
+        Upserts (date, price) points for one coin. Returns the number of new days.
+        """
+        by_day = {}
+        for day, price in points:
+            by_day[day] = price # last point of a day wins (CoinGecko repeats today)
+        if not by_day:
+            return 0
+
+        existing = {
+            row.date: row for row in PriceHistory.query.filter(
+                PriceHistory.coin_id == coin_id,
+                PriceHistory.date.in_(list(by_day))
+            )
+        }
+        added = 0
+        for day, price in by_day.items():
+            if day in existing:
+                existing[day].price = price
+            else:
+                db.session.add(PriceHistory(coin_id=coin_id, date=day, price=price))
+                added += 1
+        return added
+
+    @staticmethod
+    def refresh(coin_ids: Sequence[str], days: int = 365, today: Optional[date] = None) -> List[str]:
+        """
+        Downloads history for coins not updated today, or whose stored
+        history starts after the last `days` days, and commits it.
+        Returns the coin ids that received new data.
+        """
+        today = today or date.today()
+        ranges = PriceHistoryStore.ranges(coin_ids)
+        head = today - timedelta(days=days - PriceHistoryStore.BACKFILL_TOLERANCE)
+        updated = []
+        for coin_id in coin_ids:
+            first, last = ranges.get(coin_id, (None, None))
+            backfill = first is not None and first > head
+            if last is not None and last >= today and not backfill:
+                continue
+            # Only ask for the missing tail when the stored history reaches back far enough
+            span = days if last is None or backfill else max(2, min(days, (today - last).days + 1))
+            attempted = PriceHistoryStore._attempted.get(coin_id)
+            if attempted is not None and attempted[0] == today and attempted[1] >= span:
+                continue
+            PriceHistoryStore._attempted[coin_id] = (today, span)
+            raw = CoinGeckoAPI.get_coin_history(coin_id, days=span)
+            if not raw:
+                continue
+            points = [(datetime.fromtimestamp(ts / 1000, tz=timezone.utc).date(), price) for ts, price in raw]
+            if PriceHistoryStore.store(coin_id, points):
+                updated.append(coin_id)
+        if updated:
+            db.session.commit()
+        return updated
+
+    @staticmethod
+    def matrix(coin_ids: Sequence[str], days: int = 365, today: Optional[date] = None,
+               after: Optional[date] = None, until: Optional[date] = None) -> Tuple[List[date], np.ndarray]:
+        """
+        Returns (dates, prices) where prices is a (T, N) array aligned on the
+        union of stored dates, forward-filled; days before a coin's first
+        price stay NaN. `after` restricts the rows to dates strictly later
+        than it instead of the last `days` days, `until` drops the rows
+        after that date.
+        """
+        coin_ids = list(coin_ids)
+        if not coin_ids:
+            return [], np.empty((0, 0))
+        query = db.session.query(PriceHistory.coin_id, PriceHistory.date, PriceHistory.price) \
+            .filter(PriceHistory.coin_id.in_(coin_ids))
+        if after is not None:
+            query = query.filter(PriceHistory.date > after)
+        else:
+            today = today or date.today()
+            query = query.filter(PriceHistory.date >= today - timedelta(days=days))
+        if until is not None:
+            query = query.filter(PriceHistory.date <= until)
+        rows = query.order_by(PriceHistory.date).all()
+
+        dates = sorted({d for _, d, _ in rows})
+        prices = np.full((len(dates), len(coin_ids)), np.nan)
+        if not rows:
+            return dates, prices
+
+        row_index = {d: i for i, d in enumerate(dates)}
+        col_index = {cid: j for j, cid in enumerate(coin_ids)}
+        r = np.fromiter((row_index[d] for _, d, _ in rows), dtype=np.intp, count=len(rows))
+        c = np.fromiter((col_index[cid] for cid, _, _ in rows), dtype=np.intp, count=len(rows))
+        prices[r, c] = [p for _, _, p in rows]
+        return dates, PriceHistoryStore.forward_fill(prices)
+
+    @staticmethod
+    def forward_fill(prices: np.ndarray) -> np.ndarray:
+        """Carries the last known price down each column."""
+        valid = ~np.isnan(prices)
+        idx = np.where(valid, np.arange(prices.shape[0])[:, None], 0)
+        np.maximum.accumulate(idx, axis=0, out=idx)
+        filled = prices[idx, np.arange(prices.shape[1])]
+        # Leading gaps have no previous value to carry
+        filled[~np.maximum.accumulate(valid, axis=0)] = np.nan
+        return filled
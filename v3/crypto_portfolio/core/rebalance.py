@@ -0,0 +1,350 @@
+from dataclasses import dataclass, asdict, field, replace
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from ..extensions import db
+from .models import User, RebalanceTarget
+from .lots import LotBook
+from .valuation import PortfolioValuation
+
+@dataclass
+class RebalanceOrder:
+    """
+    One market order of a rebalancing plan. to_order() gives the keyword
+    arguments of TradingEngine.place_order.
+    """
+    symbol: str # exchange pair, e.g. 'BTC/USDT'
+    side: str # 'buy' or 'sell'
+    amount: float # base quantity
+    value: float # quote value at the planning price
+    asset_type: str
+
+    def to_order(self) -> dict:
+        return {"symbol": self.symbol, "side": self.side, "amount": self.amount, "price": None}
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class RebalancePlan:
+    """
+    Orders (sells first, so they fund the buys) moving one portfolio to its
+    target weights, with the weights before and after.
+    """
+    orders: List[RebalanceOrder]
+    total_value: float
+    fees: float
+    cash_left: float
+    current_weights: Dict[str, float]
+    target_weights: Dict[str, float]
+    final_weights: Dict[str, float]
+    unmatched_targets: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "orders": [o.to_dict() for o in self.orders],
+            "total_value": self.total_value,
+            "fees": self.fees,
+            "cash_left": self.cash_left,
+            "current_weights": self.current_weights,
+            "target_weights": self.target_weights,
+            "final_weights": self.final_weights,
+            "unmatched_targets": self.unmatched_targets
+        }
+
+
+class RebalancePlanner:
+    """
+    Computes the trades moving holdings to target weights, for many
+    portfolios at once on padded (U, N) matrices.
+    """
+    FEE_RATE = 0.001 # taker fee charged on the traded value
+    MIN_TRADE = 10.0 # quote value below which a trade is not worth placing
+    TOLERANCE = 0.01 # drift, as a fraction of the rebalanced value, left alone
+
+    @staticmethod
+    def resolve_weights(targets: Dict[str, float], classes: Sequence[str], symbols: Sequence[str],
+                        coin_ids: Sequence[Optional[str]], values: Sequence[float]) -> Tuple[np.ndarray, List[str]]:
+        """
+        Per-holding target weights (NaN = not targeted, left untouched) and
+        the target keys matching no holding. As in stress scenarios a coin id
+        beats a symbol, which beats an asset class. A key covering several
+        rows spreads its weight over them in proportion to their value, so
+        their relative sizes are kept.
+        """
+        upper = {k.upper(): k for k in targets}
+        lower = {k.lower(): k for k in targets}
+        keys = [
+            lower.get((c or '').lower()) or upper.get((s or '').upper()) or lower.get((k or '').lower())
+            for c, s, k in zip(coin_ids, symbols, classes)
+        ]
+        values = np.asarray(values, dtype=float)
+        weights = np.full(len(keys), np.nan)
+        for key in set(keys) - {None}:
+            rows = np.array([k == key for k in keys])
+            share = values[rows]
+            share = share / share.sum() if share.sum() > 0 else np.full(len(share), 1 / len(share))
+            weights[rows] = targets[key] * share
+        return weights, sorted(set(targets) - set(keys))
+
+    @staticmethod
+    def solve(values: np.ndarray, weights: np.ndarray, prices: np.ndarray, cash: np.ndarray,
+              max_order: np.ndarray, fee_rate: float = FEE_RATE, min_trade: float = MIN_TRADE,
+              tolerance: float = TOLERANCE, iterations: int = 20) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Signed quote-value trades (U, N), fees (U,) and cash left (U,).
+
+        The targeted holdings plus cash form a pool split by the normalized
+        weights. Fees come out of the pool, so its size after trading is
+        the fixed point of P = pool - fee * sum|w P - v|, reached in a few
+        iterations since the map contracts by fee_rate. Trades under the
+        tolerance are dropped, each is capped at max_order, and buys are
+        scaled down if sells and cash cannot pay for them.
+        """
+        v = np.asarray(values, dtype=float)
+        p = np.asarray(prices, dtype=float)
+        targeted = np.isfinite(weights) & (p > 0)
+        w = np.where(targeted, np.clip(np.nan_to_num(weights), 0, None), 0.0)
+        total = w.sum(axis=1, keepdims=True)
+        w = np.divide(w, total, out=np.zeros_like(w), where=total > 0)
+        held = np.where(targeted, v, 0.0)
+        pool = held.sum(axis=1) + cash
+        pool = np.where(total[:, 0] > 0, pool, 0.0)
+
+        size = pool.copy()
+        for _ in range(iterations):
+            trades = w * size[:, None] - held
+            nxt = np.clip(pool - fee_rate * np.abs(trades).sum(axis=1), 0, None)
+            if np.allclose(nxt, size, rtol=0, atol=1e-9):
+                break
+            size = nxt
+        trades = np.where(targeted, w * size[:, None] - held, 0.0)
+
+        threshold = np.maximum(min_trade, tolerance * pool)[:, None]
+        trades = np.where(np.abs(trades) < threshold, 0.0, trades)
+        cap = np.asarray(max_order, dtype=float)[:, None]
+        trades = np.clip(trades, -cap, cap)
+
+        sells = np.clip(-trades, 0, None).sum(axis=1)
+        buys = np.clip(trades, 0, None).sum(axis=1)
+        budget = cash + sells * (1 - fee_rate)
+        scale = np.divide(budget, buys * (1 + fee_rate), out=np.ones_like(buys), where=buys > 0)
+        trades = np.where(trades > 0, trades * np.clip(scale, 0, 1)[:, None], trades)
+        # Scaling can push small buys back under the threshold
+        trades = np.where((trades > 0) & (trades < min_trade), 0.0, trades)
+
+        fees = fee_rate * np.abs(trades).sum(axis=1)
+        cash_left = cash + sells - np.clip(trades, 0, None).sum(axis=1) - fees
+        return trades, fees, cash_left
+
+    @staticmethod
+    def plan(targets: Dict[str, float], symbols: Sequence[str], classes: Sequence[str],
+             coin_ids: Sequence[Optional[str]], values: Sequence[float], prices: Sequence[float],
+             cash: float = 0.0, max_order: Optional[float] = None, quote: str = 'USDT',
+             **options) -> RebalancePlan:
+        """Single-portfolio convenience wrapper around plan_batch."""
+        return RebalancePlanner.plan_batch([dict(
+            targets=targets, symbols=symbols, classes=classes, coin_ids=coin_ids,
+            values=values, prices=prices, cash=cash, max_order=max_order
+        )], quote=quote, **options)[0]
+
+    @staticmethod
+    def plan_batch(portfolios: Sequence[dict], quote: str = 'USDT', **options) -> List[RebalancePlan]:
+        """
+        portfolios: dicts with targets, symbols, classes, coin_ids, values,
+        prices and optional cash / max_order. All of them are solved in one
+        call on matrices padded to the largest portfolio.
+        """
+        if not portfolios:
+            return []
+        width = max(1, max(len(p["symbols"]) for p in portfolios))
+        shape = (len(portfolios), width)
+        values = np.zeros(shape)
+        prices = np.zeros(shape)
+        weights = np.full(shape, np.nan)
+        cash = np.zeros(len(portfolios))
+        max_order = np.full(len(portfolios), np.inf)
+        unmatched = []
+        for u, p in enumerate(portfolios):
+            n = len(p["symbols"])
+            values[u, :n] = p["values"]
+            prices[u, :n] = p["prices"]
+            w, missing = RebalancePlanner.resolve_weights(p["targets"], p["classes"], p["symbols"],
+                                                          p["coin_ids"], p["values"])
+            weights[u, :n] = w
+            unmatched.append(missing)
+            cash[u] = p.get("cash") or 0.0
+            if p.get("max_order"):
+                max_order[u] = p["max_order"]
+
+        trades, fees, cash_left = RebalancePlanner.solve(values, weights, prices, cash, max_order, **options)
+        final = values + trades
+        normalized = np.where(np.isfinite(weights), np.clip(np.nan_to_num(weights), 0, None), 0.0)
+
+        plans = []
+        for u, p in enumerate(portfolios):
+            n = len(p["symbols"])
+            total = float(values[u, :n].sum() + cash[u])
+            after = float(final[u, :n].sum() + cash_left[u])
+            targeted = np.isfinite(weights[u, :n]) & (prices[u, :n] > 0)
+            target_total = normalized[u, :n][targeted].sum()
+            pool = values[u, :n][targeted].sum() + cash[u]
+            # Rows of the same coin trade as one order
+            netted: Dict[str, list] = {}
+            for i in np.flatnonzero(trades[u, :n]):
+                symbol = p["symbols"][i]
+                pair = symbol if '/' in symbol else f"{LotBook.key(symbol)}/{quote}"
+                row = netted.setdefault(pair, [0.0, 0.0, p["classes"][i]])
+                row[0] += trades[u, i]
+                row[1] += trades[u, i] / prices[u, i]
+            orders = [
+                RebalanceOrder(pair, 'buy' if d > 0 else 'sell', float(abs(q)), float(abs(d)), kind)
+                for pair, (d, q, kind) in sorted(netted.items(), key=lambda item: item[1][0]) # sells first
+                if d != 0
+            ]
+
+            def weights_of(column, denominator):
+                out: Dict[str, float] = {}
+                for s, x in zip(p["symbols"], column.tolist()):
+                    out[s] = out.get(s, 0.0) + (x / denominator if denominator else 0.0)
+                return out
+
+            target_values = np.where(targeted, normalized[u, :n] / (target_total or 1) * pool, values[u, :n])
+            plans.append(RebalancePlan(
+                orders=orders,
+                total_value=total,
+                fees=float(fees[u]),
+                cash_left=float(cash_left[u]),
+                current_weights=weights_of(values[u, :n], total),
+                target_weights=weights_of(target_values, total),
+                final_weights=weights_of(final[u, :n], after),
+                unmatched_targets=unmatched[u]
+            ))
+        return plans
+
+
+class RebalanceService:
+    """
+    Stored target weights and rebalancing plans for users' portfolios.
+    """
+
+    @staticmethod
+    def targets(user_id: str) -> Dict[str, float]:
+        return {t.key: t.weight for t in RebalanceTarget.query.filter_by(user_id=user_id).all()}
+
+    @staticmethod
+    def set_targets(user_id: str, targets: Dict[str, float]) -> Dict[str, float]:
+        """
+        Replaces the user's targets. Weights are relative (normalized over
+        the targeted holdings) and must be >= 0; holdings matching no key
+        are never traded.
+        """
+        cleaned = {str(k).strip(): float(v) for k, v in targets.items() if str(k).strip()}
+        if any(v < 0 for v in cleaned.values()):
+            raise ValueError("Weights cannot be negative")
+        if cleaned and sum(cleaned.values()) <= 0:
+            raise ValueError("At least one weight must be positive")
+        RebalanceTarget.query.filter_by(user_id=user_id).delete()
+        for key, weight in cleaned.items():
+            db.session.add(RebalanceTarget(user_id=user_id, key=key, weight=weight))
+        db.session.commit()
+        return cleaned
+
+    @staticmethod
+    def _portfolio(user: User, targets: Dict[str, float], prices: Dict[str, float]) -> dict:
+        assets = user.assets.all()
+        valuation = PortfolioValuation.value_assets(assets, prices)
+        settings = user.auto_trade_settings
+        return dict(
+            targets=targets,
+            symbols=[a.symbol or '' for a in assets],
+            classes=[a.asset_type or 'other' for a in assets],
+            coin_ids=[a.coin_id for a in assets],
+            values=valuation.value,
+            prices=valuation.current_price,
+            max_order=settings.max_position_size if settings else None
+        )
+
+    @staticmethod
+    def plan_users(users: Sequence[User], targets: Optional[Dict[str, Dict[str, float]]] = None,
+                   prices: Optional[Dict[str, float]] = None, **options) -> Dict[str, RebalancePlan]:
+        """
+        user_id -> plan for every user with targets (stored ones unless
+        given), with one price request and one solve for all of them.
+        """
+        if targets is None:
+            targets = {}
+            for t in RebalanceTarget.query.filter(RebalanceTarget.user_id.in_([u.id for u in users])).all():
+                targets.setdefault(t.user_id, {})[t.key] = t.weight
+        users = [u for u in users if targets.get(u.id)]
+        if prices is None:
+            prices = PortfolioValuation.fetch_prices([a for u in users for a in u.assets.all()])
+        portfolios = [RebalanceService._portfolio(u, targets[u.id], prices) for u in users]
+        return dict(zip((u.id for u in users), RebalancePlanner.plan_batch(portfolios, **options)))
+
+    @staticmethod
+    def plan_for_user(user: User, targets: Optional[Dict[str, float]] = None, **options) -> Optional[RebalancePlan]:
+        targets = targets if targets is not None else RebalanceService.targets(user.id)
+        return RebalanceService.plan_users([user], {user.id: targets}, **options).get(user.id)
+
+    @staticmethod
+    def exchange_orders(plan: RebalancePlan, min_trade: float = RebalancePlanner.MIN_TRADE) -> List[RebalanceOrder]:
+        """
+        The crypto orders of a plan, with buys scaled down to what the crypto
+        sells (and the plan's starting cash) pay for: sells of other asset
+        types cannot go through the exchange, so they fund nothing. Buys
+        falling under min_trade are dropped.
+        """
+        crypto = [o for o in plan.orders if o.asset_type == 'crypto']
+        traded = sum(o.value for o in plan.orders)
+        fee_rate = plan.fees / traded if traded else 0.0
+        sold = sum(o.value for o in plan.orders if o.side == 'sell')
+        bought = sum(o.value for o in plan.orders if o.side == 'buy')
+        cash = max(plan.cash_left - sold + bought + plan.fees, 0.0)
+        budget = cash + sum(o.value for o in crypto if o.side == 'sell') * (1 - fee_rate)
+        needed = sum(o.value for o in crypto if o.side == 'buy') * (1 + fee_rate)
+        if needed <= budget + 1e-9:
+            return crypto
+        scale = budget / needed
+        scaled = [o if o.side == 'sell' else replace(o, amount=o.amount * scale, value=o.value * scale) for o in crypto]
+        return [o for o in scaled if o.side == 'sell' or o.value >= min_trade]
+
+    @staticmethod
+    def execute(user: User, plan: RebalancePlan) -> List[dict]:
+        """
+        Places the crypto orders of a plan: all sells concurrently, then all
+        buys, scaled by exchange_orders. Other asset types cannot go through
+        an exchange, buys left unfunded are dropped, and buys are not
+        attempted once a sell funding them has failed; all are reported as
+        skipped.
+        """
+        from .order_pipeline import OrderPipeline
+        crypto = RebalanceService.exchange_orders(plan)
+        placeable = {(o.symbol, o.side): o for o in crypto}
+        phases = [[o for o in crypto if o.side == 'sell'], [o for o in crypto if o.side == 'buy']]
+        outcome = {}
+        if crypto:
+            try:
+                done = OrderPipeline.execute(user, [[o.to_order() for o in phase] for phase in phases])
+                for phase, results in zip(phases, done):
+                    outcome.update({id(o): r for o, r in zip(phase, results)})
+            except Exception as e:
+                print(f"Rebalance failed: {e}")
+                outcome = {id(o): {"status": "failed", "error": str(e)} for o in crypto}
+
+        results = []
+        for planned in plan.orders:
+            order = placeable.get((planned.symbol, planned.side), planned)
+            r = outcome.get(id(order))
+            if r is None:
+                results.append({"order": order.to_dict(), "status": "skipped"})
+            elif isinstance(r, dict):
+                results.append({"order": order.to_dict(), **r})
+            else:
+                entry = {"order": order.to_dict(), "status": r.status}
+                if r.status in ("placed", "pending"):
+                    entry.update(id=r.order_id, latency=r.latency)
+                elif r.status == "failed":
+                    entry.update(error=r.error, latency=r.latency)
+                results.append(entry)
+        return results
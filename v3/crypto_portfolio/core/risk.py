@@ -0,0 +1,196 @@
+import warnings
+from statistics import NormalDist
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from ..extensions import db
+from .models import User, PortfolioSnapshot
+from .price_history import PriceHistoryStore
+
+class RiskMetrics:
+    """
+    Vectorized risk statistics. Every function takes a (T,) or (T, N) array
+    and works column by column, ignoring NaN gaps.
+    """
+
+    PERIODS_PER_YEAR = 365 # crypto trades every day
+
+    @staticmethod
+    def returns(values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = values[1:] / values[:-1] - 1
+        r[~np.isfinite(r)] = np.nan
+        return r
+
+    @staticmethod
+    def volatility(returns: np.ndarray, periods: int = PERIODS_PER_YEAR) -> np.ndarray:
+        return np.nanstd(returns, axis=0, ddof=1) * np.sqrt(periods)
+
+    @staticmethod
+    def rolling_volatility(returns: np.ndarray, window: int = 30, periods: int = PERIODS_PER_YEAR) -> np.ndarray:
+        """
+        Annualized volatility over a trailing window, in O(T) via running sums.
+        Rows with fewer than two observations in the window are NaN.
+        """
+        r = np.asarray(returns, dtype=float)
+        mask = ~np.isnan(r)
+        r0 = np.where(mask, r, 0.0)
+        zero = np.zeros((1,) + r.shape[1:])
+        s1 = np.concatenate([zero, np.cumsum(r0, axis=0)])
+        s2 = np.concatenate([zero, np.cumsum(r0 * r0, axis=0)])
+        cn = np.concatenate([zero, np.cumsum(mask, axis=0)])
+
+        lo = np.maximum(np.arange(1, len(r) + 1) - window, 0)
+        hi = np.arange(1, len(r) + 1)
+        n = cn[hi] - cn[lo]
+        w1 = s1[hi] - s1[lo]
+        w2 = s2[hi] - s2[lo]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            var = (w2 - w1 * w1 / n) / (n - 1)
+        var[n < 2] = np.nan
+        return np.sqrt(np.clip(var, 0, None)) * np.sqrt(periods)
+
+    @staticmethod
+    def historical_var(returns: np.ndarray, level: float = 0.95):
+        """
+        Historical VaR and CVaR as positive loss fractions: (var, cvar).
+        """
+        r = np.asarray(returns, dtype=float)
+        q = np.nanquantile(r, 1 - level, axis=0)
+        tail = np.where(r <= q, r, np.nan)
+        with np.errstate(invalid='ignore'):
+            cvar = -np.nanmean(tail, axis=0)
+        return -q, cvar
+
+    @staticmethod
+    def parametric_var(returns: np.ndarray, level: float = 0.95):
+        """
+        Gaussian VaR and CVaR as positive loss fractions: (var, cvar).
+        """
+        mu = np.nanmean(returns, axis=0)
+        sigma = np.nanstd(returns, axis=0, ddof=1)
+        alpha = 1 - level
+        z = NormalDist().inv_cdf(alpha)
+        var = -(mu + z * sigma)
+        cvar = -(mu - sigma * NormalDist().pdf(z) / alpha)
+        return var, cvar
+
+    @staticmethod
+    def max_drawdown(values: np.ndarray) -> np.ndarray:
+        """Largest peak-to-trough fall, as a positive fraction."""
+        values = np.asarray(values, dtype=float)
+        peaks = np.fmax.accumulate(values, axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drawdown = values / peaks - 1
+        return -np.nanmin(np.where(np.isfinite(drawdown), drawdown, np.nan), axis=0)
+
+    @staticmethod
+    def sharpe(returns: np.ndarray, risk_free: float = 0.0, periods: int = PERIODS_PER_YEAR) -> np.ndarray:
+        excess = returns - risk_free / periods
+        sd = np.nanstd(excess, axis=0, ddof=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.nanmean(excess, axis=0) / sd * np.sqrt(periods)
+
+    @staticmethod
+    def sortino(returns: np.ndarray, risk_free: float = 0.0, periods: int = PERIODS_PER_YEAR) -> np.ndarray:
+        excess = returns - risk_free / periods
+        downside = np.where(np.isnan(excess), np.nan, np.minimum(excess, 0))
+        dd = np.sqrt(np.nanmean(downside * downside, axis=0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.nanmean(excess, axis=0) / dd * np.sqrt(periods)
+
+    @staticmethod
+    def summary(values: np.ndarray, labels: Sequence[str], level: float = 0.95, window: int = 30,
+                risk_free: float = 0.0) -> Dict[str, dict]:
+        """
+        All metrics for each column of a (T, N) value/price matrix.
+        """
+        values = np.asarray(values, dtype=float)
+        if values.shape[0] < 3:
+            return {}
+        values = values.reshape(len(values), -1)
+        r = RiskMetrics.returns(values)
+        # All-NaN columns (coins without history) warn in the nan* reductions
+        with np.errstate(all='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            metrics = {
+                "volatility": RiskMetrics.volatility(r),
+                "rolling_volatility": RiskMetrics.rolling_volatility(r, window)[-1],
+                "var_historical": RiskMetrics.historical_var(r, level)[0],
+                "cvar_historical": RiskMetrics.historical_var(r, level)[1],
+                "var_parametric": RiskMetrics.parametric_var(r, level)[0],
+                "cvar_parametric": RiskMetrics.parametric_var(r, level)[1],
+                "max_drawdown": RiskMetrics.max_drawdown(values),
+                "sharpe": RiskMetrics.sharpe(r, risk_free),
+                "sortino": RiskMetrics.sortino(r, risk_free),
+            }
+        observations = np.sum(~np.isnan(r), axis=0)
+        result = {}
+        for j, label in enumerate(labels):
+            if observations[j] < 2:
+                continue
+            row = {k: RiskMetrics._clean(v[j]) for k, v in metrics.items()}
+            row["observations"] = int(observations[j])
+            result[label] = row
+        return result
+
+    @staticmethod
+    def _clean(x) -> Optional[float]:
+        x = float(x)
+        return x if np.isfinite(x) else None
+
+
+class RiskService:
+    """
+    Per-user risk report, cached until a new snapshot, new prices or a
+    holdings change alter its inputs.
+    """
+    HISTORY_DAYS = 365
+    _cache: Dict[str, tuple] = {}
+
+    @staticmethod
+    def _holdings(user: User) -> Dict[str, str]:
+        """coin_id -> symbol for the user's priced holdings."""
+        return {a.coin_id: a.symbol for a in user.assets if a.coin_id}
+
+    @staticmethod
+    def _fingerprint(user: User, coin_ids: List[str]) -> tuple:
+        # The sum catches intraday updates of today's snapshot
+        snap = db.session.query(
+            db.func.max(PortfolioSnapshot.date),
+            db.func.count(PortfolioSnapshot.id),
+            db.func.sum(PortfolioSnapshot.total_value)
+        ).filter(PortfolioSnapshot.user_id == user.id).one()
+        latest = PriceHistoryStore.latest_dates(coin_ids)
+        return tuple(snap) + (tuple(sorted(coin_ids)), tuple(sorted(latest.items())))
+
+    @staticmethod
+    def for_user(user: User, refresh_prices: bool = True) -> dict:
+        holdings = RiskService._holdings(user)
+        coin_ids = sorted(holdings)
+        if refresh_prices and coin_ids:
+            PriceHistoryStore.refresh(coin_ids, days=RiskService.HISTORY_DAYS)
+
+        key = RiskService._fingerprint(user, coin_ids)
+        cached = RiskService._cache.get(user.id)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        snapshots = db.session.query(PortfolioSnapshot.total_value) \
+            .filter(PortfolioSnapshot.user_id == user.id) \
+            .order_by(PortfolioSnapshot.date).all()
+        portfolio_values = np.array([s[0] for s in snapshots], dtype=float)
+        report = {
+            "portfolio": RiskMetrics.summary(portfolio_values, ["portfolio"]).get("portfolio"),
+            "holdings": {}
+        }
+        if coin_ids:
+            _, prices = PriceHistoryStore.matrix(coin_ids, RiskService.HISTORY_DAYS)
+            report["holdings"] = RiskMetrics.summary(prices, [holdings[c] for c in coin_ids])
+
+        RiskService._cache[user.id] = (key, report)
+        return report
+
+    @staticmethod
+    def invalidate(user_id: str):
+        RiskService._cache.pop(user_id, None)
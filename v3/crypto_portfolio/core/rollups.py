@@ -0,0 +1,137 @@
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from ..extensions import db
+from .models import PortfolioSnapshot, PortfolioRollup
+
+class SnapshotRollup:
+    """
+    Keeps daily, weekly and monthly open/close/min/max aggregates of
+    PortfolioSnapshot values so that long chart ranges read few rows.
+    """
+
+    PERIODS = ('day', 'week', 'month')
+
+    # range key -> (days of history, bucket period). None means no lower bound.
+    RANGES = {
+        '1M': (31, 'day'),
+        '3M': (92, 'day'),
+        '6M': (183, 'week'),
+        '1Y': (366, 'week'),
+        '5Y': (1827, 'month'),
+        'ALL': (None, 'month'),
+    }
+
+    @staticmethod
+    def bucket_start(day: date, period: str) -> date:
+        """
+        Returns the first day of the bucket containing `day`.
+        Weeks start on Monday.
+        """
+        if period == 'day':
+            return day
+        if period == 'week':
+            return day - timedelta(days=day.weekday())
+        if period == 'month':
+            return day.replace(day=1)
+        raise ValueError(f"Unknown rollup period {period}")
+
+    @staticmethod
+    def _apply(bucket: PortfolioRollup, day: date, value: float):
+        if day < bucket.first_date:
+            bucket.first_date = day
+            bucket.open_value = value
+        if day >= bucket.last_date:
+            bucket.last_date = day
+            bucket.close_value = value
+        bucket.min_value = min(bucket.min_value, value)
+        bucket.max_value = max(bucket.max_value, value)
+
+    @staticmethod
+    def record_many(user_id: str, points: Iterable[Tuple[date, float]]):
+        """
+        Folds (date, value) snapshot points into the user's rollup buckets.
+        Rows are added to the session; the caller commits.
+        """
+        cache: Dict[Tuple[str, date], PortfolioRollup] = {}
+        for day, value in points:
+            if value is None:
+                continue
+            for period in SnapshotRollup.PERIODS:
+                start = SnapshotRollup.bucket_start(day, period)
+                bucket = cache.get((period, start))
+                if bucket is None:
+                    bucket = PortfolioRollup.query.filter_by(
+                        user_id=user_id, period=period, bucket_start=start
+                    ).first()
+                if bucket is None:
+                    bucket = PortfolioRollup(
+                        user_id=user_id,
+                        period=period,
+                        bucket_start=start,
+                        open_value=value,
+                        close_value=value,
+                        min_value=value,
+                        max_value=value,
+                        first_date=day,
+                        last_date=day
+                    )
+                    db.session.add(bucket)
+                else:
+                    SnapshotRollup._apply(bucket, day, value)
+                cache[(period, start)] = bucket
+
+    @staticmethod
+    def record(user_id: str, day: date, value: float):
+        """
+        Updates the day/week/month buckets for a single snapshot.
+        """
+        SnapshotRollup.record_many(user_id, [(day, value)])
+
+    @staticmethod
+    def rebuild(user_id: str):
+        """
+        Recomputes every bucket of a user from the raw snapshots.
+        Used for histories recorded before rollups existed.
+        """
+        PortfolioRollup.query.filter_by(user_id=user_id).delete()
+        rows = db.session.query(PortfolioSnapshot.date, PortfolioSnapshot.total_value) \
+            .filter(PortfolioSnapshot.user_id == user_id) \
+            .order_by(PortfolioSnapshot.date).all()
+        SnapshotRollup.record_many(user_id, rows)
+
+    @staticmethod
+    def ensure(user_id: str) -> bool:
+        """
+        Rebuilds the user's buckets when snapshots older than the first
+        rolled-up day exist, e.g. a history recorded before rollups whose
+        owner already had today's bucket recorded. Returns True if rebuilt.
+        """
+        first_snapshot = db.session.query(db.func.min(PortfolioSnapshot.date)) \
+            .filter(PortfolioSnapshot.user_id == user_id).scalar()
+        if first_snapshot is None:
+            return False
+        first_rolled = db.session.query(db.func.min(PortfolioRollup.first_date)) \
+            .filter(PortfolioRollup.user_id == user_id, PortfolioRollup.period == 'day').scalar()
+        if first_rolled is not None and first_rolled <= first_snapshot:
+            return False
+        SnapshotRollup.rebuild(user_id)
+        db.session.commit()
+        return True
+
+    @staticmethod
+    def series(user_id: str, range_key: str = '1M', today: Optional[date] = None) -> List[PortfolioRollup]:
+        """
+        Returns the buckets covering `range_key`, oldest first.
+        """
+        if range_key not in SnapshotRollup.RANGES:
+            raise ValueError(f"Unknown range {range_key}")
+        days, period = SnapshotRollup.RANGES[range_key]
+
+        SnapshotRollup.ensure(user_id)
+
+        query = PortfolioRollup.query.filter_by(user_id=user_id, period=period)
+        if days is not None:
+            today = today or date.today()
+            start = SnapshotRollup.bucket_start(today - timedelta(days=days), period)
+            query = query.filter(PortfolioRollup.bucket_start >= start)
+        return query.order_by(PortfolioRollup.bucket_start).all()
@@ -0,0 +1,165 @@
+import itertools
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from .valuation import PortfolioValuation
+
+@dataclass
+class Scenario:
+    """
+    Percentage shocks keyed by asset class ('crypto', 'stock', ...), coin
+    symbol ('BTC') or CoinGecko id ('bitcoin'). A symbol or coin shock
+    overrides the shock of its class; unlisted holdings are unchanged.
+    """
+    name: str
+    shocks: Dict[str, float]
+    description: str = ""
+
+    @staticmethod
+    def level(pct) -> float:
+        """A shock in percent, checked: a holding can lose at most all of its value."""
+        pct = float(pct)
+        if not math.isfinite(pct) or pct < -100:
+            raise ValueError("A shock must be a number of at least -100%")
+        return pct
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Scenario':
+        shocks = {str(k): Scenario.level(v) for k, v in (data.get("shocks") or {}).items()}
+        return cls(name=str(data.get("name") or "custom"), shocks=shocks, description=data.get("description", ""))
+
+
+# Approximate peak-to-trough moves of past crashes, in percent
+HISTORICAL_SCENARIOS = [
+    Scenario("black_monday_1987", {"stock": -22.6, "etf": -22.6},
+             "Krach du 19 octobre 1987 (Dow Jones sur une séance)"),
+    Scenario("dotcom_2000", {"stock": -49.0, "etf": -49.0, "bond": 8.0},
+             "Bulle internet 2000-2002 (S&P 500)"),
+    Scenario("gfc_2008", {"stock": -57.0, "etf": -57.0, "real_estate": -68.0, "commodity": -55.0, "bond": 5.0},
+             "Crise financière 2007-2009"),
+    Scenario("crypto_winter_2018", {"crypto": -84.0, "ETH": -94.0, "stock": -20.0, "etf": -20.0},
+             "Hiver crypto 2018 (BTC -84%)"),
+    Scenario("covid_2020", {"crypto": -50.0, "ETH": -60.0, "stock": -34.0, "etf": -34.0,
+                            "real_estate": -42.0, "commodity": -12.0},
+             "Krach COVID-19, février-mars 2020"),
+    Scenario("terra_luna_2022", {"crypto": -35.0, "LUNA": -99.9, "UST": -99.0},
+             "Effondrement de Terra/LUNA, mai 2022"),
+    Scenario("ftx_2022", {"crypto": -25.0, "SOL": -60.0, "FTT": -94.0},
+             "Faillite de FTX, novembre 2022"),
+    Scenario("crypto_bear_2022", {"crypto": -75.0, "BTC": -77.0, "ETH": -80.0, "stock": -25.0, "etf": -25.0,
+                                  "bond": -17.0},
+             "Marché baissier 2022 (novembre 2021 - novembre 2022)"),
+]
+
+
+@dataclass
+class StressResult:
+    """
+    Stressed values of S scenarios over N holdings.
+    """
+    scenarios: List[Scenario]
+    labels: List[str]
+    base_values: np.ndarray # (N,)
+    stressed_values: np.ndarray # (S, N)
+    totals: np.ndarray = field(init=False)
+
+    def __post_init__(self):
+        self.totals = self.stressed_values.sum(axis=1)
+
+    @property
+    def base_total(self) -> float:
+        return float(self.base_values.sum())
+
+    def to_dict(self, include_holdings: bool = False) -> dict:
+        base = self.base_total
+        pnl = self.totals - base
+        pnl_pct = pnl / base * 100 if base else np.zeros_like(pnl)
+        rows = []
+        for i, s in enumerate(self.scenarios):
+            row = {
+                "name": s.name,
+                "description": s.description,
+                "shocks": s.shocks,
+                "stressed_value": float(self.totals[i]),
+                "pnl": float(pnl[i]),
+                "pnl_percent": float(pnl_pct[i])
+            }
+            if include_holdings:
+                row["holdings"] = dict(zip(self.labels, self.stressed_values[i].tolist()))
+            rows.append(row)
+        return {"base_value": base, "scenarios": rows}
+
+
+class ScenarioEngine:
+    """
+    Applies many scenarios to a set of holdings with one broadcasted product.
+    """
+    MAX_SCENARIOS = 10000 # per request
+
+    @staticmethod
+    def shock_matrix(scenarios: Sequence[Scenario], classes: Sequence[str], symbols: Sequence[str],
+                     coin_ids: Sequence[Optional[str]]) -> np.ndarray:
+        """
+        (S, N) fractional shocks. Shocks are laid out as an (S, K) table
+        over the distinct keys, then gathered for each holding by its
+        class/symbol/coin codes, so per-scenario work never loops over holdings.
+        """
+        class_codes, class_labels = PortfolioValuation.factorize(c.lower() for c in classes)
+        symbol_codes, symbol_labels = PortfolioValuation.factorize(s.upper() for s in symbols)
+        coin_codes, coin_labels = PortfolioValuation.factorize((c or '').lower() for c in coin_ids)
+
+        def table(labels, normalize):
+            index = {label: j for j, label in enumerate(labels)}
+            t = np.full((len(scenarios), len(labels)), np.nan)
+            for i, s in enumerate(scenarios):
+                for key, pct in s.shocks.items():
+                    j = index.get(normalize(key))
+                    if j is not None:
+                        t[i, j] = pct / 100
+            return t
+
+        by_class = table(class_labels, str.lower)[:, class_codes]
+        by_symbol = table(symbol_labels, str.upper)[:, symbol_codes]
+        by_coin = table(coin_labels, str.lower)[:, coin_codes]
+        shocks = np.where(np.isnan(by_coin), by_symbol, by_coin)
+        shocks = np.where(np.isnan(shocks), by_class, shocks)
+        return np.nan_to_num(shocks, nan=0.0)
+
+    @staticmethod
+    def run(scenarios: Sequence[Scenario], values: Sequence[float], classes: Sequence[str],
+            symbols: Sequence[str], coin_ids: Sequence[Optional[str]]) -> StressResult:
+        values = np.asarray(values, dtype=float)
+        shocks = ScenarioEngine.shock_matrix(scenarios, classes, symbols, coin_ids)
+        stressed = values[None, :] * (1 + shocks)
+        return StressResult(list(scenarios), list(symbols), values, stressed)
+
+    @staticmethod
+    def run_assets(scenarios: Sequence[Scenario], assets: Sequence, prices: Optional[dict] = None) -> StressResult:
+        """Stresses Asset rows (ORM or dataclass) at their current market value."""
+        valuation = PortfolioValuation.value_assets(assets, prices)
+        return ScenarioEngine.run(
+            scenarios,
+            valuation.value,
+            [a.asset_type or 'other' for a in assets],
+            [a.symbol or '' for a in assets],
+            [a.coin_id for a in assets]
+        )
+
+    @staticmethod
+    def grid(axes: Dict[str, Sequence[float]], prefix: str = "grid",
+             limit: Optional[int] = MAX_SCENARIOS) -> List[Scenario]:
+        """
+        Every combination of the given shock levels, e.g.
+        {"crypto": range(-90, 1, 10), "stock": range(-50, 1, 10)} -> 60 scenarios.
+        Raises ValueError, before building anything, past `limit` scenarios.
+        """
+        keys = list(axes)
+        levels = [[Scenario.level(v) for v in axes[k]] for k in keys]
+        size = math.prod(len(axis) for axis in levels)
+        if limit is not None and size > limit:
+            raise ValueError(f"{size} grid scenarios (max {limit})")
+        return [
+            Scenario(f"{prefix}:" + ",".join(f"{k}{v:+g}" for k, v in zip(keys, combo)), dict(zip(keys, combo)))
+            for combo in itertools.product(*levels)
+        ]
@@ -0,0 +1,83 @@
+from typing import Dict, List, Optional, Sequence
+from sqlalchemy import update
+from ..extensions import db, socketio
+from ..utils.api import CoinGeckoAPI
+from .models import Asset, Simulation
+
+class SimulationPricing:
+    """
+    Reprices simulations in bulk: one symbol lookup, one price request and
+    one UPDATE statement however many simulations there are.
+    """
+    # SYMBOL -> CoinGecko id, shared by every request of this process
+    _coin_ids: Dict[str, str] = {}
+
+    @staticmethod
+    def resolve(symbols: Sequence[str]) -> Dict[str, str]:
+        """
+        SYMBOL -> coin id. Uses the process cache, then the coin ids already
+        stored on assets, and only asks CoinGecko for what is left.
+        """
+        wanted = {s.upper() for s in symbols if s}
+        missing = wanted - SimulationPricing._coin_ids.keys()
+        if missing:
+            rows = db.session.query(db.func.upper(Asset.symbol), Asset.coin_id) \
+                .filter(db.func.upper(Asset.symbol).in_(missing), Asset.coin_id != None) \
+                .distinct().all()
+            for symbol, coin_id in rows:
+                SimulationPricing._coin_ids.setdefault(symbol, coin_id)
+            missing -= SimulationPricing._coin_ids.keys()
+        if missing:
+            SimulationPricing._coin_ids.update(CoinGeckoAPI.resolve_symbols(sorted(missing)))
+        return {s: SimulationPricing._coin_ids[s] for s in wanted if s in SimulationPricing._coin_ids}
+
+    @staticmethod
+    def reprice(simulations: Sequence[Simulation]) -> List[dict]:
+        """
+        Updates the price, value and P/L of the crypto simulations that got a
+        live price and commits. Returns the updated rows.
+        """
+        crypto = [s for s in simulations if s.asset_type == 'crypto' and s.symbol]
+        coin_ids = SimulationPricing.resolve([s.symbol for s in crypto])
+        prices = CoinGeckoAPI.get_prices(sorted(set(coin_ids.values())))
+
+        rows = []
+        for sim in crypto:
+            price = prices.get(coin_ids.get(sim.symbol.upper()))
+            if price is None:
+                continue
+            value = (sim.quantity or 0.0) * price
+            rows.append({
+                "id": sim.id,
+                "user_id": sim.user_id,
+                "current_price": price,
+                "current_value": value,
+                "profit_loss": value - (sim.investment or 0.0)
+            })
+        if rows:
+            db.session.execute(update(Simulation), [
+                {k: v for k, v in row.items() if k != "user_id"} for row in rows
+            ])
+            db.session.commit()
+        return rows
+
+    @staticmethod
+    def publish(rows: Sequence[dict]):
+        """Pushes each user's repriced simulations to their Socket.IO room."""
+        by_user: Dict[str, list] = {}
+        for row in rows:
+            by_user.setdefault(row["user_id"], []).append(
+                {k: v for k, v in row.items() if k != "user_id"}
+            )
+        for user_id, updates in by_user.items():
+            socketio.emit('simulations_update', updates, to=user_id)
+
+    @staticmethod
+    def reprice_all(user_id: Optional[str] = None) -> List[dict]:
+        """Reprices every simulation (or one user's) and publishes the results."""
+        query = Simulation.query
+        if user_id is not None:
+            query = query.filter_by(user_id=user_id)
+        rows = SimulationPricing.reprice(query.all())
+        SimulationPricing.publish(rows)
+        return rows
@@ -0,0 +1,44 @@
+import threading
+from typing import Callable, Dict, Hashable, Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from ..extensions import db
+
+class TableCache:
+    """
+    In-memory copy of a small table written by a nightly job, keyed for
+    lookups. It is reloaded when the table's row count or newest `stamp_column`
+    value changes; that check runs once per session transaction, so a batch
+    of lookups in one request costs one query.
+    """
+
+    def __init__(self, model, key: Callable, stamp_column):
+        self.model = model
+        self.key = key
+        self.stamp_column = stamp_column
+        self._rows: Dict[Hashable, dict] = {}
+        self._stamp: Optional[tuple] = None
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[dict]:
+        checked = db.session.info.setdefault('table_caches', set())
+        if self not in checked:
+            stamp = tuple(db.session.query(db.func.count(self.model.id), db.func.max(self.stamp_column)).one())
+            with self._lock:
+                if stamp != self._stamp:
+                    self._rows = {self.key(r): r.to_dict() for r in self.model.query.all()}
+                    self._stamp = stamp
+            checked.add(self)
+        return self._rows.get(key)
+
+    def clear(self):
+        """Forces a reload on the next lookup, e.g. after this process rewrote the table."""
+        with self._lock:
+            self._stamp = None
+        db.session.info.get('table_caches', set()).discard(self)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _recheck_next_transaction(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('table_caches', None)
@@ -1,75 +1,226 @@
 import ccxt
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Optional, Dict, List
+from flask import current_app
 from .models import ExchangeCredential, User, Transaction, AutoTradeSettings
 from ..utils.security import SecurityManager
-from ..extensions import db
+from ..extensions import db, socketio
+from .lots import LotService
+from .paper_exchange import PaperExchange
 from datetime import datetime
 
+class PooledClient:
+    """
+    Exchange client shared through the pool by every thread trading or
+    syncing the same credential. ccxt clients keep per-instance state
+    (nonce, throttle queue, markets), so method calls go through one lock
+    per client; plain attributes are read straight from it.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.RLock()
+
+    def __getattr__(self, name):
+        value = getattr(self.client, name)
+        if not callable(value):
+            return value
+
+        @functools.wraps(value)
+        def locked(*args, **kwargs):
+            with self.lock:
+                return value(*args, **kwargs)
+        return locked
+
+
 class TradingEngine:
     """
     Handles interactions with CCXT exchanges.
+    Authenticated clients are pooled per credential, and loaded markets are
+    shared per exchange, so orders skip key decryption and load_markets.
+    Pooled clients are PooledClient wrappers, safe to share across threads.
     """
-    
+    CLIENT_TTL = 3600 # seconds before a pooled client is rebuilt
+    MARKETS_TTL = 900 # seconds before an exchange's markets are reloaded
+    POOL_SIZE = 256
+    VERIFY_WORKERS = 4 # threads checking newly connected keys
+    # exchange_id -> class, for venues that are not part of ccxt
+    CUSTOM_EXCHANGES: Dict[str, type] = {'paper': PaperExchange}
+    # credential id -> {"client", "fingerprint", "created_at"}, least recently used first
+    _clients: "OrderedDict[str, dict]" = OrderedDict()
+    # exchange_id -> (loaded_at, markets, currencies)
+    _markets: Dict[str, tuple] = {}
+    _lock = threading.Lock()
+    _verifier: Optional[ThreadPoolExecutor] = None
+
+    @staticmethod
+    def register_exchange(exchange_id: str, exchange_class: type):
+        TradingEngine.CUSTOM_EXCHANGES[exchange_id.lower()] = exchange_class
+
     @staticmethod
-    def get_exchange_client(credential: ExchangeCredential):
+    def build_client(credential: ExchangeCredential):
         """
-        Factory to return an authenticated ccxt exchange instance.
+        Factory to return a new authenticated ccxt exchange instance.
         """
         eid = credential.exchange_id.lower()
-        if eid not in ccxt.exchanges:
-            raise ValueError(f"Exchange {eid} not supported by CCXT")
-            
-        exchange_class = getattr(ccxt, eid)
-        
+        exchange_class = TradingEngine.CUSTOM_EXCHANGES.get(eid)
+        if exchange_class is None:
+            if eid not in ccxt.exchanges:
+                raise ValueError(f"Exchange {eid} not supported by CCXT")
+            exchange_class = getattr(ccxt, eid)
+
         decrypted_key = SecurityManager.decrypt(credential.api_key_enc)
         decrypted_secret = SecurityManager.decrypt(credential.api_secret_enc)
-        
-        exchange = exchange_class({
+
+        config = {
             'apiKey': decrypted_key,
             'secret': decrypted_secret,
             'enableRateLimit': True,
-        })
-        
-        # Load markets to verify connection
-        # exchange.load_markets() # Can be slow, do on demand
-        return exchange
+        }
+        if issubclass(exchange_class, PaperExchange):
+            # Paper balances belong to the user, whatever key was typed in
+            config['uid'] = credential.user_id
+        return exchange_class(config)
 
     @staticmethod
-    def verify_connection(credential: ExchangeCredential) -> bool:
+    def get_exchange_client(credential: ExchangeCredential, load_markets: bool = False,
+                            now: Optional[float] = None):
+        """
+        Pooled client for the credential. A changed exchange or key, or an
+        entry older than CLIENT_TTL, builds a new one. With load_markets the
+        client gets the exchange's markets, fetched at most once per
+        MARKETS_TTL and shared by every client of that exchange.
+        """
+        now = time.time() if now is None else now
+        fingerprint = (credential.exchange_id, credential.api_key_enc, credential.api_secret_enc)
+        key = credential.id
+        with TradingEngine._lock:
+            entry = TradingEngine._clients.get(key) if key else None
+            if entry is not None and (entry["fingerprint"] != fingerprint or now - entry["created_at"] >= TradingEngine.CLIENT_TTL):
+                del TradingEngine._clients[key]
+                entry = None
+            if entry is not None:
+                TradingEngine._clients.move_to_end(key)
+
+        if entry is None:
+            entry = {"client": PooledClient(TradingEngine.build_client(credential)), "fingerprint": fingerprint,
+                     "created_at": now, "markets_at": None}
+            if key:
+                with TradingEngine._lock:
+                    TradingEngine._clients[key] = entry
+                    while len(TradingEngine._clients) > TradingEngine.POOL_SIZE:
+                        TradingEngine._clients.popitem(last=False)
+
+        client = entry["client"]
+        if load_markets:
+            TradingEngine._ensure_markets(entry, credential.exchange_id.lower(), now)
+        return client
+
+    @staticmethod
+    def _ensure_markets(entry: dict, exchange_id: str, now: float):
+        client = entry["client"]
+        # The client lock covers the entry too; the pool lock is not held across the download
+        with client.lock:
+            with TradingEngine._lock:
+                shared = TradingEngine._markets.get(exchange_id)
+            if shared is None or now - shared[0] >= TradingEngine.MARKETS_TTL:
+                client.load_markets(reload=True)
+                with TradingEngine._lock:
+                    shared = TradingEngine._markets[exchange_id] = (now, client.markets, client.currencies)
+                entry["markets_at"] = now
+            elif entry["markets_at"] != shared[0]:
+                client.set_markets(shared[1], shared[2])
+                entry["markets_at"] = shared[0]
+
+    @staticmethod
+    def invalidate(credential_id: Optional[str] = None):
+        """Drops pooled clients (all of them, or one credential's)."""
+        with TradingEngine._lock:
+            if credential_id is None:
+                TradingEngine._clients.clear()
+                TradingEngine._markets.clear()
+            else:
+                TradingEngine._clients.pop(credential_id, None)
+
+    @staticmethod
+    def check_connection(credential: ExchangeCredential) -> Optional[str]:
+        """Fetches the balance with the credential; returns the error, or None when it works."""
         try:
             client = TradingEngine.get_exchange_client(credential)
             client.fetch_balance()
-            return True
+            return None
         except Exception as e:
             print(f"Connection verification failed: {e}")
-            return False
-            
+            TradingEngine.invalidate(credential.id)
+            return str(e) or type(e).__name__
+
+    @staticmethod
+    def verify_connection(credential: ExchangeCredential) -> bool:
+        return TradingEngine.check_connection(credential) is None
+
     @staticmethod
-    def execute_auto_trade(user: User):
+    def verify_in_background(credential: ExchangeCredential) -> Future:
         """
-        Main logic for the Auto-Trading bot.
-        Checking rules and executing orders.
+        Marks the credential pending and checks it on a worker thread, so the
+        request does not wait on the exchange. The outcome is stored and
+        pushed to the user's Socket.IO room as 'exchange_status'.
         """
-        settings = user.auto_trade_settings
-        if not settings or not settings.enabled:
-            return
-            
-        # Get active exchange credential (assume first active one for now)
-        creds = user.exchanges.filter_by(is_active=True).first()
-        if not creds:
-            print(f"No active exchange for user {user.username}")
-            return
-            
-        try:
-            client = TradingEngine.get_exchange_client(creds)
+        credential.status = 'pending'
+        credential.status_message = None
+        credential.is_active = False # not traded or synced until verified
+        db.session.commit()
+        with TradingEngine._lock:
+            if TradingEngine._verifier is None:
+                TradingEngine._verifier = ThreadPoolExecutor(max_workers=TradingEngine.VERIFY_WORKERS)
+        return TradingEngine._verifier.submit(TradingEngine._verify, current_app._get_current_object(), credential.id)
+
+    @staticmethod
+    def _verify(app, credential_id: str) -> Optional[dict]:
+        with app.app_context():
+            try:
+                credential = db.session.get(ExchangeCredential, credential_id)
+                if credential is None:
+                    return None
+                error = TradingEngine.check_connection(credential)
+                credential.status = 'failed' if error else 'verified'
+                credential.status_message = error[:255] if error else None
+                credential.is_active = error is None
+                credential.checked_at = datetime.utcnow()
+                db.session.commit()
+                status = credential.to_dict()
+                socketio.emit('exchange_status', status, to=credential.user_id)
+                return status
+            finally:
+                db.session.remove()
             
-            # Simple Strategy Example:
-            # If "BTC/USDT" price < X (buy) -> Logic needs market data history which we have via API/Socket
-            # For this Phase, we'll implement a 'test' trade or simple market buy/sell trigger from UI
-            # Real bot logic requires loop. 
-            pass
-        except Exception as e:
-            print(f"Auto trade error: {e}")
+    @staticmethod
+    def execute_auto_trade(user: User) -> dict:
+        """
+        Runs the Auto-Trading rules for one user right away; the scheduler
+        does the same for every enabled user on each tick.
+        """
+        from .auto_trader import AutoTradeScheduler
+        return AutoTradeScheduler.tick([user.id])
+
+    @staticmethod
+    def transaction_for(user_id: str, symbol: str, side: str, amount: float, price: Optional[float],
+                        strategy: str, order_id: Optional[str] = None) -> Transaction:
+        """Ledger row of an exchange fill; order_id keeps ExchangeSyncService from importing it again."""
+        return Transaction(
+            user_id=user_id,
+            symbol=symbol,
+            type=side,
+            quantity=amount,
+            price=price, # Market orders might vary
+            asset_name=symbol, # Simplified
+            asset_type='crypto',
+            strategy=strategy,
+            exchange_order_id=order_id
+        )
 
     @staticmethod
     def place_order(user: User, symbol: str, side: str, amount: float, price: float = None):
@@ -80,7 +231,7 @@ class TradingEngine:
         if not creds:
             raise ValueError("No connected exchange")
             
-        client = TradingEngine.get_exchange_client(creds)
+        client = TradingEngine.get_exchange_client(creds, load_markets=True)
         
         # Determine type
         order_type = 'limit' if price else 'market'
@@ -92,18 +243,10 @@ class TradingEngine:
                 order = client.create_order(symbol, order_type, side, amount)
             
             # Log transaction to DB
-            txn = Transaction(
-                user_id=user.id,
-                symbol=symbol,
-                type=side,
-                quantity=amount,
-                price=order.get('price', price), # Market orders might vary
-                asset_name=symbol, # Simplified
-                asset_type='crypto',
-                strategy='manual' if price else 'market_auto', 
-                profit_loss=0
-            )
+            txn = TradingEngine.transaction_for(user.id, symbol, side, amount, order.get('price', price),
+                                                'manual' if price else 'market_auto', order.get('id'))
             db.session.add(txn)
+            LotService.record(txn)
             db.session.commit()
             
             return order
@@ -0,0 +1,144 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from ..utils.api import CoinGeckoAPI
+
+@dataclass
+class Valuation:
+    """
+    Per-asset and aggregate metrics for a set of holdings, stored as columns.
+    Group keys (asset_type, currency) are kept as integer codes into label lists.
+    """
+    quantity: np.ndarray
+    buy_price: np.ndarray
+    current_price: np.ndarray
+    value: np.ndarray
+    cost: np.ndarray
+    pl: np.ndarray
+    pl_percent: np.ndarray
+    total_value: float
+    total_cost: float
+    total_pl: float
+    total_pl_percent: float
+    type_codes: Optional[np.ndarray] = None
+    type_labels: Optional[List[str]] = None
+    currency_codes: Optional[np.ndarray] = None
+    currency_labels: Optional[List[str]] = None
+
+    def rows(self) -> List[dict]:
+        """Per-holding metrics as plain Python floats, in input order."""
+        columns = zip(
+            self.current_price.tolist(),
+            self.value.tolist(),
+            self.cost.tolist(),
+            self.pl.tolist(),
+            self.pl_percent.tolist()
+        )
+        return [
+            {"current_price": p, "value": v, "cost": c, "pl": pl, "pl_percent": pct}
+            for p, v, c, pl, pct in columns
+        ]
+
+    def by_asset_type(self) -> Dict[str, dict]:
+        return PortfolioValuation.group(self.type_codes, self.type_labels, self.value, self.cost)
+
+    def by_currency(self) -> Dict[str, dict]:
+        return PortfolioValuation.group(self.currency_codes, self.currency_labels, self.value, self.cost)
+
+
+class PortfolioValuation:
+    """
+    Vectorized valuation engine shared by the web routes and the CLI.
+    """
+
+    @staticmethod
+    def compute(quantity, buy_price, current_price, **group_columns) -> Valuation:
+        """
+        Values every holding in one pass over NumPy columns.
+        `group_columns` forwards the optional *_codes / *_labels fields.
+        """
+        quantity = np.asarray(quantity, dtype=float)
+        buy_price = np.asarray(buy_price, dtype=float)
+        current_price = np.asarray(current_price, dtype=float)
+
+        value = quantity * current_price
+        cost = quantity * buy_price
+        pl = value - cost
+        pl_percent = np.divide(pl * 100, cost, out=np.zeros_like(pl), where=cost > 0)
+
+        total_value = float(value.sum())
+        total_cost = float(cost.sum())
+        total_pl = total_value - total_cost
+        total_pl_percent = (total_pl / total_cost * 100) if total_cost > 0 else 0
+
+        return Valuation(
+            quantity=quantity,
+            buy_price=buy_price,
+            current_price=current_price,
+            value=value,
+            cost=cost,
+            pl=pl,
+            pl_percent=pl_percent,
+            total_value=total_value,
+            total_cost=total_cost,
+            total_pl=total_pl,
+            total_pl_percent=total_pl_percent,
+            **group_columns
+        )
+
+    @staticmethod
+    def factorize(keys: Iterable) -> Tuple[np.ndarray, List[str]]:
+        """
+        Maps each key to a dense integer code, in order of first appearance.
+        """
+        index: Dict[str, int] = {}
+        codes = [index.setdefault(str(k), len(index)) for k in keys]
+        return np.asarray(codes, dtype=np.intp), list(index)
+
+    @staticmethod
+    def group(codes: Optional[np.ndarray], labels: Optional[List[str]], value: np.ndarray, cost: np.ndarray) -> Dict[str, dict]:
+        """
+        Sums value and cost per group with a single bincount.
+        """
+        if codes is None or not labels:
+            return {}
+        value_sum = np.bincount(codes, weights=value, minlength=len(labels))
+        cost_sum = np.bincount(codes, weights=cost, minlength=len(labels))
+        return {
+            label: {"value": v, "cost": c, "pl": v - c}
+            for label, v, c in zip(labels, value_sum.tolist(), cost_sum.tolist())
+        }
+
+    @staticmethod
+    def fetch_prices(assets: Sequence, currency: str = "usd") -> Dict[str, float]:
+        """
+        Resolves live prices for every distinct coin_id in one API call.
+        """
+        coin_ids = sorted({a.coin_id for a in assets if a.coin_id})
+        return CoinGeckoAPI.get_prices(coin_ids, currency) if coin_ids else {}
+
+    @staticmethod
+    def value_assets(assets: Sequence, prices: Optional[Dict[str, float]] = None) -> Valuation:
+        """
+        Values Asset rows (ORM models or dataclasses). Holdings without a live
+        price fall back to their buy_price, as the routes always did.
+        """
+        if prices is None:
+            prices = PortfolioValuation.fetch_prices(assets)
+
+        quantity = [a.quantity or 0.0 for a in assets]
+        buy_price = [a.buy_price or 0.0 for a in assets]
+        current_price = [prices.get(a.coin_id) or b for a, b in zip(assets, buy_price)]
+        type_codes, type_labels = PortfolioValuation.factorize(a.asset_type for a in assets)
+        currency_codes, currency_labels = PortfolioValuation.factorize(
+            getattr(a, 'currency', None) or 'USD' for a in assets
+        )
+        return PortfolioValuation.compute(
+            quantity,
+            buy_price,
+            current_price,
+            type_codes=type_codes,
+            type_labels=type_labels,
+            currency_codes=currency_codes,
+            currency_labels=currency_labels
+        )
@@ -1,5 +1,13 @@
+import argparse
+from rich.console import Console
+from rich.table import Table
 from rich.prompt import Prompt
 from ..core.alert import Alert
+from ..core.asset import Asset
+from ..core.valuation import PortfolioValuation
+from ..core.scenarios import Scenario, ScenarioEngine, HISTORICAL_SCENARIOS
+from ..data.storage import Storage
+from ..utils.api import CoinGeckoAPI
 
 class CLI:
     def __init__(self):
@@ -33,6 +41,11 @@ class CLI:
         sim_parser = subparsers.add_parser("simulate", help="Simulate market changes")
         sim_parser.add_argument("percent", type=float, help="Percentage change (e.g., 10 for +10%, -20 for -20%)")
 
+        # Command: stress
+        stress_parser = subparsers.add_parser("stress", help="Stress-test holdings against crash scenarios")
+        stress_parser.add_argument("--shock", action="append", default=[], metavar="KEY=PCT",
+                                   help="Custom shock by asset class, symbol or coin id (e.g., crypto=-40 stock=-10)")
+
         args = parser.parse_args()
 
         if args.command == "add":
@@ -46,6 +59,8 @@ class CLI:
             self.add_alert(args.symbol.upper(), args.target, condition)
         elif args.command == "simulate":
             self.simulate_portfolio(args.percent)
+        elif args.command == "stress":
+            self.stress_test(args.shock)
         else:
             parser.print_help()
 
@@ -115,32 +130,24 @@ class CLI:
         table.add_column("P/L", style="bold")
         table.add_column("Alerts", style="red")
 
-        total_value = 0.0
-        total_cost = 0.0
-
         with self.console.status("[bold green]Fetching live prices..."):
-            for asset in assets:
-                current_price = asset.buy_price 
+            prices = PortfolioValuation.fetch_prices(assets)
+            valuation = PortfolioValuation.value_assets(assets, prices)
+
+            for asset, metrics in zip(assets, valuation.rows()):
+                current_price = metrics["current_price"]
+                value = metrics["value"]
+                pl = metrics["pl"]
+                pl_percent = metrics["pl_percent"]
                 pl_str = "N/A"
                 pl_style = "dim"
                 alert_msg = ""
                 
-                if asset.coin_id:
-                    price = CoinGeckoAPI.get_price(asset.coin_id)
-                    if price:
-                        current_price = price
-                        # Check alerts
-                        for alert in alerts:
-                            if alert.symbol == asset.symbol and alert.check(current_price):
-                                alert_msg = f"TRIGGERED ({alert.condition} {alert.target_price})"
-
-                value = asset.quantity * current_price
-                cost = asset.quantity * asset.buy_price
-                pl = value - cost
-                pl_percent = (pl / cost * 100) if cost > 0 else 0
-                
-                total_value += value
-                total_cost += cost
+                if asset.coin_id in prices:
+                    # Check alerts
+                    for alert in alerts:
+                        if alert.symbol == asset.symbol and alert.check(current_price):
+                            alert_msg = f"TRIGGERED ({alert.condition} {alert.target_price})"
                 
                 if pl >= 0:
                     pl_str = f"+${pl:.2f} (+{pl_percent:.1f}%)"
@@ -160,8 +167,9 @@ class CLI:
 
         self.console.print(table)
         
-        total_pl = total_value - total_cost
-        total_pl_percent = (total_pl / total_cost * 100) if total_cost > 0 else 0
+        total_value = valuation.total_value
+        total_pl = valuation.total_pl
+        total_pl_percent = valuation.total_pl_percent
         style = "green" if total_pl >= 0 else "red"
         
         self.console.print(f"\n[bold]Total Portfolio Value:[/bold] ${total_value:.2f}")
@@ -199,3 +207,43 @@ class CLI:
             
         self.console.print(table)
         self.console.print(f"\n[bold]Projected Total:[/bold] ${total_sim_value:.2f}")
+
+    def stress_test(self, shock_args: list):
+        assets = self.portfolio.get_assets()
+        if not assets:
+            self.console.print("[yellow]Portfolio is empty.[/yellow]")
+            return
+
+        if shock_args:
+            shocks = {}
+            for item in shock_args:
+                key, _, pct = item.partition("=")
+                try:
+                    shocks[key.strip()] = Scenario.level(pct)
+                except ValueError:
+                    self.console.print(f"[red]Invalid shock '{item}', expected KEY=PCT with PCT >= -100[/red]")
+                    return
+            scenarios = [Scenario("custom", shocks)]
+        else:
+            scenarios = HISTORICAL_SCENARIOS
+
+        with self.console.status("[bold green]Fetching live prices..."):
+            result = ScenarioEngine.run_assets(scenarios, assets).to_dict()
+
+        table = Table(title=f"Stress Test (current value ${result['base_value']:.2f})")
+        table.add_column("Scenario", style="cyan")
+        table.add_column("Shocks", style="dim")
+        table.add_column("Stressed Value", style="bold magenta")
+        table.add_column("P/L", style="bold")
+
+        for row in result["scenarios"]:
+            style = "green" if row["pnl"] >= 0 else "red"
+            shocks = ", ".join(f"{k} {v:+g}%" for k, v in row["shocks"].items())
+            table.add_row(
+                row["name"],
+                shocks,
+                f"${row['stressed_value']:.2f}",
+                f"[{style}]${row['pnl']:.2f} ({row['pnl_percent']:.1f}%)[/{style}]"
+            )
+
+        self.console.print(table)
@@ -59,6 +59,34 @@ class CoinGeckoAPI:
         except requests.RequestException:
             return None
 
+    @staticmethod
+    def resolve_symbols(symbols: list[str], currency: str = "usd") -> Dict[str, str]:
+        """
+        Resolves many ticker symbols in one request.
+        Returns dict {SYMBOL: coin_id}, keeping the largest market cap when
+        several coins share a symbol.
+        """
+        try:
+            if not symbols: return {}
+            url = f"{CoinGeckoAPI.BASE_URL}/coins/markets"
+            params = {
+                "vs_currency": currency,
+                "symbols": ",".join(s.lower() for s in symbols),
+                "order": "market_cap_desc",
+                "per_page": 250
+            }
+            response = requests.get(url, params=params, timeout=10)
+            response.raise_for_status()
+
+            results = {}
+            for coin in response.json():
+                symbol = coin.get("symbol", "").upper()
+                if symbol and symbol not in results:
+                    results[symbol] = coin["id"]
+            return results
+        except requests.RequestException:
+            return {}
+
     @staticmethod
     def get_coin_history(coin_id: str, days: int = 30, currency: str = "usd") -> Optional[list]:
         """
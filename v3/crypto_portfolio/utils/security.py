@@ -6,6 +6,7 @@ from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
 class SecurityManager:
     _key = None
+    _fernet = None
     
     @classmethod
     def get_key(cls):
@@ -24,14 +25,20 @@ class SecurityManager:
             cls._key = base64.urlsafe_b64encode(kdf.derive(password))
         return cls._key
 
+    @classmethod
+    def get_fernet(cls) -> Fernet:
+        if not cls._fernet:
+            cls._fernet = Fernet(cls.get_key())
+        return cls._fernet
+
     @staticmethod
     def encrypt(data: str) -> str:
         if not data: return None
-        f = Fernet(SecurityManager.get_key())
+        f = SecurityManager.get_fernet()
         return f.encrypt(data.encode()).decode()
 
     @staticmethod
     def decrypt(token: str) -> str:
         if not token: return None
-        f = Fernet(SecurityManager.get_key())
+        f = SecurityManager.get_fernet()
         return f.decrypt(token.encode()).decode()
@@ -0,0 +1,27 @@
+import unittest
+from flask import Flask
+from crypto_portfolio.extensions import db
+from crypto_portfolio.core.models import User
+
+class DBTestCase(unittest.TestCase):
+    """
+    Runs each test against a fresh in-memory SQLite database.
+    """
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        self.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(self.app)
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        self.user = User(username='tester')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
@@ -0,0 +1,97 @@
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+import numpy as np
+from crypto_portfolio.extensions import db
+from crypto_portfolio.core.models import Asset, User
+from crypto_portfolio.core.ai_predictor import AIPredictor
+from crypto_portfolio.core.price_history import PriceHistoryStore
+from tests.helpers import DBTestCase
+
+DAY_MS = 24 * 3600 * 1000
+HISTORY = [[1700000000000 + i * DAY_MS, 100.0 + i + 0.1 * i * i] for i in range(30)]
+
+class TestAIPredictorCache(DBTestCase):
+    def setUp(self):
+        super().setUp()
+        AIPredictor.invalidate()
+
+    def test_repeat_predictions_skip_download_and_fit(self):
+        with mock.patch('crypto_portfolio.core.ai_predictor.CoinGeckoAPI.get_coin_history',
+                        return_value=HISTORY) as history:
+            first = AIPredictor.predict_future('bitcoin')
+            second = AIPredictor.predict_future('bitcoin')
+            self.assertEqual(history.call_count, 1)
+            self.assertEqual(first, second)
+            # exact quadratic: the forecast continues the curve
+            self.assertAlmostEqual(first["predicted_prices"][0], 100.0 + 30 + 0.1 * 900, places=6)
+            AIPredictor.predict_future('bitcoin', degree=3)
+            self.assertEqual(history.call_count, 2) # the degree is part of the key
+
+    def test_ttl_and_lru_eviction(self):
+        with mock.patch('crypto_portfolio.core.ai_predictor.CoinGeckoAPI.get_coin_history',
+                        return_value=HISTORY) as history, \
+                mock.patch.object(AIPredictor, 'CACHE_SIZE', 2):
+            AIPredictor.fit('a', now=0)
+            AIPredictor.fit('b', now=0)
+            AIPredictor.fit('a', now=10) # refreshes 'a' in the LRU order
+            AIPredictor.fit('c', now=10) # evicts 'b'
+            self.assertEqual([k[0] for k in AIPredictor._models], ['a', 'c'])
+            self.assertEqual(history.call_count, 3)
+            AIPredictor.fit('a', now=AIPredictor.CACHE_TTL + 1) # expired
+            self.assertEqual(history.call_count, 4)
+
+class TestPredictorBackends(DBTestCase):
+    def setUp(self):
+        super().setUp()
+        AIPredictor.invalidate()
+
+    def test_numpy_backend_matches_sklearn(self):
+        rng = np.random.default_rng(7)
+        history = [[1700000000000 + i * DAY_MS, p] for i, p in enumerate(30000 + rng.normal(0, 500, 90).cumsum())]
+        with mock.patch('crypto_portfolio.core.ai_predictor.CoinGeckoAPI.get_coin_history', return_value=history):
+            for degree in (1, 2, 3):
+                fast = AIPredictor.predict_future('bitcoin', days_history=90, degree=degree, backend='numpy')
+                reference = AIPredictor.predict_future('bitcoin', days_history=90, degree=degree, backend='sklearn')
+                np.testing.assert_allclose(fast["predicted_prices"], reference["predicted_prices"], rtol=1e-9)
+                self.assertEqual(fast["trend"], reference["trend"])
+        with self.assertRaises(ValueError):
+            AIPredictor.make_model(2, 'torch')
+
+class TestBatchForecast(unittest.TestCase):
+    def test_matches_per_coin_polyfit(self):
+        rng = np.random.default_rng(1)
+        days = np.arange(40.0)
+        prices = 100 + rng.normal(0, 5, size=(40, 4)).cumsum(axis=0)
+        prices[:15, 2] = np.nan # shorter history gets its own design matrix
+        prices[:35, 3] = np.nan # too short to fit
+        future = np.arange(40.0, 47.0)
+        coefs, forecasts = AIPredictor.polynomial_trends(days, prices, future)
+        for j in range(3):
+            start = 15 if j == 2 else 0
+            expected = np.polyval(np.polyfit(days[start:], prices[start:, j], 2), future)
+            np.testing.assert_allclose(forecasts[:, j], expected, rtol=1e-8)
+        self.assertTrue(np.isnan(forecasts[:, 3]).all())
+
+class TestBatchPredictions(DBTestCase):
+    def test_predict_batch_from_stored_history(self):
+        start = date.today() - timedelta(days=29)
+        PriceHistoryStore.store('bitcoin', [(start + timedelta(days=i), 100.0 + 2 * i) for i in range(30)])
+        PriceHistoryStore.store('ethereum', [(start + timedelta(days=i), 50.0 - i) for i in range(30)])
+        PriceHistoryStore.store('newcoin', [(start + timedelta(days=i), 1.0) for i in range(25, 30)])
+        result = AIPredictor.predict_batch(['bitcoin', 'ethereum', 'newcoin'], refresh_prices=False)
+        self.assertEqual(sorted(result), ['bitcoin', 'ethereum'])
+        self.assertAlmostEqual(result['bitcoin']['predicted_prices'][0], 160.0, places=6)
+        self.assertEqual(result['ethereum']['trend'], 'down')
+        self.assertEqual(result['bitcoin']['future_dates'][0], (date.today() + timedelta(days=1)).isoformat())
+
+class TestAIPredictorPrewarm(DBTestCase):
+    def test_most_held_coins(self):
+        other = User(username='other')
+        db.session.add(other)
+        db.session.commit()
+        for user, coin in ((self.user, 'bitcoin'), (other, 'bitcoin'), (other, 'ethereum'), (self.user, 'solana'),
+                           (self.user, 'solana')):
+            db.session.add(Asset(user_id=user.id, symbol=coin[:3].upper(), coin_id=coin, quantity=1.0))
+        db.session.commit()
+        self.assertEqual(AIPredictor.most_held_coins(2), ['bitcoin', 'ethereum'])
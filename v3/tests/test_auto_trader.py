@@ -0,0 +1,112 @@
+import threading
+import time
+import unittest
+from unittest import mock
+from crypto_portfolio.extensions import db
+from crypto_portfolio.core.models import User, AutoTradeSettings, ExchangeCredential, Transaction
+from crypto_portfolio.core.auto_trader import AutoTradeScheduler, RateLimiter
+from crypto_portfolio.core.fake_exchange import FakeExchange
+from crypto_portfolio.core.trading_engine import TradingEngine
+from crypto_portfolio.utils.security import SecurityManager
+from tests.helpers import DBTestCase
+
+class TestRateLimiter(unittest.TestCase):
+    def test_spaces_calls_across_threads(self):
+        limiter = RateLimiter(rate=100.0)
+        start = time.monotonic()
+        threads = [threading.Thread(target=limiter.acquire) for _ in range(11)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09) # one burst token, then 10 at 100/s
+
+class TestAutoTradeScheduler(DBTestCase):
+    def setUp(self):
+        super().setUp()
+        FakeExchange.reset()
+        FakeExchange.set_prices({"BTC/USDT": 100.0, "ETH/USDT": 10.0})
+        TradingEngine.register_exchange("fake", FakeExchange)
+        TradingEngine.invalidate()
+        AutoTradeScheduler.invalidate()
+        AutoTradeScheduler._limiters.clear()
+
+    def tearDown(self):
+        TradingEngine.CUSTOM_EXCHANGES.pop("fake", None)
+        TradingEngine.invalidate()
+        AutoTradeScheduler.invalidate()
+        super().tearDown()
+
+    def add_trader(self, name, enabled=True, pairs="BTC/USDT,ETH/USDT"):
+        user = User(username=name)
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(AutoTradeSettings(user_id=user.id, enabled=enabled, take_profit_percentage=5.0,
+                                         stop_loss_percentage=2.0, max_position_size=1000.0,
+                                         trading_pairs_str=pairs))
+        db.session.add(ExchangeCredential(user_id=user.id, exchange_id="fake",
+                                          api_key_enc=SecurityManager.encrypt(f"key-{name}"),
+                                          api_secret_enc=SecurityManager.encrypt("secret")))
+        db.session.commit()
+        return user
+
+    def test_entries_then_exits(self):
+        alice = self.add_trader("alice")
+        self.add_trader("bob", enabled=False)
+        self.add_trader("carol", pairs="BTC/USDT,NOPE/USDT")
+
+        report = AutoTradeScheduler.tick()
+        self.assertEqual(report["users"], 2)
+        self.assertEqual(report["orders"], 3) # alice: 2 pairs, carol: BTC only
+        self.assertEqual(FakeExchange.balances["key-alice"]["BTC"], 10.0)
+        self.assertEqual(AutoTradeScheduler.tick()["orders"], 0) # holding, prices unchanged
+
+        FakeExchange.set_prices({"BTC/USDT": 106.0, "ETH/USDT": 9.7})
+        self.assertEqual(AutoTradeScheduler.tick()["orders"], 3) # BTC take profit x2, ETH stop loss
+        sells = Transaction.query.filter_by(user_id=alice.id, type='sell').order_by(Transaction.symbol).all()
+        self.assertEqual([(t.symbol, t.strategy) for t in sells], [("BTC/USDT", "auto_trade"), ("ETH/USDT", "auto_trade")])
+        self.assertAlmostEqual(sells[0].profit_loss, 60.0)
+        self.assertAlmostEqual(sells[1].profit_loss, -30.0)
+
+        # Positions survive a restart: the books are replayed from the ledger
+        AutoTradeScheduler.invalidate()
+        self.assertEqual(AutoTradeScheduler.tick()["orders"], 3) # back in
+        self.assertEqual(TradingEngine.execute_auto_trade(alice)["orders"], 0)
+
+    def test_failed_orders_are_not_booked(self):
+        self.add_trader("dave")
+        FakeExchange.balances["key-dave"] = {"USDT": 1500.0} # enough for one entry only
+        report = AutoTradeScheduler.tick()
+        self.assertEqual((report["orders"], report["failed"]), (1, 1))
+        self.assertEqual(Transaction.query.count(), 1)
+
+    def test_many_users_run_concurrently(self):
+        for i in range(200):
+            self.add_trader(f"user{i}", pairs="BTC/USDT")
+        lock, calls = threading.Lock(), {"active": 0, "peak": 0}
+        create_order = FakeExchange.create_order
+
+        def counting(client, *args, **kwargs):
+            with lock:
+                calls["active"] += 1
+                calls["peak"] = max(calls["peak"], calls["active"])
+            try:
+                return create_order(client, *args, **kwargs)
+            finally:
+                with lock:
+                    calls["active"] -= 1
+
+        with mock.patch.object(FakeExchange, 'latency', 0.005), mock.patch.object(FakeExchange, 'create_order', counting):
+            report = AutoTradeScheduler.tick(workers=32)
+        self.assertEqual(report["orders"], 200)
+        self.assertGreater(calls["peak"], 1) # orders of different users overlap
+
+    def test_failed_commit_leaves_positions_untouched(self):
+        user = self.add_trader("erin", pairs="BTC/USDT")
+        with mock.patch.object(db.session, 'commit', side_effect=RuntimeError("disk full")):
+            self.assertEqual(AutoTradeScheduler.tick()["orders"], 1)
+        self.assertNotIn(user.id, AutoTradeScheduler._books)
+        self.assertEqual(Transaction.query.count(), 0)
+        # replayed from the ledger, where the entry never landed: the bot enters again
+        self.assertEqual(AutoTradeScheduler.tick()["orders"], 1)
+        self.assertEqual(Transaction.query.count(), 1)
@@ -0,0 +1,51 @@
+import unittest
+import numpy as np
+from crypto_portfolio.core.backtest import Backtester
+
+def reference(prices, tp, sl, size):
+    """Bar-by-bar loop used to check the vectorized engine."""
+    pnl, i, n = [], 0, len(prices)
+    while i < n - 1:
+        exit_bar = n - 1
+        for j in range(i + 1, n):
+            if prices[j] >= prices[i] * (1 + tp / 100) or prices[j] <= prices[i] * (1 - sl / 100):
+                exit_bar = j
+                break
+        pnl.append(size * (prices[exit_bar] / prices[i] - 1))
+        i = exit_bar
+    return pnl
+
+class TestBacktester(unittest.TestCase):
+    def test_matches_bar_by_bar_loop(self):
+        rng = np.random.default_rng(4)
+        prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 400)))
+        results = Backtester.run(prices, [1.0, 5.0, 20.0], [2.0, 10.0], position_size=500.0)
+        self.assertEqual(len(results), 6)
+        for r in results:
+            pnl = reference(prices, r.take_profit_percentage, r.stop_loss_percentage, 500.0)
+            self.assertEqual(r.trades, len(pnl))
+            self.assertAlmostEqual(r.profit_loss, sum(pnl), places=6)
+            self.assertAlmostEqual(r.win_rate, 100 * sum(p > 0 for p in pnl) / len(pnl))
+
+    def test_take_profit_and_drawdown(self):
+        prices = [100, 104, 106, 103, 90, 95]
+        r = Backtester.run(prices, [5.0], [10.0], position_size=100.0)[0]
+        # 100 -> 106 take profit, re-enter at 106, 106 -> 90 stop loss, 90 -> 95 at the end
+        self.assertEqual(r.trades, 3)
+        self.assertAlmostEqual(r.profit_loss, 6 + 100 * (90 / 106 - 1) + 100 * (95 / 90 - 1))
+        self.assertAlmostEqual(r.max_drawdown, 100 * (1 - 90 / 106))
+
+    def test_zero_position_size(self):
+        with np.errstate(all='raise'):
+            r = Backtester.run([100, 104, 106, 103, 90, 95], [5.0], [10.0], position_size=0.0)[0]
+        self.assertEqual((r.profit_loss, r.max_drawdown), (0.0, 0.0))
+        self.assertEqual(r.max_drawdown_percentage, 0.0)
+
+    def test_process_pool_matches_serial(self):
+        prices = 100 * np.exp(np.cumsum(np.random.default_rng(1).normal(0, 0.03, 200)))
+        serial = Backtester.run(prices, [2.0, 4.0], [3.0], cashout=(0.5, 10.0))
+        pooled = Backtester.run(prices, [2.0, 4.0], [3.0], cashout=(0.5, 10.0), workers=2)
+        self.assertEqual([r.to_dict() for r in serial], [r.to_dict() for r in pooled])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+from datetime import date, timedelta
+import numpy as np
+from crypto_portfolio.extensions import db
+from crypto_portfolio.core.correlation import CorrelationService
+from crypto_portfolio.core.price_history import PriceHistoryStore
+from tests.helpers import DBTestCase
+
+class TestCorrelationService(DBTestCase):
+    def setUp(self):
+        super().setUp()
+        CorrelationService.invalidate()
+        rng = np.random.default_rng(7)
+        self.coins = ['bitcoin', 'ethereum', 'solana']
+        common = rng.normal(0, 0.02, size=120)
+        self.prices = 100 * np.cumprod(1 + np.column_stack([
+            common + rng.normal(0, 0.01, 120),
+            common + rng.normal(0, 0.01, 120),
+            rng.normal(0, 0.02, 120),
+        ]), axis=0)
+        self.start = date.today() - timedelta(days=119)
+
+    def _store_days(self, first, last):
+        for j, coin in enumerate(self.coins):
+            PriceHistoryStore.store(coin, [(self.start + timedelta(days=i), self.prices[i, j]) for i in range(first, last)])
+        db.session.commit()
+
+    def _expected(self, upto, window):
+        p = self.prices[:upto]
+        r = p[1:] / p[:-1] - 1
+        return np.cov(r[-window:], rowvar=False)
+
+    def test_incremental_update_matches_full_rebuild(self):
+        self._store_days(0, 100)
+        state = CorrelationService.get(self.coins, window=30)
+        np.testing.assert_allclose(state.covariance(), self._expected(100, 30), rtol=1e-8)
+
+        self._store_days(100, 120)
+        rolled = CorrelationService.get(self.coins, window=30)
+        self.assertIs(rolled, state)
+        self.assertEqual(rolled.observations, 30)
+        np.testing.assert_allclose(rolled.covariance(), self._expected(120, 30), rtol=1e-8)
+
+    def test_waits_for_lagging_coins(self):
+        self._store_days(0, 100)
+        state = CorrelationService.get(self.coins, window=30)
+        # only two of the three coins have the next days yet
+        for j, coin in enumerate(self.coins[:2]):
+            PriceHistoryStore.store(coin, [(self.start + timedelta(days=i), self.prices[i, j]) for i in range(100, 110)])
+        db.session.commit()
+        self.assertEqual(CorrelationService.get(self.coins, window=30).last_date, self.start + timedelta(days=99))
+
+        self._store_days(100, 110)
+        rolled = CorrelationService.get(self.coins, window=30)
+        self.assertIs(rolled, state)
+        np.testing.assert_allclose(rolled.covariance(), self._expected(110, 30), rtol=1e-8)
+
+    def test_coins_without_enough_history_are_excluded(self):
+        self._store_days(0, 120)
+        PriceHistoryStore.store('dogecoin', [(self.start + timedelta(days=i), 0.1 + i / 100) for i in range(115, 120)])
+        db.session.commit()
+        report = CorrelationService.report(self.coins + ['cardano', 'dogecoin'], {'cardano': 'ADA'}, window=90)
+        self.assertEqual(report['coins'], sorted(self.coins))
+        self.assertEqual(report['excluded'], ['ADA', 'dogecoin'])
+        self.assertEqual(report['observations'], 90)
+        self.assertIsNotNone(report['average_correlation'])
+
+    def test_report(self):
+        self._store_days(0, 120)
+        report = CorrelationService.report(self.coins, {'bitcoin': 'BTC'}, window=60)
+        corr = np.array(report['correlation'])
+        np.testing.assert_allclose(np.diag(corr), 1.0)
+        self.assertGreater(corr[0, 1], corr[0, 2])
+        self.assertEqual(report['labels'][0], 'BTC')
+
+if __name__ == '__main__':
+    unittest.main()
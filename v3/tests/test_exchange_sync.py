@@ -0,0 +1,137 @@
+import time
+from unittest import mock
+import ccxt
+from crypto_portfolio.extensions import db
+from crypto_portfolio.core.models import Asset, ExchangeCredential, Transaction, User
+from crypto_portfolio.core.exchange_sync import ExchangeSyncService
+from crypto_portfolio.core.lots import LotService
+from crypto_portfolio.core.paper_exchange import PaperExchange, PaperMatchingEngine
+from crypto_portfolio.core.trading_engine import TradingEngine
+from crypto_portfolio.utils.security import SecurityManager
+from tests.helpers import DBTestCase
+
+class PerMarketPaperExchange(PaperExchange):
+    """Lists trades one market at a time, like Binance."""
+    def describe(self):
+        return self.deep_extend(super().describe(), {"id": "permarket"})
+
+    def fetch_my_trades(self, symbol=None, since=None, limit=None, params={}):
+        if symbol is None:
+            raise ccxt.ArgumentsRequired("symbol required")
+        return super().fetch_my_trades(symbol, since, limit, params)
+
+class TestExchangeSync(DBTestCase):
+    def setUp(self):
+        super().setUp()
+        PaperExchange.engine = PaperMatchingEngine()
+        PaperExchange.engine.tick("BTC/USDT", 100.0)
+        PaperExchange.engine.tick("ETH/USDT", 10.0)
+        TradingEngine.register_exchange("permarket", PerMarketPaperExchange)
+        TradingEngine.invalidate()
+        LotService._books.clear()
+        patcher = mock.patch('crypto_portfolio.core.exchange_sync.CoinGeckoAPI.resolve_symbols',
+                             return_value={'BTC': 'bitcoin', 'USDT': 'tether'})
+        self.resolve = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        TradingEngine.CUSTOM_EXCHANGES.pop("permarket", None)
+        TradingEngine.invalidate()
+        PaperExchange.engine = PaperMatchingEngine()
+        LotService._books.clear()
+        super().tearDown()
+
+    def connect(self, user, exchange_id):
+        credential = ExchangeCredential(user_id=user.id, exchange_id=exchange_id,
+                                        api_key_enc=SecurityManager.encrypt("key"),
+                                        api_secret_enc=SecurityManager.encrypt("secret"))
+        db.session.add(credential)
+        db.session.commit()
+        return credential
+
+    def test_imports_new_trades_once_and_reconciles_assets(self):
+        credential = self.connect(self.user, "paper")
+        PaperExchange.engine.create_order(self.user.id, "BTC/USDT", "market", "buy", 2.0)
+        report = ExchangeSyncService.run()
+        self.assertEqual((report["accounts"], report["trades"], report["failed"]), (1, 1, 0))
+
+        txn = Transaction.query.filter_by(user_id=self.user.id).one()
+        self.assertEqual((txn.symbol, txn.type, txn.quantity, txn.strategy), ("BTC/USDT", "buy", 2.0, "exchange_sync"))
+        self.assertEqual(credential.trades_since, PaperExchange.engine.my_trades(self.user.id)[0]["timestamp"])
+        btc = Asset.query.filter_by(user_id=self.user.id, symbol="BTC").one()
+        self.assertEqual((btc.quantity, btc.broker, btc.coin_id), (2.0, "paper", "bitcoin"))
+        self.assertAlmostEqual(btc.buy_price, txn.price)
+        self.assertIsNone(Asset.query.filter_by(symbol="USDT").first()) # quote cash is not an asset
+
+        # Nothing new: the overlapping trade at the cursor is deduplicated
+        self.assertEqual(ExchangeSyncService.run()["trades"], 0)
+        PaperExchange.engine.tick("BTC/USDT", 120.0)
+        PaperExchange.engine.create_order(self.user.id, "BTC/USDT", "market", "sell", 2.0)
+        self.assertEqual(ExchangeSyncService.run()["trades"], 1)
+        self.assertEqual(Transaction.query.count(), 2)
+        self.assertEqual(btc.quantity, 0.0)
+        sell = Transaction.query.filter_by(type="sell").one()
+        self.assertAlmostEqual(sell.profit_loss, 2.0 * (sell.price - txn.price))
+        self.resolve.assert_called_once()
+
+    def test_orders_placed_through_the_app_are_not_imported_again(self):
+        self.connect(self.user, "paper")
+        TradingEngine.place_order(self.user, "BTC/USDT", "buy", 1.0)
+        other = User(username='other')
+        db.session.add(other)
+        db.session.commit()
+        self.connect(other, "paper")
+        PaperExchange.engine.create_order(other.id, "BTC/USDT", "market", "buy", 1.0)
+
+        report = ExchangeSyncService.run()
+        self.assertEqual((report["accounts"], report["trades"]), (2, 1))
+        self.assertEqual(Transaction.query.filter_by(user_id=self.user.id).count(), 1)
+        self.assertEqual(Transaction.query.filter_by(user_id=other.id, strategy="exchange_sync").count(), 1)
+
+    def test_per_market_exchanges_and_failures(self):
+        self.connect(self.user, "permarket")
+        PaperExchange.engine.create_order(self.user.id, "BTC/USDT", "market", "buy", 1.0)
+        PaperExchange.engine.create_order(self.user.id, "ETH/USDT", "market", "buy", 3.0)
+        broken = ExchangeCredential(user_id=self.user.id, exchange_id="nope",
+                                    api_key_enc=SecurityManager.encrypt("k"), api_secret_enc=SecurityManager.encrypt("s"))
+        db.session.add(broken)
+        db.session.commit()
+        report = ExchangeSyncService.run()
+        self.assertEqual((report["trades"], report["failed"]), (2, 1))
+        self.assertEqual({t.symbol for t in Transaction.query}, {"BTC/USDT", "ETH/USDT"})
+
+    def test_cursor_does_not_pass_a_truncated_pair(self):
+        self.connect(self.user, "permarket")
+        base = int(time.time() * 1000) - 60_000
+        for offset, symbol in ((0, "BTC/USDT"), (1000, "BTC/USDT"), (2000, "BTC/USDT"), (3000, "ETH/USDT")):
+            PaperExchange.engine.tick(symbol, 100.0 if symbol == "BTC/USDT" else 10.0, timestamp=base + offset)
+            PaperExchange.engine.create_order(self.user.id, symbol, "market", "buy", 1.0)
+        with mock.patch.object(ExchangeSyncService, 'PAGE_SIZE', 2), mock.patch.object(ExchangeSyncService, 'MAX_PAGES', 1):
+            self.assertEqual(ExchangeSyncService.run()["trades"], 3)
+            self.assertEqual(ExchangeCredential.query.one().trades_since, base + 1000)
+            self.assertEqual(ExchangeSyncService.run()["trades"], 1)
+        self.assertEqual(Transaction.query.count(), 4)
+
+
+    def test_fills_booked_by_another_process_roll_back(self):
+        credential = self.connect(self.user, "paper")
+        PaperExchange.engine.create_order(self.user.id, "BTC/USDT", "market", "buy", 1.0)
+        trade_id = PaperExchange.engine.my_trades(self.user.id)[0]["id"]
+        # The scheduler commits the same fill while this run is fetching
+        db.session.add(Transaction(user_id=self.user.id, symbol="BTC/USDT", type="buy", quantity=1.0,
+                                   price=100.0, strategy="exchange_sync", exchange_trade_id=str(trade_id)))
+        db.session.commit()
+        with mock.patch.object(ExchangeSyncService, 'booked', return_value=(set(), set())):
+            report = ExchangeSyncService.run()
+        self.assertTrue(report["conflict"])
+        self.assertEqual(Transaction.query.count(), 1)
+        self.assertIsNone(credential.trades_since)
+        self.assertEqual(ExchangeSyncService.run()["trades"], 0) # deduplicated on the next run
+
+    @mock.patch('crypto_portfolio.core.exchange_sync.socketio')
+    def test_manual_sync_runs_in_the_background(self, socketio):
+        self.connect(self.user, "paper")
+        PaperExchange.engine.create_order(self.user.id, "BTC/USDT", "market", "buy", 1.0)
+        report = ExchangeSyncService.run_in_background(self.user.id).result(timeout=5)
+        self.assertEqual(report["trades"], 1)
+        socketio.emit.assert_called_once_with('exchange_sync', report, to=self.user.id)
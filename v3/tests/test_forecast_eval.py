@@ -0,0 +1,74 @@
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+import numpy as np
+from sqlalchemy import event
+from crypto_portfolio.extensions import db
+from crypto_portfolio.core.models import Asset, ForecastEvaluation
+from crypto_portfolio.core.forecast_eval import WalkForwardEvaluator, ForecastEvaluationService, forecast_weights
+from crypto_portfolio.core.ai_predictor import AIPredictor
+from crypto_portfolio.core.price_history import PriceHistoryStore
+from tests.helpers import DBTestCase
+
+def naive_metrics(series, window, h, degree=2):
+    errors, pct, hits, moved = [], [], 0, 0
+    for end in range(window, len(series) - h + 1):
+        hist = series[end - window:end]
+        f = np.polyval(np.polyfit(np.arange(window), hist, degree), window - 1 + h)
+        actual, base = series[end - 1 + h], hist[-1]
+        errors.append(abs(f - actual))
+        pct.append(abs(f - actual) / abs(actual) * 100)
+        if actual != base:
+            moved += 1
+            hits += np.sign(f - base) == np.sign(actual - base)
+    return len(errors), np.mean(errors), np.mean(pct), hits / moved
+
+class TestWalkForward(unittest.TestCase):
+    def test_weights_match_polyfit(self):
+        y = np.random.default_rng(0).normal(size=20).cumsum()
+        w = forecast_weights(20, [1, 5])
+        expected = np.polyval(np.polyfit(np.arange(20), y, 2), [20, 24])
+        np.testing.assert_allclose(w @ y, expected)
+
+    def test_matches_naive_replay(self):
+        rng = np.random.default_rng(4)
+        prices = 100 * np.exp(rng.normal(0, 0.02, size=(120, 3)).cumsum(axis=0))
+        prices[:40, 2] = np.nan # younger coin: only its complete windows count
+        results = WalkForwardEvaluator.evaluate(prices, window=20, horizons=(1, 7))
+        for j in range(3):
+            series = prices[:, j][np.isfinite(prices[:, j])]
+            for k, h in enumerate((1, 7)):
+                n, mae, mape, direction = naive_metrics(series, 20, h)
+                got = results[j][k]
+                self.assertEqual(got["samples"], n)
+                self.assertAlmostEqual(got["mae"], mae, places=8)
+                self.assertAlmostEqual(got["mape"], mape, places=8)
+                self.assertAlmostEqual(got["directional_accuracy"], direction)
+
+    def test_short_history(self):
+        self.assertEqual(WalkForwardEvaluator.evaluate(np.arange(10.0), window=30), [[None, None, None]])
+
+class TestForecastEvaluationService(DBTestCase):
+    def test_run_and_serve_confidence(self):
+        start = date.today() - timedelta(days=99)
+        # A steady uptrend: every forecast gets the direction right
+        PriceHistoryStore.store('bitcoin', [(start + timedelta(days=i), 100.0 + i) for i in range(100)])
+        db.session.add(Asset(user_id=self.user.id, symbol='BTC', coin_id='bitcoin', quantity=1.0))
+        db.session.commit()
+
+        self.assertEqual(ForecastEvaluationService.run(refresh_prices=False), 3)
+        self.assertEqual(ForecastEvaluationService.run(refresh_prices=False), 3) # upserts
+        self.assertEqual(ForecastEvaluation.query.count(), 3)
+        self.assertEqual(ForecastEvaluationService.last_run(), date.today())
+
+        evaluation = ForecastEvaluationService.lookup('bitcoin', horizon=7)
+        self.assertEqual(evaluation["confidence"], 100)
+        self.assertEqual(evaluation["samples"], 100 - 30 - 7 + 1)
+        self.assertIsNone(ForecastEvaluationService.lookup('ethereum'))
+
+        AIPredictor.invalidate()
+        history = [[1700000000000 + i * 86400000, 100.0 + i] for i in range(30)]
+        with mock.patch('crypto_portfolio.core.ai_predictor.CoinGeckoAPI.get_coin_history', return_value=history):
+            prediction = AIPredictor.predict_future('bitcoin')
+        self.assertEqual(prediction["confidence"], 100)
+        self.assertAlmostEqual(prediction["evaluation"]["mae"], 0.0, places=6)
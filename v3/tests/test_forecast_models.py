@@ -0,0 +1,83 @@
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+import numpy as np
+from crypto_portfolio.extensions import db
+from crypto_portfolio.core.models import Asset, ForecastModelChoice
+from crypto_portfolio.core.forecast_models import (
+    MODEL_ZOO, ModelSelector, ModelSelectionService, HoltWintersModel, AutoRegressiveModel, PolynomialModel,
+    create_model
+)
+from crypto_portfolio.core.ai_predictor import AIPredictor
+from crypto_portfolio.core.price_history import PriceHistoryStore
+from tests.helpers import DBTestCase
+
+class TestForecastModels(unittest.TestCase):
+    def test_every_model_forecasts_the_horizon(self):
+        prices = 100 * np.exp(np.random.default_rng(2).normal(0, 0.02, 120).cumsum())
+        for key in MODEL_ZOO:
+            f = create_model(key).fit(prices).forecast(7)
+            self.assertEqual(f.shape, (7,), key)
+            self.assertTrue(np.isfinite(f).all(), key)
+        with self.assertRaises(ValueError):
+            create_model('lstm')
+
+    def test_polynomial_matches_polyfit(self):
+        y = np.random.default_rng(3).normal(size=40).cumsum()
+        f = PolynomialModel(2, window=30).fit(y).forecast(5)
+        np.testing.assert_allclose(f, np.polyval(np.polyfit(np.arange(30), y[-30:], 2), np.arange(30, 35)))
+
+    def test_holt_follows_a_line(self):
+        line = 50.0 + 2.0 * np.arange(60)
+        f = HoltWintersModel(alpha=0.5, beta=0.5, phi=1.0).fit(line).forecast(3)
+        np.testing.assert_allclose(f, 50.0 + 2.0 * np.arange(60, 63), rtol=1e-6)
+
+    def test_ar_recovers_constant_growth(self):
+        prices = 100 * 1.01 ** np.arange(100)
+        f = AutoRegressiveModel(1).fit(prices).forecast(4)
+        np.testing.assert_allclose(f, 100 * 1.01 ** np.arange(100, 104), rtol=1e-6)
+
+    def test_selection_picks_the_matching_model(self):
+        t = np.arange(200.0)
+        seasonal = 100 + 0.2 * t + 5 * np.sin(2 * np.pi * t / 7)
+        result = ModelSelector.cross_validate(seasonal, list(MODEL_ZOO))
+        # Only the models that can represent the weekly cycle compete
+        self.assertIn(result["best"], ("holt_winters", "ar7"))
+        for key in ("poly1", "poly2", "holt", "ar1"):
+            self.assertLess(result["scores"]["holt_winters"]["mape"], result["scores"][key]["mape"])
+        self.assertEqual(set(result["scores"]), set(MODEL_ZOO))
+        # Serial and chunked selection agree
+        matrix = np.column_stack([seasonal, 100 + 0.2 * t])
+        self.assertEqual(ModelSelector.select(matrix, chunk=1)[0], result)
+        self.assertIsNone(ModelSelector.cross_validate(np.arange(20.0), list(MODEL_ZOO)))
+
+class TestModelSelectionService(DBTestCase):
+    def test_run_and_serve_selected_model(self):
+        start = date.today() - timedelta(days=199)
+        PriceHistoryStore.store('bitcoin', [(start + timedelta(days=i), 100.0 * 1.01 ** i) for i in range(200)])
+        db.session.add(Asset(user_id=self.user.id, symbol='BTC', coin_id='bitcoin', quantity=1.0))
+        db.session.commit()
+
+        self.assertEqual(ModelSelectionService.run(refresh_prices=False), 1)
+        self.assertEqual(ModelSelectionService.run(refresh_prices=False), 1) # upserts
+        self.assertEqual(ForecastModelChoice.query.count(), 1)
+        self.assertEqual(ModelSelectionService.last_run(), date.today())
+        choice = ModelSelectionService.best('bitcoin')
+        self.assertTrue(choice["model"].startswith("ar")) # exact geometric growth
+        self.assertEqual(choice["directional_accuracy"], 1.0)
+        self.assertIsNone(ModelSelectionService.best('ethereum'))
+
+        AIPredictor.invalidate()
+        history = [[1700000000000 + i * 86400000, 100.0 * 1.01 ** i] for i in range(91)]
+        with mock.patch('crypto_portfolio.core.ai_predictor.CoinGeckoAPI.get_coin_history',
+                        return_value=history) as download:
+            prediction = AIPredictor.predict_future('bitcoin')
+            self.assertEqual(download.call_args.kwargs["days"], 90) # the AR window, not the 30 shown days
+        self.assertEqual(prediction["model"], choice["model"])
+        self.assertEqual(prediction["confidence"], 100)
+        self.assertEqual(len(prediction["historical_prices"]), 31)
+        self.assertAlmostEqual(prediction["predicted_prices"][0], 100.0 * 1.01 ** 91, places=4)
+
+        batch = AIPredictor.predict_batch(['bitcoin'], refresh_prices=False)
+        self.assertEqual(batch['bitcoin']["model"], choice["model"])
+        np.testing.assert_allclose(batch['bitcoin']["predicted_prices"], 100.0 * 1.01 ** np.arange(200, 207), rtol=1e-6)
@@ -0,0 +1,63 @@
+import unittest
+from datetime import date
+from unittest import mock
+import numpy as np
+from crypto_portfolio.core.goals import GoalProjection, GoalProjectionService
+from crypto_portfolio.core.models import Asset, Goal
+from crypto_portfolio.extensions import db
+from tests.helpers import DBTestCase
+
+class TestGoalProjection(unittest.TestCase):
+    def test_deterministic_savings(self):
+        # No risk and no return: 1000 + 12 * 100 = 2200 after a year
+        result = GoalProjection.project([1000.0, 1000.0], [2000.0, 3000.0], [12, 12], [100.0, 100.0], 0.0, 0.0, n_paths=10)
+        np.testing.assert_allclose(result["probability"], [1.0, 0.0])
+        np.testing.assert_allclose(result["median"], [2200.0, 2200.0])
+        np.testing.assert_allclose(result["required_contribution"], [1000 / 12, 2000 / 12])
+
+    def test_required_contribution_reaches_probability(self):
+        args = dict(current=[500.0], target=[5000.0], months=[36], mu=0.005, sigma=0.08, n_paths=4000)
+        required = GoalProjection.project(contribution=[0.0], **args)["required_contribution"][0]
+        again = GoalProjection.project(contribution=[required], **args)
+        self.assertGreaterEqual(again["probability"][0], GoalProjection.REQUIRED_PROBABILITY)
+
+    def test_past_deadline(self):
+        self.assertEqual(GoalProjection.months_until("2020-01-01", date(2024, 1, 1)), 0)
+        self.assertEqual(GoalProjection.months_until("2025-01-15", date(2024, 1, 1)), 12)
+        result = GoalProjection.project([100.0], [200.0], [0], [0.0], 0.0, 0.1, n_paths=10)
+        self.assertEqual(result["probability"][0], 0.0)
+        self.assertTrue(np.isinf(result["required_contribution"][0]))
+
+class TestGoalProjectionService(DBTestCase):
+    def test_contribution_split_and_cache(self):
+        self.user.monthly_contribution = 300.0
+        for title, target in (("a", 2000.0), ("b", 4000.0)):
+            db.session.add(Goal(user_id=self.user.id, title=title, target_amount=target,
+                                current_amount=1000.0, deadline="2031-01-01", status="active"))
+        db.session.commit()
+
+        today = date(2026, 1, 1)
+        first = GoalProjectionService.for_user(self.user, refresh_prices=False, today=today)
+        shares = sorted(p["monthly_contribution"] for p in first.values())
+        self.assertEqual(shares, [75.0, 225.0])
+        self.assertIs(GoalProjectionService.for_user(self.user, refresh_prices=False, today=today), first)
+
+        self.user.monthly_contribution = 600.0
+        db.session.commit()
+        changed = GoalProjectionService.for_user(self.user, refresh_prices=False, today=today)
+        self.assertIsNot(changed, first)
+
+    def test_holdings_without_history_count_as_cash(self):
+        assets = [Asset(user_id=self.user.id, symbol='BTC', coin_id='bitcoin', quantity=1.0, buy_price=100.0),
+                  Asset(user_id=self.user.id, symbol='XYZ', coin_id='unknown-coin', quantity=1.0, buy_price=100.0)]
+        prices = np.array([[100.0 * 1.01 ** t, np.nan] for t in range(30)])
+        with mock.patch('crypto_portfolio.core.goals.PriceHistoryStore.matrix', return_value=(None, prices)):
+            mixed, mixed_vol = GoalProjectionService.portfolio_returns(assets)
+            alone, alone_vol = GoalProjectionService.portfolio_returns(assets[:1])
+        # Bitcoin is worth 100 * 1.01^29 against 100 of cash
+        weight = 1.01 ** 29 / (1.01 ** 29 + 1)
+        self.assertAlmostEqual(mixed, weight * alone)
+        self.assertAlmostEqual(mixed_vol, weight * alone_vol)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from unittest import mock
+from datetime import date, timedelta
+import numpy as np
+from crypto_portfolio.core.indicators import Indicators, IndicatorService
+from crypto_portfolio.core.price_history import PriceHistoryStore
+from tests.helpers import DBTestCase
+
+def naive_ewm(x, alpha):
+    out = [x[0]]
+    for v in x[1:]:
+        out.append(alpha * v + (1 - alpha) * out[-1])
+    return np.array(out)
+
+class TestIndicators(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        self.prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.03, size=(400, 3)), axis=0))
+
+    def test_sma_and_std_match_windows(self):
+        sma = Indicators.sma(self.prices, 20)
+        std = Indicators.rolling_std(self.prices, 20)
+        self.assertTrue(np.isnan(sma[18]).all())
+        for t in (19, 200, 399):
+            window = self.prices[t - 19:t + 1]
+            np.testing.assert_allclose(sma[t], window.mean(axis=0))
+            np.testing.assert_allclose(std[t], window.std(axis=0), rtol=1e-8)
+
+    def test_ewm_matches_recursion_across_blocks(self):
+        # alpha 0.9 gives blocks of ~21 rows, so the carry between blocks is exercised
+        for alpha in (0.9, 2 / 27, 1 / 14):
+            out = Indicators.ewm(self.prices, alpha)
+            for j in range(3):
+                np.testing.assert_allclose(out[:, j], naive_ewm(self.prices[:, j], alpha), rtol=1e-10)
+
+    def test_leading_nan_columns_start_late(self):
+        prices = self.prices.copy()
+        prices[:50, 1] = np.nan
+        out = Indicators.ema(prices, 10)
+        self.assertTrue(np.isnan(out[:50, 1]).all())
+        np.testing.assert_allclose(out[50:, 1], naive_ewm(prices[50:, 1], 2 / 11), rtol=1e-10)
+        np.testing.assert_allclose(out[:, 0], naive_ewm(prices[:, 0], 2 / 11), rtol=1e-10)
+
+    def test_rsi_bounds_and_reference(self):
+        rsi = Indicators.rsi(self.prices, 14)
+        valid = rsi[~np.isnan(rsi)]
+        self.assertTrue(((valid >= 0) & (valid <= 100)).all())
+        delta = np.diff(self.prices[:, 0])
+        gain = naive_ewm(np.clip(delta, 0, None), 1 / 14)
+        loss = naive_ewm(np.clip(-delta, 0, None), 1 / 14)
+        self.assertAlmostEqual(rsi[-1, 0], 100 - 100 / (1 + gain[-1] / loss[-1]), places=8)
+        self.assertTrue(np.all(Indicators.rsi(np.arange(1.0, 60.0), 14)[20:] == 100))
+
+    def test_macd_bollinger_atr(self):
+        macd = Indicators.macd(self.prices)
+        np.testing.assert_allclose(macd["histogram"], macd["macd"] - macd["signal"])
+        bands = Indicators.bollinger(self.prices, 20, 2.0)
+        pb = bands["percent_b"][-1]
+        np.testing.assert_allclose(self.prices[-1], bands["lower"][-1] + pb * (bands["upper"][-1] - bands["lower"][-1]))
+        atr = Indicators.atr(self.prices[:, 0], 14)
+        self.assertTrue(np.isnan(atr[:14]).all())
+        expected = naive_ewm(np.abs(np.diff(self.prices[:, 0])), 1 / 14)[-1]
+        self.assertAlmostEqual(atr[-1, 0], expected, places=8)
+
+    def test_parse(self):
+        self.assertEqual(Indicators.parse("macd"), ("macd", (12, 26, 9)))
+        self.assertEqual(Indicators.parse("Bollinger:10"), ("bollinger", (10, 2.0)))
+        with self.assertRaises(ValueError):
+            Indicators.parse("vwap")
+        with self.assertRaises(ValueError):
+            Indicators.parse("sma:5,6")
+
+class TestIndicatorService(DBTestCase):
+    def setUp(self):
+        super().setUp()
+        IndicatorService._cache.clear()
+        start = date.today() - timedelta(days=99)
+        for coin, base in (('bitcoin', 30000.0), ('ethereum', 2000.0)):
+            PriceHistoryStore.store(coin, [(start + timedelta(days=i), base + 10 * i) for i in range(100)])
+
+    def test_memoized_until_new_price(self):
+        specs = [Indicators.parse("sma:10"), Indicators.parse("rsi")]
+        with mock.patch('crypto_portfolio.core.indicators.Indicators.compute', wraps=Indicators.compute) as compute:
+            first = IndicatorService.for_coins(['bitcoin', 'ethereum'], specs, refresh_prices=False)
+            # one batched call per indicator covers both coins
+            self.assertEqual(compute.call_count, 2)
+            self.assertEqual(compute.call_args[0][1].shape[1], 2)
+        self.assertEqual(len(first['bitcoin']['dates']), 100)
+        self.assertAlmostEqual(first['bitcoin']['sma_10'][-1], 30000 + 10 * 94.5)
+        self.assertEqual(first['ethereum']['rsi_14'][-1], 100.0)
+
+        with mock.patch('crypto_portfolio.core.indicators.Indicators.compute') as compute:
+            IndicatorService.for_coins(['bitcoin'], specs, refresh_prices=False)
+            compute.assert_not_called()
+
+        PriceHistoryStore.store('bitcoin', [(date.today() + timedelta(days=1), 40000.0)])
+        with mock.patch('crypto_portfolio.core.indicators.Indicators.compute', wraps=Indicators.compute) as compute:
+            latest = IndicatorService.latest(['bitcoin', 'ethereum'], specs, refresh_prices=False)
+            # only the coin with new data is recomputed, one call per indicator
+            self.assertEqual(compute.call_count, 2)
+            self.assertEqual(compute.call_args[0][1].shape[1], 1)
+        self.assertGreater(latest['bitcoin']['sma_10'], first['bitcoin']['sma_10'][-1])
+
+    def test_windows_share_a_bounded_bucket(self):
+        specs = [Indicators.parse("sma:10")]
+        full = IndicatorService.for_coins(['bitcoin'], specs, days=60, refresh_prices=False)
+        with mock.patch('crypto_portfolio.core.indicators.Indicators.compute') as compute:
+            short = IndicatorService.for_coins(['bitcoin'], specs, days=40, refresh_prices=False)
+            compute.assert_not_called()
+        # both windows round up to 90 days and are trimmed on the way out
+        self.assertEqual(len(full['bitcoin']['dates']), 61)
+        self.assertEqual(len(short['bitcoin']['dates']), 41)
+        self.assertEqual(short['bitcoin']['sma_10'], full['bitcoin']['sma_10'][-41:])
+
+        with mock.patch.object(IndicatorService, 'CACHE_SIZE', 2):
+            for window in (5, 10, 15):
+                IndicatorService.for_coins(['bitcoin'], [Indicators.parse(f"ema:{window}")], refresh_prices=False)
+        self.assertEqual([k[1:] for k in IndicatorService._cache],
+                         [('ema', (10,), 365), ('ema', (15,), 365)])
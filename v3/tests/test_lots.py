@@ -0,0 +1,93 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from crypto_portfolio.extensions import db
+from crypto_portfolio.core.lots import LotQueue, LotService
+from crypto_portfolio.core.models import Transaction
+from tests.helpers import DBTestCase
+
+class TestLotQueue(unittest.TestCase):
+    def fill(self, method):
+        queue = LotQueue(method, capacity=2)
+        for qty, price in ((1.0, 100.0), (2.0, 200.0), (1.0, 400.0)):
+            queue.buy(qty, price)
+        return queue
+
+    def test_methods(self):
+        self.assertEqual(self.fill('fifo').sell(2.0), (2.0, 300.0))
+        self.assertEqual(self.fill('lifo').sell(2.0), (2.0, 600.0))
+        matched, basis = self.fill('average').sell(2.0)
+        self.assertAlmostEqual(basis, 2 * 900.0 / 4)
+
+    def test_oversell_and_regrowth(self):
+        queue = self.fill('fifo')
+        self.assertEqual(queue.sell(10.0), (4.0, 900.0))
+        self.assertEqual(queue.lots(), [])
+        for i in range(50):
+            queue.buy(1.0, float(i))
+            queue.sell(0.5)
+        self.assertAlmostEqual(queue.quantity, 25.0)
+        self.assertLessEqual(len(queue.qty), 64)
+
+class TestLotService(DBTestCase):
+    def add(self, kind, qty, price, day):
+        txn = Transaction(user_id=self.user.id, symbol='BTC', type=kind, quantity=qty, price=price,
+                          date=datetime(2024, 1, 1) + timedelta(days=day))
+        db.session.add(txn)
+        LotService.record(txn)
+        db.session.commit()
+        return txn
+
+    def setUp(self):
+        super().setUp()
+        LotService._books.clear()
+
+    def test_incremental_and_backdated(self):
+        self.add('buy', 1.0, 100.0, 0)
+        self.add('buy', 1.0, 200.0, 1)
+        sell = self.add('sell', 1.0, 300.0, 2)
+        self.assertEqual(sell.profit_loss, 200.0) # FIFO: sold the 100 lot
+
+        # A buy dated before the sale changes which lot was sold
+        self.add('buy', 1.0, 50.0, -1)
+        self.assertEqual(db.session.get(Transaction, sell.id).profit_loss, 250.0)
+
+        positions = LotService.book(self.user.id, 'lifo').positions({'BTC': 400.0})
+        self.assertEqual(positions['BTC']['realized_pl'], 100.0)
+        self.assertEqual(positions['BTC']['unrealized_pl'], 2 * 400.0 - 150.0)
+
+    def test_rollback_and_foreign_rows_drop_the_cached_book(self):
+        self.add('buy', 1.0, 100.0, 0)
+        book = LotService.book(self.user.id)
+        self.assertIs(LotService.book(self.user.id), book)
+
+        txn = Transaction(user_id=self.user.id, symbol='BTC', type='buy', quantity=5.0, price=1.0,
+                          date=datetime(2024, 1, 2))
+        db.session.add(txn)
+        LotService.record(txn)
+        db.session.rollback()
+        self.assertNotIn((self.user.id, 'fifo'), LotService._books)
+        self.assertEqual(LotService.book(self.user.id).positions()['BTC']['quantity'], 1.0)
+
+        # Written without record(), as by another worker
+        db.session.add(Transaction(user_id=self.user.id, symbol='BTC', type='buy', quantity=2.0, price=1.0,
+                                   date=datetime(2024, 1, 3)))
+        db.session.commit()
+        self.assertEqual(LotService.book(self.user.id).positions()['BTC']['quantity'], 3.0)
+
+    def test_bulk_records_count_once_per_transaction(self):
+        self.add('buy', 1.0, 100.0, 0)
+        LotService.book(self.user.id)
+        with mock.patch.object(LotService, '_count', wraps=LotService._count) as count:
+            for day in range(1, 6):
+                txn = Transaction(user_id=self.user.id, symbol='BTC', type='sell', quantity=0.1, price=200.0,
+                                  date=datetime(2024, 1, 1) + timedelta(days=day))
+                db.session.add(txn)
+                LotService.record(txn)
+            db.session.commit()
+            self.assertEqual(count.call_count, 1)
+        self.assertAlmostEqual(txn.profit_loss, 10.0)
+        self.assertAlmostEqual(LotService.book(self.user.id).positions()['BTC']['quantity'], 0.5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from unittest import mock
+import numpy as np
+from crypto_portfolio.core.monte_carlo import MonteCarloEngine, MonteCarloService
+
+class TestMonteCarloEngine(unittest.TestCase):
+    def test_terminal_median_matches_gbm(self):
+        mu, sigma, days = 0.0005, 0.02, 250
+        result = MonteCarloEngine.simulate([1000.0], [mu], [[sigma ** 2]], horizon_days=days, n_paths=20000, seed=1)
+        # Median of a lognormal terminal value is V0 * exp(mu * T)
+        self.assertAlmostEqual(result.terminal[50] / (1000 * np.exp(mu * days)), 1.0, delta=0.02)
+        self.assertLess(result.terminal[5], result.terminal[50])
+        self.assertEqual(len(result.bands[50]), len(result.checkpoints))
+
+    def test_results_do_not_depend_on_chunking(self):
+        args = dict(values=[500.0, 500.0], mu=[0.0, 0.0], cov=[[4e-4, 3e-4], [3e-4, 4e-4]], horizon_days=100, n_paths=3000, seed=3)
+        original = MonteCarloEngine.MAX_CHUNK_ELEMENTS
+        try:
+            MonteCarloEngine.MAX_CHUNK_ELEMENTS = 100 * 2 * 500 # forces 6 chunks
+            small = MonteCarloEngine.simulate(**args)
+            MonteCarloEngine.MAX_CHUNK_ELEMENTS = 100 * 2 * 1 # one block per chunk
+            tiny = MonteCarloEngine.simulate(**args)
+        finally:
+            MonteCarloEngine.MAX_CHUNK_ELEMENTS = original
+        whole = MonteCarloEngine.simulate(**args)
+        self.assertEqual(small.terminal, whole.terminal)
+        self.assertEqual(tiny.bands, whole.bands)
+
+    def test_time_to_target(self):
+        result = MonteCarloEngine.simulate([100.0], [0.01], [[1e-6]], horizon_days=100, n_paths=500, target=150.0, seed=0)
+        # ln(1.5) / 0.01 ~ 40.5 days with almost no noise
+        self.assertEqual(result.probability_of_target, 1.0)
+        self.assertIn(result.time_to_target[50], (40, 41, 42))
+
+        never = MonteCarloEngine.simulate([100.0], [-0.01], [[1e-6]], horizon_days=50, n_paths=200, target=150.0, seed=0)
+        self.assertEqual(never.probability_of_target, 0.0)
+        self.assertIsNone(never.time_to_target[50])
+
+    def test_smallest_holdings_beyond_the_cap_are_held_constant(self):
+        prices = np.exp(np.cumsum(np.random.default_rng(0).normal(0, 0.01, (60, 2)), axis=0))
+        with mock.patch.object(MonteCarloService, 'MAX_ASSETS', 2), \
+             mock.patch('crypto_portfolio.core.monte_carlo.PriceHistoryStore.refresh'), \
+             mock.patch('crypto_portfolio.core.monte_carlo.PriceHistoryStore.matrix',
+                        return_value=(None, prices)) as matrix:
+            result = MonteCarloService._run({'a': 300.0, 'b': 10.0, 'c': 200.0}, 0.0, n_paths=100, horizon_days=5, seed=0)
+        self.assertEqual(matrix.call_args[0][0], ['a', 'c'])
+        self.assertAlmostEqual(result.initial_value, 510.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+import numpy as np
+from crypto_portfolio.core.optimizer import MeanVarianceOptimizer
+
+class TestMeanVarianceOptimizer(unittest.TestCase):
+    def test_simplex_projection(self):
+        v = np.array([[0.5, 0.5, 0.5], [2.0, -1.0, 0.0], [0.2, 0.3, 0.5]])
+        w = MeanVarianceOptimizer.project_simplex(v)
+        np.testing.assert_allclose(w.sum(axis=1), 1.0)
+        self.assertTrue((w >= 0).all())
+        np.testing.assert_allclose(w[1], [1.0, 0.0, 0.0])
+        np.testing.assert_allclose(w[2], v[2])
+
+    def test_min_variance_matches_closed_form(self):
+        cov = np.array([[0.04, 0.01], [0.01, 0.09]])
+        result = MeanVarianceOptimizer.frontier(np.array([0.1, 0.2]), cov, points=20)
+        inv = np.linalg.inv(cov)
+        expected = inv.sum(axis=1) / inv.sum()
+        np.testing.assert_allclose(result["weights"][result["min_variance"]], expected, atol=1e-6)
+
+    def test_frontier_is_monotonic_and_long_only(self):
+        rng = np.random.default_rng(0)
+        returns = rng.normal(0.0005, 0.02, size=(300, 50))
+        mu = returns.mean(axis=0) * 365
+        cov = np.cov(returns, rowvar=False) * 365
+        result = MeanVarianceOptimizer.frontier(mu, cov, points=30)
+        self.assertTrue((result["weights"] >= 0).all())
+        np.testing.assert_allclose(result["weights"].sum(axis=1), 1.0)
+        self.assertTrue((np.diff(result["returns"]) >= -1e-9).all())
+
+if __name__ == '__main__':
+    unittest.main()
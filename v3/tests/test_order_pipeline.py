@@ -0,0 +1,121 @@
+import asyncio
+import time
+import ccxt
+import ccxt.async_support as ccxt_async
+from crypto_portfolio.extensions import db
+from crypto_portfolio.core.models import Asset, ExchangeCredential, Transaction
+from crypto_portfolio.core.order_pipeline import OrderPipeline
+from crypto_portfolio.core.paper_exchange import PaperExchange, PaperMatchingEngine
+from crypto_portfolio.core.rebalance import RebalanceService
+from crypto_portfolio.core.trading_engine import TradingEngine
+from crypto_portfolio.utils.security import SecurityManager
+from tests.helpers import DBTestCase
+
+LATENCY = 0.05
+
+class SlowAsyncExchange(ccxt_async.Exchange):
+    def describe(self):
+        return self.deep_extend(super().describe(), {"id": "slow", "has": {"fetchCurrencies": False}})
+
+    async def fetch_markets(self, params={}):
+        return [{"id": f"{b}USDT", "symbol": f"{b}/USDT", "base": b, "quote": "USDT", "baseId": b, "quoteId": "USDT",
+                 "active": True, "type": "spot", "spot": True, "precision": {}, "limits": {}}
+                for b in ("BTC", "ETH", "SOL")]
+
+    async def create_order(self, symbol, type, side, amount, price=None, params={}):
+        await asyncio.sleep(LATENCY)
+        if symbol not in self.markets:
+            raise ccxt.BadSymbol(symbol)
+        return {"id": f"{side}-{symbol}", "average": 10.0, "filled": amount, "status": "closed"}
+
+class TestOrderPipeline(DBTestCase):
+    def setUp(self):
+        super().setUp()
+        TradingEngine.register_exchange("slow", SlowAsyncExchange)
+        TradingEngine.invalidate()
+
+    def tearDown(self):
+        TradingEngine.CUSTOM_EXCHANGES.pop("slow", None)
+        TradingEngine.invalidate()
+        OrderPipeline.run(OrderPipeline.close())
+        PaperExchange.engine = PaperMatchingEngine()
+        super().tearDown()
+
+    def connect(self, exchange_id):
+        db.session.add(ExchangeCredential(user_id=self.user.id, exchange_id=exchange_id,
+                                          api_key_enc=SecurityManager.encrypt("key"),
+                                          api_secret_enc=SecurityManager.encrypt("secret")))
+        db.session.commit()
+
+    def test_orders_run_concurrently_and_are_booked_together(self):
+        self.connect("slow")
+        orders = [{"symbol": s, "side": "buy", "amount": 1.0, "price": None} for s in ("BTC/USDT", "ETH/USDT", "SOL/USDT")] * 4
+        start = time.perf_counter()
+        with self.assertNoCommitsBeyond(1):
+            results = OrderPipeline.execute(self.user, [orders])
+        self.assertLess(time.perf_counter() - start, len(orders) * LATENCY / 2)
+        self.assertTrue(all(r.status == "placed" and r.latency >= LATENCY * 0.9 for r in results[0]))
+        self.assertEqual(Transaction.query.filter_by(user_id=self.user.id, strategy='market_auto').count(), 12)
+
+    def test_async_clients_are_pooled(self):
+        self.connect("slow")
+        credential = self.user.exchanges.first()
+        first = OrderPipeline.run(OrderPipeline._client(credential))
+        self.assertIs(OrderPipeline.run(OrderPipeline._client(credential)), first)
+        credential.api_key_enc = SecurityManager.encrypt("rotated")
+        self.assertIsNot(OrderPipeline.run(OrderPipeline._client(credential)), first)
+
+    def test_later_phases_are_skipped_after_a_failure(self):
+        self.connect("slow")
+        sells = [{"symbol": "BTC/USDT", "side": "sell", "amount": 1.0}, {"symbol": "NOPE/USDT", "side": "sell", "amount": 1.0}]
+        buys = [{"symbol": "ETH/USDT", "side": "buy", "amount": 1.0}]
+        results = OrderPipeline.execute(self.user, [sells, buys])
+        self.assertEqual([r.status for r in results[0]], ["placed", "failed"])
+        self.assertIn("NOPE/USDT", results[0][1].error)
+        self.assertEqual([r.status for r in results[1]], ["skipped"])
+        self.assertEqual(Transaction.query.count(), 1)
+
+    def test_resting_limit_orders_are_not_booked(self):
+        self.connect("paper")
+        PaperExchange.engine.tick("ETH/USDT", 2500.0)
+        orders = [{"symbol": "ETH/USDT", "side": "buy", "amount": 1.0, "price": 2400.0},
+                  {"symbol": "ETH/USDT", "side": "buy", "amount": 1.0, "price": 2600.0}]
+        results = OrderPipeline.execute(self.user, [orders])
+        self.assertEqual([r.status for r in results[0]], ["pending", "placed"])
+        self.assertEqual([(t.quantity, t.price) for t in Transaction.query], [(1.0, 2500.0)])
+
+    def test_rebalance_on_paper_exchange(self):
+        self.connect("paper")
+        PaperExchange.engine.tick("BTC/USDT", 50000.0)
+        PaperExchange.engine.tick("ETH/USDT", 2500.0)
+        PaperExchange.engine.fund(self.user.id, "BTC", 0.2)
+        db.session.add(Asset(user_id=self.user.id, symbol='BTC', asset_type='crypto', coin_id='bitcoin',
+                             quantity=0.2, buy_price=40000.0))
+        db.session.add(Asset(user_id=self.user.id, symbol='ETH', asset_type='crypto', coin_id='ethereum',
+                             quantity=0.0, buy_price=2000.0))
+        db.session.add(Asset(user_id=self.user.id, symbol='AAPL', asset_type='stock', quantity=10.0, buy_price=150.0))
+        db.session.commit()
+        plan = RebalanceService.plan_for_user(self.user, {'BTC': 1, 'ETH': 1, 'AAPL': 0},
+                                              prices={'bitcoin': 50000.0, 'ethereum': 2500.0}, fee_rate=0.0)
+        results = RebalanceService.execute(self.user, plan)
+        by_symbol = {r["order"]["symbol"]: r for r in results}
+        self.assertEqual(by_symbol["BTC/USDT"]["status"], "placed")
+        self.assertEqual(by_symbol["ETH/USDT"]["status"], "placed")
+        self.assertEqual(by_symbol["AAPL/USDT"]["status"], "skipped")
+        # Only the BTC sale pays for ETH, not the skipped AAPL one
+        self.assertAlmostEqual(by_symbol["ETH/USDT"]["order"]["value"], by_symbol["BTC/USDT"]["order"]["value"])
+        self.assertGreater(PaperExchange.engine.balance(self.user.id)["ETH"][0], 0)
+
+    def assertNoCommitsBeyond(self, limit):
+        test = self
+        original = db.session.commit
+        calls = []
+
+        class Counter:
+            def __enter__(self):
+                db.session.commit = lambda: (calls.append(1), original())[1]
+
+            def __exit__(self, *exc):
+                db.session.commit = original
+                test.assertLessEqual(len(calls), limit)
+        return Counter()
@@ -0,0 +1,121 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+import ccxt
+from crypto_portfolio.core.paper_exchange import OrderBook, PaperMatchingEngine, PaperExchange, TickFeed
+from crypto_portfolio.core.trading_engine import TradingEngine
+from crypto_portfolio.utils.security import SecurityManager
+
+def limit(oid, side, price, amount=1.0):
+    return {"id": oid, "side": side, "price": price, "amount": amount, "remaining": amount, "status": "open"}
+
+class TestOrderBook(unittest.TestCase):
+    def test_price_then_time_priority(self):
+        book = OrderBook()
+        for order in (limit("a", "buy", 99), limit("b", "buy", 101), limit("c", "buy", 101), limit("d", "sell", 105)):
+            book.add(order)
+        self.assertEqual((book.best("buy"), book.best("sell")), (101, 105))
+        fills = book.crossing(100.0)
+        self.assertEqual([(o["id"], q) for o, q in fills], [("b", 1.0), ("c", 1.0)])
+        self.assertEqual(book.best("buy"), 99)
+
+    def test_volume_limits_fills_and_cancelled_orders_are_skipped(self):
+        book = OrderBook()
+        orders = [limit("a", "sell", 100, 2.0), limit("b", "sell", 100, 2.0), limit("c", "sell", 101)]
+        for order in orders:
+            book.add(order)
+        orders[0]["status"] = "canceled"
+        self.assertEqual([(o["id"], q) for o, q in book.crossing(101.0, volume=2.5)], [("b", 2.0), ("c", 0.5)])
+
+
+class TestPaperMatchingEngine(unittest.TestCase):
+    def setUp(self):
+        self.engine = PaperMatchingEngine()
+        self.engine.tick("BTC/USDT", 100.0)
+
+    def test_market_order_fills_with_slippage_and_fee(self):
+        order = self.engine.create_order("acct", "BTC/USDT", "market", "buy", 2.0)
+        price = 100.0 * (1 + PaperMatchingEngine.SLIPPAGE)
+        self.assertEqual(order["status"], "closed")
+        self.assertAlmostEqual(order["average"], price)
+        balance = self.engine.balance("acct")
+        self.assertAlmostEqual(balance["USDT"][0], 100_000 - 2 * price * (1 + PaperMatchingEngine.FEE_RATE))
+        self.assertEqual(balance["USDT"][1], 0.0)
+        self.assertEqual(balance["BTC"], (2.0, 0.0))
+
+    def test_resting_limit_orders_fill_on_ticks(self):
+        buy = self.engine.create_order("acct", "BTC/USDT", "limit", "buy", 1.0, 95.0)
+        self.assertEqual(buy["status"], "open")
+        self.assertAlmostEqual(self.engine.balance("acct")["USDT"][1], 95.0 * (1 + PaperMatchingEngine.FEE_RATE))
+        self.assertEqual(self.engine.tick("BTC/USDT", 96.0), [])
+        trades = self.engine.tick("BTC/USDT", 94.0, timestamp=1_000)
+        self.assertEqual(len(trades), 1)
+        self.assertEqual((trades[0]["price"], trades[0]["takerOrMaker"]), (95.0, "maker"))
+        self.assertEqual(buy["status"], "closed")
+        self.assertEqual(self.engine.balance("acct")["USDT"][1], 0.0)
+        self.assertEqual(self.engine.my_trades("acct", since=1_000), trades)
+
+        sell = self.engine.create_order("acct", "BTC/USDT", "limit", "sell", 1.0, 120.0)
+        self.assertEqual(self.engine.balance("acct")["BTC"], (0.0, 1.0))
+        self.engine.cancel_order("acct", sell["id"])
+        self.assertEqual(self.engine.balance("acct")["BTC"], (1.0, 0.0))
+        self.assertEqual(self.engine.tick("BTC/USDT", 130.0), [])
+
+    def test_rejects_unfunded_and_unknown(self):
+        with self.assertRaises(ccxt.InsufficientFunds):
+            self.engine.create_order("acct", "BTC/USDT", "market", "sell", 1.0)
+        with self.assertRaises(ccxt.BadSymbol):
+            self.engine.create_order("acct", "DOGE/USDT", "market", "buy", 1.0)
+
+    def test_replay_synthetic_ticks(self):
+        ticks = TickFeed.synthetic(["BTC/USDT", "ETH/USDT"], steps=500, volatility=0.01, seed=3)
+        self.assertEqual(len(ticks), 1000)
+        low = min(p for _, s, p in ticks if s == "BTC/USDT")
+        self.engine.create_order("acct", "BTC/USDT", "limit", "buy", 1.0, low + 1e-9)
+        self.assertEqual(self.engine.replay(ticks), 1)
+
+
+class TestPaperExchange(unittest.TestCase):
+    def setUp(self):
+        PaperExchange.engine = PaperMatchingEngine()
+        PaperExchange.engine.tick("ETH/USDT", 10.0)
+        TradingEngine.invalidate()
+
+    def tearDown(self):
+        PaperExchange.engine = PaperMatchingEngine()
+        TradingEngine.invalidate()
+
+    def test_trading_engine_targets_paper_venue(self):
+        credential = SimpleNamespace(id="p1", user_id="u1", exchange_id="paper",
+                                     api_key_enc=SecurityManager.encrypt("anything"),
+                                     api_secret_enc=SecurityManager.encrypt("x"))
+        client = TradingEngine.get_exchange_client(credential, load_markets=True)
+        self.assertIn("ETH/USDT", client.markets)
+        order = client.create_order("ETH/USDT", "limit", "buy", 3.0, 9.0)
+        self.assertNotIn("account", order)
+        self.assertEqual([o["id"] for o in client.fetch_open_orders()], [order["id"]])
+        self.assertEqual(client.fetch_ticker("ETH/USDT")["bid"], 9.0)
+        PaperExchange.engine.tick("ETH/USDT", 8.5)
+        self.assertEqual(client.fetch_order(order["id"])["status"], "closed")
+        self.assertEqual(client.fetch_balance()["ETH"]["total"], 3.0)
+        self.assertEqual(len(client.fetch_my_trades("ETH/USDT")), 1)
+        self.assertEqual(PaperExchange.engine.balance("u1")["ETH"], (3.0, 0.0))
+
+    def test_unpriced_pairs_get_a_live_tick(self):
+        client = PaperExchange({"uid": "u1"})
+        with mock.patch.object(TickFeed, 'live', return_value=[(0, "BTC/USDT", 100.0)]) as live:
+            order = client.create_order("BTC/USDT", "market", "buy", 1.0)
+            client.create_order("BTC/USDT", "market", "sell", 1.0)
+        live.assert_called_once_with(["BTC/USDT"])
+        self.assertEqual(order["status"], "closed")
+        with mock.patch.object(TickFeed, 'live', return_value=[]), self.assertRaises(ccxt.BadSymbol):
+            client.create_order("NOPE/USDT", "market", "buy", 1.0)
+
+    def test_live_ticks_convert_through_the_quote(self):
+        TickFeed._coin_ids.clear()
+        with mock.patch('crypto_portfolio.utils.api.CoinGeckoAPI.resolve_symbols',
+                        return_value={'ETH': 'ethereum', 'BTC': 'bitcoin'}), \
+                mock.patch('crypto_portfolio.utils.api.CoinGeckoAPI.get_prices',
+                           return_value={'ethereum': 3000.0, 'bitcoin': 60000.0}):
+            ticks = TickFeed.live(["ETH/USDT", "ETH/BTC", "ETH/EUR"])
+        self.assertEqual([(s, p) for _, s, p in ticks], [("ETH/USDT", 3000.0), ("ETH/BTC", 0.05)])
@@ -0,0 +1,64 @@
+import unittest
+from datetime import date, datetime
+from unittest import mock
+import numpy as np
+from crypto_portfolio.extensions import db
+from crypto_portfolio.core.models import Asset, Transaction, PortfolioSnapshot
+from crypto_portfolio.core.performance import ReturnMetrics, PerformanceService
+from tests.helpers import DBTestCase
+
+class TestReturnMetrics(unittest.TestCase):
+    def test_xirr_batch(self):
+        amounts = [[-100.0, 110.0, 0.0], [-100.0, 50.0, 80.0], [-100.0, -5.0, 0.0]]
+        years = [[0.0, 1.0, 0.0], [0.0, 0.5, 1.0], [0.0, 1.0, 0.0]]
+        mask = [[True, True, False], [True, True, True], [True, True, False]]
+        rates = ReturnMetrics.xirr(amounts, years, np.array(mask))
+        self.assertAlmostEqual(rates[0], 0.10, places=10)
+        # -100 + 50 / (1+r)^0.5 + 80 / (1+r) = 0
+        r = rates[1]
+        self.assertAlmostEqual(-100 + 50 / (1 + r) ** 0.5 + 80 / (1 + r), 0.0, places=8)
+        self.assertTrue(np.isnan(rates[2])) # no sign change
+
+    def test_twr_ignores_contributions(self):
+        # +10% then a 100 contribution, then +10% again
+        values = [100.0, 110.0 + 100.0, 231.0]
+        flows = [0.0, 100.0, 0.0]
+        self.assertAlmostEqual(ReturnMetrics.twr(values, flows)[0], 1.1 * 1.1 - 1)
+
+class TestPerformanceService(DBTestCase):
+    def test_cached_until_new_transaction(self):
+        db.session.add(Asset(user_id=self.user.id, symbol='ETH', quantity=1.0, buy_price=100.0))
+        db.session.add(Transaction(user_id=self.user.id, symbol='ETH', type='buy', quantity=1.0, price=100.0,
+                                   date=datetime(2024, 1, 1)))
+        for d, v in ((date(2024, 1, 1), 100.0), (date(2024, 7, 1), 120.0)):
+            db.session.add(PortfolioSnapshot(user_id=self.user.id, date=d, total_value=v))
+        db.session.commit()
+
+        with mock.patch('crypto_portfolio.core.performance.PortfolioValuation.fetch_prices', return_value={}):
+            first = PerformanceService.for_user(self.user, refresh_prices=False, today=date(2025, 1, 1))
+            self.assertAlmostEqual(first["portfolio"]["twr"], 0.2)
+            self.assertIs(PerformanceService.for_user(self.user, refresh_prices=False, today=date(2025, 1, 1)), first)
+
+            db.session.add(Transaction(user_id=self.user.id, symbol='ETH', type='sell', quantity=0.5, price=150.0,
+                                       date=datetime(2024, 9, 1)))
+            db.session.commit()
+            second = PerformanceService.for_user(self.user, refresh_prices=False, today=date(2025, 1, 1))
+        self.assertIsNot(second, first)
+        self.assertIn('ETH', second["holdings"])
+        self.assertGreater(second["portfolio"]["xirr"], first["portfolio"]["xirr"])
+
+    def test_holdings_without_flows_stay_out_of_the_xirr(self):
+        db.session.add(Asset(user_id=self.user.id, symbol='ETH', quantity=1.0, buy_price=100.0))
+        db.session.add(Asset(user_id=self.user.id, symbol='BTC', quantity=1.0, buy_price=1000.0))
+        db.session.add(Transaction(user_id=self.user.id, symbol='ETH', type='buy', quantity=1.0, price=100.0,
+                                   date=datetime(2024, 1, 1)))
+        db.session.commit()
+
+        with mock.patch('crypto_portfolio.core.performance.PortfolioValuation.fetch_prices',
+                        return_value={'ethereum': 110.0, 'bitcoin': 1000.0}):
+            report = PerformanceService.for_user(self.user, refresh_prices=False, today=date(2025, 1, 1))
+        self.assertNotIn('BTC', report["holdings"])
+        self.assertAlmostEqual(report["portfolio"]["xirr"], report["holdings"]["ETH"]["xirr"])
+
+if __name__ == '__main__':
+    unittest.main()
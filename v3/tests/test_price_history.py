@@ -0,0 +1,35 @@
+import unittest
+from datetime import date, datetime, timedelta, timezone
+from unittest import mock
+from crypto_portfolio.core.price_history import PriceHistoryStore
+from tests.helpers import DBTestCase
+
+TODAY = date(2024, 6, 30)
+
+def history(days):
+    """CoinGecko-style [ms, price] points for the last `days` days up to TODAY."""
+    return [[datetime(d.year, d.month, d.day, tzinfo=timezone.utc).timestamp() * 1000, 100.0 + i]
+            for i, d in enumerate(TODAY - timedelta(days=days - k) for k in range(days + 1))]
+
+class TestPriceHistoryStore(DBTestCase):
+    def setUp(self):
+        super().setUp()
+        PriceHistoryStore._attempted.clear()
+
+    def test_longer_window_backfills_the_head_once(self):
+        with mock.patch('crypto_portfolio.core.price_history.CoinGeckoAPI.get_coin_history',
+                        side_effect=lambda coin, days: history(days)) as download:
+            PriceHistoryStore.refresh(['bitcoin'], days=30, today=TODAY)
+            # already up to date for 30 days
+            PriceHistoryStore.refresh(['bitcoin'], days=30, today=TODAY)
+            self.assertEqual(download.call_count, 1)
+
+            PriceHistoryStore.refresh(['bitcoin'], days=400, today=TODAY)
+            self.assertEqual(download.call_args[1]['days'], 400)
+            first, last = PriceHistoryStore.ranges(['bitcoin'])['bitcoin']
+            self.assertEqual((first, last), (TODAY - timedelta(days=400), TODAY))
+            PriceHistoryStore.refresh(['bitcoin'], days=400, today=TODAY)
+            self.assertEqual(download.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import numpy as np
+from crypto_portfolio.extensions import db
+from crypto_portfolio.core.models import Asset, AutoTradeSettings
+from crypto_portfolio.core.rebalance import RebalancePlanner, RebalanceService
+from tests.helpers import DBTestCase
+
+SYMBOLS = ['BTC', 'ETH', 'AAPL']
+CLASSES = ['crypto', 'crypto', 'stock']
+COINS = ['bitcoin', 'ethereum', None]
+PRICES = [70000.0, 3000.0, 200.0]
+
+class TestRebalancePlanner(unittest.TestCase):
+    def test_reaches_targets_without_fees(self):
+        plan = RebalancePlanner.plan({'crypto': 60, 'stock': 40}, SYMBOLS, CLASSES, COINS,
+                                     [7000.0, 3000.0, 5000.0], PRICES, fee_rate=0.0)
+        # the class weight keeps BTC/ETH in their current 70/30 ratio
+        self.assertAlmostEqual(plan.final_weights['BTC'], 0.42)
+        self.assertAlmostEqual(plan.final_weights['ETH'], 0.18)
+        self.assertAlmostEqual(plan.final_weights['AAPL'], 0.40)
+        self.assertEqual([o.side for o in plan.orders], ['sell', 'sell', 'buy'])
+        self.assertEqual(plan.orders[0].to_order(), {"symbol": "BTC/USDT", "side": "sell", "amount": 0.01, "price": None})
+
+    def test_fees_are_self_financed(self):
+        values = [7000.0, 3000.0, 5000.0]
+        plan = RebalancePlanner.plan({'BTC': 1, 'ETH': 1}, SYMBOLS, CLASSES, COINS, values, PRICES, fee_rate=0.01)
+        sold = sum(o.value for o in plan.orders if o.side == 'sell')
+        bought = sum(o.value for o in plan.orders if o.side == 'buy')
+        self.assertAlmostEqual(sold - bought, plan.fees, places=6)
+        self.assertAlmostEqual(plan.cash_left, 0.0, places=6)
+        self.assertAlmostEqual(plan.final_weights['BTC'], plan.final_weights['ETH'], places=6)
+        self.assertAlmostEqual(plan.final_weights['AAPL'], 5000 / (15000 - plan.fees), places=6)
+
+    def test_tolerance_cap_and_batch(self):
+        portfolios = [
+            dict(targets={'BTC': 50, 'ETH': 50}, symbols=SYMBOLS[:2], classes=CLASSES[:2], coin_ids=COINS[:2],
+                 values=[5050.0, 4950.0], prices=PRICES[:2]),
+            dict(targets={'BTC': 50, 'ETH': 50, 'SOL': 10}, symbols=SYMBOLS[:2], classes=CLASSES[:2],
+                 coin_ids=COINS[:2], values=[9000.0, 1000.0], prices=PRICES[:2], max_order=1000.0),
+        ]
+        drift, capped = RebalancePlanner.plan_batch(portfolios, fee_rate=0.0)
+        self.assertEqual(drift.orders, []) # 0.5% drift is inside the tolerance
+        self.assertEqual([(o.side, o.value) for o in capped.orders], [('sell', 1000.0), ('buy', 1000.0)])
+        self.assertEqual(capped.unmatched_targets, ['SOL'])
+
+    def test_buys_limited_by_cash(self):
+        trades, fees, cash_left = RebalancePlanner.solve(
+            np.array([[0.0, 0.0]]), np.array([[1.0, 1.0]]), np.array([[10.0, 10.0]]),
+            np.array([1000.0]), np.array([np.inf]), fee_rate=0.01)
+        self.assertTrue((trades > 0).all())
+        self.assertAlmostEqual(trades.sum() + fees[0], 1000.0)
+        self.assertAlmostEqual(cash_left[0], 0.0)
+
+class TestExchangeOrders(unittest.TestCase):
+    def test_stock_sells_do_not_fund_crypto_buys(self):
+        plan = RebalancePlanner.plan({'BTC': 1, 'ETH': 1, 'AAPL': 0}, SYMBOLS, CLASSES, COINS,
+                                     [7000.0, 0.0, 5000.0], PRICES, fee_rate=0.01)
+        self.assertEqual([o.symbol for o in plan.orders], ['AAPL/USDT', 'BTC/USDT', 'ETH/USDT'])
+        sell, buy = RebalanceService.exchange_orders(plan)
+        self.assertEqual((sell.symbol, buy.symbol), ('BTC/USDT', 'ETH/USDT'))
+        self.assertAlmostEqual(buy.value * 1.01, sell.value * 0.99)
+        self.assertAlmostEqual(buy.amount, buy.value / PRICES[1])
+
+    def test_funded_plans_are_unchanged(self):
+        plan = RebalancePlanner.plan({'BTC': 1, 'ETH': 1}, SYMBOLS, CLASSES, COINS,
+                                     [7000.0, 3000.0, 5000.0], PRICES, fee_rate=0.01)
+        self.assertEqual(RebalanceService.exchange_orders(plan), plan.orders)
+
+
+class TestRebalanceService(DBTestCase):
+    def test_stored_targets_and_position_cap(self):
+        for symbol, coin, qty, price in (('BTC', 'bitcoin', 0.1, 70000.0), ('ETH', 'ethereum', 1.0, 3000.0)):
+            db.session.add(Asset(user_id=self.user.id, symbol=symbol, coin_id=coin, quantity=qty,
+                                 buy_price=price, asset_type='crypto'))
+        db.session.add(AutoTradeSettings(user_id=self.user.id, max_position_size=500.0))
+        db.session.commit()
+        RebalanceService.set_targets(self.user.id, {'BTC': 50, 'ETH': 50})
+        with self.assertRaises(ValueError):
+            RebalanceService.set_targets(self.user.id, {'BTC': -1})
+        self.assertEqual(RebalanceService.targets(self.user.id), {'BTC': 50.0, 'ETH': 50.0})
+
+        plans = RebalanceService.plan_users([self.user], prices={'bitcoin': 70000.0, 'ethereum': 3000.0})
+        orders = plans[self.user.id].orders
+        self.assertEqual([(o.symbol, o.side) for o in orders], [('BTC/USDT', 'sell'), ('ETH/USDT', 'buy')])
+        self.assertAlmostEqual(orders[0].value, 500.0)
@@ -0,0 +1,62 @@
+import unittest
+from datetime import date, timedelta
+import numpy as np
+from crypto_portfolio.extensions import db
+from crypto_portfolio.core.models import Asset, PortfolioSnapshot
+from crypto_portfolio.core.price_history import PriceHistoryStore
+from crypto_portfolio.core.risk import RiskMetrics, RiskService
+from tests.helpers import DBTestCase
+
+class TestRiskMetrics(unittest.TestCase):
+    def test_max_drawdown(self):
+        values = np.array([100, 120, 60, 90, 130, 65.0])
+        self.assertAlmostEqual(RiskMetrics.max_drawdown(values), 0.5)
+
+    def test_rolling_volatility_matches_naive(self):
+        rng = np.random.default_rng(0)
+        r = rng.normal(0, 0.02, size=(200, 3))
+        r[:10, 1] = np.nan
+        fast = RiskMetrics.rolling_volatility(r, window=20, periods=1)
+        for t in (25, 120, 199):
+            window = r[t - 19:t + 1]
+            naive = np.nanstd(window, axis=0, ddof=1)
+            np.testing.assert_allclose(fast[t], naive, rtol=1e-9)
+
+    def test_var_ordering(self):
+        rng = np.random.default_rng(1)
+        r = rng.normal(0.001, 0.03, size=5000)
+        var, cvar = RiskMetrics.historical_var(r, 0.95)
+        pvar, pcvar = RiskMetrics.parametric_var(r, 0.95)
+        self.assertGreater(cvar, var)
+        self.assertAlmostEqual(var, pvar, delta=0.005)
+        self.assertAlmostEqual(cvar, pcvar, delta=0.005)
+
+    def test_short_history(self):
+        self.assertEqual(RiskMetrics.summary(np.array([]), ['portfolio']), {})
+
+class TestRiskService(DBTestCase):
+    def setUp(self):
+        super().setUp()
+        RiskService._cache.clear()
+        start = date.today() - timedelta(days=40)
+        for i in range(40):
+            day = start + timedelta(days=i)
+            db.session.add(PortfolioSnapshot(user_id=self.user.id, date=day, total_value=1000 + 10 * (i % 7)))
+        PriceHistoryStore.store('bitcoin', [(start + timedelta(days=i), 30000 + 500 * (i % 5)) for i in range(40)])
+        db.session.add(Asset(user_id=self.user.id, symbol='BTC', coin_id='bitcoin', quantity=1, buy_price=1))
+        db.session.commit()
+
+    def test_report_is_cached_until_new_data(self):
+        first = RiskService.for_user(self.user, refresh_prices=False)
+        self.assertIn('BTC', first['holdings'])
+        self.assertEqual(first['portfolio']['observations'], 39)
+        self.assertIs(RiskService.for_user(self.user, refresh_prices=False), first)
+
+        db.session.add(PortfolioSnapshot(user_id=self.user.id, date=date.today(), total_value=900))
+        db.session.commit()
+        second = RiskService.for_user(self.user, refresh_prices=False)
+        self.assertIsNot(second, first)
+        self.assertEqual(second['portfolio']['observations'], 40)
+
+if __name__ == '__main__':
+    unittest.main()
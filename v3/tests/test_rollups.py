@@ -0,0 +1,65 @@
+import unittest
+from datetime import date, timedelta
+from crypto_portfolio.extensions import db
+from crypto_portfolio.core.models import PortfolioSnapshot, PortfolioRollup
+from crypto_portfolio.core.rollups import SnapshotRollup
+from tests.helpers import DBTestCase
+
+class TestSnapshotRollup(DBTestCase):
+    def test_incremental_buckets(self):
+        # Monday 2024-01-01 .. Sunday 2024-01-07
+        for i, value in enumerate([100, 120, 90, 110, 105, 130, 125]):
+            SnapshotRollup.record(self.user.id, date(2024, 1, 1) + timedelta(days=i), value)
+        db.session.commit()
+
+        week = PortfolioRollup.query.filter_by(user_id=self.user.id, period='week').one()
+        self.assertEqual(week.open_value, 100)
+        self.assertEqual(week.close_value, 125)
+        self.assertEqual(week.min_value, 90)
+        self.assertEqual(week.max_value, 130)
+        self.assertEqual(PortfolioRollup.query.filter_by(period='day').count(), 7)
+
+    def test_intraday_update_moves_close(self):
+        day = date(2024, 3, 15)
+        SnapshotRollup.record(self.user.id, day, 100)
+        SnapshotRollup.record(self.user.id, day, 80)
+        db.session.commit()
+        bucket = PortfolioRollup.query.filter_by(period='day').one()
+        self.assertEqual((bucket.open_value, bucket.close_value, bucket.min_value), (100, 80, 80))
+
+    def test_series_is_bounded(self):
+        today = date(2024, 12, 31)
+        points = [(today - timedelta(days=i), 1000.0 + i) for i in range(5 * 365)]
+        SnapshotRollup.record_many(self.user.id, points)
+        db.session.commit()
+
+        self.assertLessEqual(len(SnapshotRollup.series(self.user.id, '1M', today)), 32)
+        self.assertLessEqual(len(SnapshotRollup.series(self.user.id, '1Y', today)), 54)
+        self.assertLessEqual(len(SnapshotRollup.series(self.user.id, '5Y', today)), 61)
+        latest = SnapshotRollup.series(self.user.id, '1M', today)[-1]
+        self.assertEqual(latest.bucket_start, today)
+
+    def test_rebuild_from_legacy_snapshots(self):
+        for i in range(3):
+            db.session.add(PortfolioSnapshot(user_id=self.user.id, date=date(2024, 5, 1 + i), total_value=10.0 * (i + 1)))
+        db.session.commit()
+
+        month = SnapshotRollup.series(self.user.id, 'ALL')
+        self.assertEqual(len(month), 1)
+        self.assertEqual(month[0].close_value, 30.0)
+
+    def test_legacy_history_is_rebuilt_after_today_was_recorded(self):
+        for i in range(3):
+            db.session.add(PortfolioSnapshot(user_id=self.user.id, date=date(2024, 5, 1 + i), total_value=10.0 * (i + 1)))
+        db.session.add(PortfolioSnapshot(user_id=self.user.id, date=date(2024, 5, 10), total_value=50.0))
+        SnapshotRollup.record(self.user.id, date(2024, 5, 10), 50.0)
+        db.session.commit()
+
+        days = SnapshotRollup.series(self.user.id, '1M', today=date(2024, 5, 10))
+        self.assertEqual([b.bucket_start.day for b in days], [1, 2, 3, 10])
+        month = SnapshotRollup.series(self.user.id, 'ALL')
+        self.assertEqual((month[0].open_value, month[0].close_value), (10.0, 50.0))
+        self.assertFalse(SnapshotRollup.ensure(self.user.id))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from unittest import mock
+import numpy as np
+from crypto_portfolio.core.scenarios import Scenario, ScenarioEngine, HISTORICAL_SCENARIOS
+
+class TestScenarioEngine(unittest.TestCase):
+    values = [1000.0, 500.0, 200.0, 300.0]
+    classes = ['crypto', 'crypto', 'stock', 'bond']
+    symbols = ['BTC', 'ETH', 'AAPL', 'OAT']
+    coins = ['bitcoin', 'ethereum', None, None]
+
+    def test_specific_shocks_override_class(self):
+        scenarios = [
+            Scenario("a", {"crypto": -40, "stock": -10}),
+            Scenario("b", {"crypto": -40, "ETH": -60}),
+            Scenario("c", {"bitcoin": 10, "BTC": -99}), # coin id beats symbol
+        ]
+        result = ScenarioEngine.run(scenarios, self.values, self.classes, self.symbols, self.coins)
+        np.testing.assert_allclose(result.stressed_values, [
+            [600.0, 300.0, 180.0, 300.0],
+            [600.0, 200.0, 200.0, 300.0],
+            [1100.0, 500.0, 200.0, 300.0],
+        ])
+        data = result.to_dict()
+        self.assertEqual(data["base_value"], 2000.0)
+        self.assertAlmostEqual(data["scenarios"][0]["pnl_percent"], -31.0)
+
+    def test_grid_and_historical(self):
+        grid = ScenarioEngine.grid({"crypto": range(-90, 1, 10), "stock": range(-50, 1, 10)})
+        self.assertEqual(len(grid), 60)
+        result = ScenarioEngine.run(grid + HISTORICAL_SCENARIOS, self.values, self.classes, self.symbols, self.coins)
+        self.assertEqual(result.stressed_values.shape, (60 + len(HISTORICAL_SCENARIOS), 4))
+        self.assertEqual(result.totals[0], 100.0 + 50.0 + 100.0 + 300.0)
+
+    def test_rejects_impossible_shock(self):
+        with self.assertRaises(ValueError):
+            Scenario.from_dict({"name": "x", "shocks": {"crypto": -150}})
+        with self.assertRaises(ValueError):
+            ScenarioEngine.grid({"crypto": [-120, 0]})
+
+    def test_grid_size_is_checked_before_building(self):
+        axes = {k: range(100) for k in ("crypto", "stock", "bond", "etf")} # 10^8 combinations
+        with mock.patch("crypto_portfolio.core.scenarios.itertools.product") as product:
+            with self.assertRaises(ValueError):
+                ScenarioEngine.grid(axes)
+        product.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+from unittest import mock
+from crypto_portfolio.extensions import db
+from crypto_portfolio.core.models import Asset, Simulation
+from crypto_portfolio.core.simulations import SimulationPricing
+from tests.helpers import DBTestCase
+
+class TestSimulationPricing(DBTestCase):
+    def setUp(self):
+        super().setUp()
+        SimulationPricing._coin_ids.clear()
+        db.session.add(Asset(user_id=self.user.id, symbol='btc', coin_id='bitcoin'))
+        for symbol, qty in (('BTC', 0.5), ('ETH', 2.0), ('ETH', 1.0), ('XYZ', 3.0)):
+            db.session.add(Simulation(user_id=self.user.id, symbol=symbol, investment=100.0, quantity=qty,
+                                      current_price=1.0, asset_type='crypto'))
+        db.session.add(Simulation(user_id=self.user.id, symbol='AAPL', investment=100.0, quantity=1.0,
+                                  current_price=150.0, asset_type='stock'))
+        db.session.commit()
+
+    @mock.patch('crypto_portfolio.core.simulations.socketio')
+    @mock.patch('crypto_portfolio.core.simulations.CoinGeckoAPI')
+    def test_one_lookup_one_price_call(self, api, socketio):
+        api.resolve_symbols.return_value = {'ETH': 'ethereum'}
+        api.get_prices.return_value = {'bitcoin': 60000.0, 'ethereum': 3000.0}
+
+        rows = SimulationPricing.reprice_all(self.user.id)
+
+        # BTC comes from the stored assets, only ETH/XYZ go upstream
+        api.resolve_symbols.assert_called_once_with(['ETH', 'XYZ'])
+        api.get_prices.assert_called_once_with(['bitcoin', 'ethereum'])
+        self.assertEqual(len(rows), 3)
+        socketio.emit.assert_called_once()
+        self.assertEqual(socketio.emit.call_args.kwargs['to'], self.user.id)
+
+        values = {(s.symbol, s.quantity): (s.current_value, s.profit_loss) for s in Simulation.query}
+        self.assertEqual(values[('BTC', 0.5)], (30000.0, 29900.0))
+        self.assertEqual(values[('ETH', 2.0)], (6000.0, 5900.0))
+        self.assertEqual(values[('XYZ', 3.0)], (None, None))
+        self.assertEqual(values[('AAPL', 1.0)], (None, None))
+
+        # Resolved symbols are remembered
+        SimulationPricing.reprice_all(self.user.id)
+        self.assertEqual(api.resolve_symbols.call_count, 2)
+        api.resolve_symbols.assert_called_with(['XYZ'])
@@ -0,0 +1,121 @@
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
+import ccxt
+from crypto_portfolio.extensions import db
+from crypto_portfolio.core.models import ExchangeCredential
+from crypto_portfolio.core.trading_engine import TradingEngine
+from crypto_portfolio.utils.security import SecurityManager
+from tests.helpers import DBTestCase
+
+class CountingExchange(ccxt.Exchange):
+    market_loads = 0
+    active = 0
+    overlaps = 0
+
+    def fetch_balance(self, params={}):
+        CountingExchange.active += 1
+        CountingExchange.overlaps += CountingExchange.active > 1
+        time.sleep(0.01)
+        CountingExchange.active -= 1
+        return {}
+
+    def describe(self):
+        return self.deep_extend(super().describe(), {"id": "counting", "has": {"fetchCurrencies": False}})
+
+    def fetch_markets(self, params={}):
+        CountingExchange.market_loads += 1
+        return [{"id": "BTCUSDT", "symbol": "BTC/USDT", "base": "BTC", "quote": "USDT", "baseId": "BTC",
+                 "quoteId": "USDT", "active": True, "type": "spot", "spot": True, "precision": {}, "limits": {}}]
+
+def credential(cid="c1", key="key"):
+    return SimpleNamespace(id=cid, exchange_id="counting", api_key_enc=SecurityManager.encrypt(key),
+                           api_secret_enc=SecurityManager.encrypt("secret"))
+
+class TestClientPool(unittest.TestCase):
+    def setUp(self):
+        TradingEngine.register_exchange("counting", CountingExchange)
+        TradingEngine.invalidate()
+        CountingExchange.market_loads = 0
+
+    def tearDown(self):
+        TradingEngine.CUSTOM_EXCHANGES.pop("counting", None)
+        TradingEngine.invalidate()
+
+    def test_client_is_reused_until_credential_changes(self):
+        cred = credential()
+        client = TradingEngine.get_exchange_client(cred, now=0)
+        self.assertIs(TradingEngine.get_exchange_client(cred, now=10), client)
+        self.assertEqual(client.apiKey, "key")
+
+        cred.api_key_enc = SecurityManager.encrypt("rotated")
+        rotated = TradingEngine.get_exchange_client(cred, now=20)
+        self.assertIsNot(rotated, client)
+        self.assertEqual(rotated.apiKey, "rotated")
+
+        self.assertIsNot(TradingEngine.get_exchange_client(cred, now=20 + TradingEngine.CLIENT_TTL), rotated)
+        TradingEngine.invalidate(cred.id)
+        self.assertNotIn(cred.id, TradingEngine._clients)
+
+    def test_markets_are_shared_and_refreshed(self):
+        first = TradingEngine.get_exchange_client(credential("c1"), load_markets=True, now=0)
+        second = TradingEngine.get_exchange_client(credential("c2"), load_markets=True, now=5)
+        self.assertEqual(CountingExchange.market_loads, 1) # the second credential reuses the markets
+        self.assertIn("BTC/USDT", second.markets)
+        TradingEngine.get_exchange_client(credential("c1"), load_markets=True, now=TradingEngine.MARKETS_TTL)
+        self.assertEqual(CountingExchange.market_loads, 2)
+        self.assertIn("BTC/USDT", first.markets)
+
+    def test_shared_client_calls_are_serialized(self):
+        cred = credential()
+        CountingExchange.overlaps = 0
+        TradingEngine.get_exchange_client(cred, load_markets=True)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(lambda _: TradingEngine.get_exchange_client(cred, load_markets=True).fetch_balance(), range(8)))
+        self.assertEqual(CountingExchange.overlaps, 0)
+        self.assertEqual(CountingExchange.market_loads, 1)
+
+    def test_unknown_exchange(self):
+        cred = credential()
+        cred.exchange_id = "nowhere"
+        with self.assertRaises(ValueError):
+            TradingEngine.get_exchange_client(cred)
+
+
+class TestBackgroundVerification(DBTestCase):
+    def setUp(self):
+        super().setUp()
+        TradingEngine.invalidate()
+
+    def tearDown(self):
+        TradingEngine.invalidate()
+        super().tearDown()
+
+    def connect(self, exchange_id):
+        cred = ExchangeCredential(user_id=self.user.id, exchange_id=exchange_id,
+                                  api_key_enc=SecurityManager.encrypt("alice"),
+                                  api_secret_enc=SecurityManager.encrypt("secret"))
+        db.session.add(cred)
+        return cred
+
+    @mock.patch('crypto_portfolio.core.trading_engine.socketio')
+    def test_status_is_pending_then_pushed(self, socketio):
+        cred = self.connect("paper")
+        future = TradingEngine.verify_in_background(cred)
+        self.assertEqual((cred.status, cred.is_active), ('pending', False))
+        status = future.result(timeout=5)
+        self.assertEqual((status["id"], status["status"]), (cred.id, 'verified'))
+        socketio.emit.assert_called_once_with('exchange_status', status, to=self.user.id)
+        db.session.expire_all()
+        self.assertTrue(db.session.get(ExchangeCredential, cred.id).is_active)
+
+    @mock.patch('crypto_portfolio.core.trading_engine.socketio')
+    def test_failed_verification_keeps_credential_inactive(self, socketio):
+        cred = self.connect("nope")
+        status = TradingEngine.verify_in_background(cred).result(timeout=5)
+        self.assertEqual(status["status"], 'failed')
+        self.assertIn("nope", status["status_message"])
+        db.session.expire_all()
+        self.assertFalse(db.session.get(ExchangeCredential, cred.id).is_active)
@@ -0,0 +1,40 @@
+import unittest
+from crypto_portfolio.core.asset import Asset
+from crypto_portfolio.core.valuation import PortfolioValuation
+
+class TestPortfolioValuation(unittest.TestCase):
+    def setUp(self):
+        self.assets = [
+            Asset("BTC", 0.5, 30000.0, coin_id="bitcoin"),
+            Asset("ETH", 2.0, 2000.0, coin_id="ethereum", currency="EUR"),
+            Asset("AAPL", 10.0, 150.0, asset_type="stock"),
+        ]
+        self.prices = {"bitcoin": 40000.0, "ethereum": 1500.0}
+
+    def test_matches_scalar_formulas(self):
+        valuation = PortfolioValuation.value_assets(self.assets, self.prices)
+        for asset, row in zip(self.assets, valuation.rows()):
+            price = self.prices.get(asset.coin_id, asset.buy_price)
+            self.assertAlmostEqual(row["value"], asset.current_value(price))
+            self.assertAlmostEqual(row["pl"], asset.profit_loss(price))
+
+        self.assertAlmostEqual(valuation.total_value, 20000 + 3000 + 1500)
+        self.assertAlmostEqual(valuation.total_cost, 15000 + 4000 + 1500)
+        self.assertAlmostEqual(valuation.total_pl_percent, 4000 / 20500 * 100)
+
+    def test_grouping(self):
+        valuation = PortfolioValuation.value_assets(self.assets, self.prices)
+        by_type = valuation.by_asset_type()
+        self.assertAlmostEqual(by_type["crypto"]["value"], 23000)
+        self.assertAlmostEqual(by_type["stock"]["pl"], 0)
+        self.assertEqual(set(valuation.by_currency()), {"USD", "EUR"})
+
+    def test_zero_cost_and_empty(self):
+        valuation = PortfolioValuation.compute([1.0], [0.0], [10.0])
+        self.assertEqual(valuation.pl_percent[0], 0)
+        empty = PortfolioValuation.value_assets([], {})
+        self.assertEqual(empty.total_value, 0)
+        self.assertEqual(empty.by_asset_type(), {})
+
+if __name__ == '__main__':
+    unittest.main()